@@ -0,0 +1,55 @@
+"""
+Connection management of the `DATABASES` entries (see the Database section of settings.py).
+
+Opening a PostgreSQL connection (TCP + TLS + authentication + backend process start) costs more than the few
+primary-key queries of a typical page, so connections are either kept open between requests or pooled:
+
+    "pool"         psycopg 3's connection pool (Django >= 5.1, needs `psycopg[pool]`). Each worker process keeps
+                   min_size .. max_size open connections; a request borrows one and returns it when it finishes.
+    "persistent"   CONN_MAX_AGE: every thread keeps its own connection for `max_age` seconds.
+    "per-request"  A new connection per request (Django's default).
+
+Both reuse modes run a health check (CONN_HEALTH_CHECKS) before handing out a connection that has been idle, so a
+restarted database or a dropped connection costs one reconnect instead of a failed request.
+"""
+
+POOL = "pool"
+PERSISTENT = "persistent"
+PER_REQUEST = "per-request"
+
+MODES = (POOL, PERSISTENT, PER_REQUEST)
+
+
+def connection_settings(engine: str, mode: str, max_age: int = 60, min_size: int = 2, max_size: int = 4,
+                        timeout: float = 10, max_idle: float = 300, max_lifetime: float = 3600) -> dict:
+    """
+    Returns the connection management keys of a `DATABASES` entry.
+
+    Pooling is only available on PostgreSQL; other engines get persistent connections instead.
+
+    :param engine: The ENGINE of the entry.
+    :param mode: POOL, PERSISTENT or PER_REQUEST.
+    :param max_age: Seconds a persistent connection is kept (CONN_MAX_AGE).
+    :param min_size: Connections the pool of a worker process keeps open.
+    :param max_size: Most connections the pool of a worker process opens; size it to the threads of a worker
+        that run queries at the same time (workers * max_size must stay below the server's max_connections).
+    :param timeout: Seconds a request waits for a free pooled connection before failing.
+    :param max_idle: Seconds an unused pooled connection above min_size is kept.
+    :param max_lifetime: Seconds after which a pooled connection is replaced (spreads load after failovers).
+    :return: dict with CONN_MAX_AGE, CONN_HEALTH_CHECKS and OPTIONS.
+    :raises ValueError: for unknown modes.
+    """
+
+    if mode not in MODES:
+        raise ValueError(f"Unknown connection mode {mode!r}; use one of {', '.join(MODES)}.")
+    if mode == POOL and engine == "django.db.backends.postgresql":
+        return {
+            # the pool hands out and takes back the connections, they must not outlive the request on their own
+            "CONN_MAX_AGE": 0,
+            "CONN_HEALTH_CHECKS": True,
+            "OPTIONS": {"pool": {"min_size": min_size, "max_size": max_size, "timeout": timeout,
+                                 "max_idle": max_idle, "max_lifetime": max_lifetime}},
+        }
+    if mode == PER_REQUEST:
+        return {"CONN_MAX_AGE": 0, "CONN_HEALTH_CHECKS": False, "OPTIONS": {}}
+    return {"CONN_MAX_AGE": max_age, "CONN_HEALTH_CHECKS": True, "OPTIONS": {}}
@@ -12,6 +12,8 @@ https://docs.djangoproject.com/en/5.1/ref/settings/
 
 from pathlib import Path
 
+from ToDoList.database import connection_settings
+
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
 
@@ -41,11 +43,14 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    "tasks.middleware.QueryInstrumentationMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
     "django.contrib.auth.middleware.AuthenticationMiddleware",
+    "tasks.middleware.ShardRoutingMiddleware",
+    "tasks.middleware.ReplicaRoutingMiddleware",
     "django.contrib.messages.middleware.MessageMiddleware",
     "django.middleware.clickjacking.XFrameOptionsMiddleware",
 ]
@@ -76,6 +81,17 @@ LOGIN_REDIRECT_URL = 'all-tasks'
 
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+#
+# Connections are pooled per worker process (see ToDoList/database.py for the modes). Size the pool to the threads of
+# a worker that query at the same time: the threads of a WSGI worker, or under ASGI the page queries the async views
+# run side by side (tasks.async_views._in_thread, 3 per page). Every worker opens up to DATABASE_POOL_MAX_SIZE
+# connections, so workers * DATABASE_POOL_MAX_SIZE must stay below PostgreSQL's max_connections (100 by default).
+
+DATABASE_CONNECTIONS = "pool"  # "pool", "persistent" or "per-request"
+DATABASE_CONN_MAX_AGE = 60  # seconds, "persistent" only
+DATABASE_POOL_MIN_SIZE = 2
+DATABASE_POOL_MAX_SIZE = 8
+DATABASE_POOL_TIMEOUT = 10  # seconds a request waits for a free connection
 
 DATABASES = {
     "default": {
@@ -87,7 +103,120 @@ DATABASES = {
         "PORT": "5432",
     }
 }
+DATABASES["default"].update(connection_settings(
+    DATABASES["default"]["ENGINE"], DATABASE_CONNECTIONS, max_age=DATABASE_CONN_MAX_AGE,
+    min_size=DATABASE_POOL_MIN_SIZE, max_size=DATABASE_POOL_MAX_SIZE, timeout=DATABASE_POOL_TIMEOUT))
+
+# Read replicas (tasks/routers.py): aliases of DATABASES entries streaming from "default". GET / HEAD requests read
+# the task models from one of them, unless their user wrote within TASK_REPLICA_PIN_SECONDS (which should exceed the
+# replication lag); a replica that fails to connect is skipped for TASK_REPLICA_RETRY_SECONDS.
+DATABASE_ROUTERS = ["tasks.routers.ShardRouter", "tasks.routers.ReplicaRouter"]
+TASK_READ_REPLICAS = []
+TASK_REPLICA_PIN_SECONDS = 10
+TASK_REPLICA_RETRY_SECONDS = 30
+
+# Shards (tasks/shards.py): aliases of DATABASES entries the per-user task data is spread over, e.g.
+# ["default", "shard1", "shard2"]. The list is append-only: the position of a shard picks its block of task and tag
+# IDs, and the database with the data from before the sharding must come first. Users are placed by consistent hashing
+# with TASK_SHARD_VNODES points per shard; `manage.py migrate_shards` migrates every shard and `manage.py
+# rebalance_shards` moves users onto the shards the ring assigns them after shards were added.
+TASK_SHARDS = []
+TASK_SHARD_VNODES = 64
+
+# Archive (tasks/archive.py): `manage.py archive_tasks` moves the completed tasks unchanged for TASK_ARCHIVE_AFTER_DAYS
+# days out of the task table, TASK_ARCHIVE_BATCH_SIZE tasks at a time; with TASK_ARCHIVE_COMPRESS their descriptions
+# are stored compressed (and no longer searched).
+TASK_ARCHIVE_AFTER_DAYS = 90
+TASK_ARCHIVE_BATCH_SIZE = 1000
+TASK_ARCHIVE_COMPRESS = False
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.1/topics/cache/
+#
+# "pages" holds the rendered task list pages (see tasks/page_cache.py). The local-memory backend evicts the least
+# recently used entries beyond MAX_ENTRIES; with several processes point it at a shared backend instead, e.g.
+# {"BACKEND": "django.core.cache.backends.redis.RedisCache", "LOCATION": "redis://127.0.0.1:6379"} with
+# `maxmemory-policy allkeys-lru`.
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "pages": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "LOCATION": "task-pages",
+        "OPTIONS": {
+            "MAX_ENTRIES": 2000,
+            "CULL_FREQUENCY": 10,
+        },
+    },
+}
+
+TASK_PAGE_CACHE = "pages"  # None disables the page cache
+TASK_PAGE_CACHE_TIMEOUT = 300
+TASK_PAGE_CACHE_MAX_BYTES = 256 * 1024
+
+
+# Request instrumentation (see tasks/middleware.py)
+# Query budgets are keyed by URL name; views over budget fail in development and tests and log a warning otherwise.
+# They leave room for the 4 queries of building a user's counters row on their first visit of the day, and for the
+# lookup of the user's shard with TASK_SHARDS (see tasks/shards.py). Lists that may hold tasks without a date read
+# them with a second query per tier (see tasks/pagination.py).
+
+TASK_INSTRUMENTATION = True
+TASK_INSTRUMENTATION_HEADERS = DEBUG
+TASK_QUERY_BUDGET_STRICT = DEBUG
+TASK_QUERY_BUDGET_DEFAULT = 16
+TASK_QUERY_BUDGETS = {
+    "all-tasks": 15,
+    "today-tasks": 13,
+    "overdue-tasks": 13,
+    "completed-tasks": 16,
+    "fiter-by-tag": 15,
+    "all-tags": 10,
+    "all-task-detail": 13,
+    "today-task-detail": 12,
+    "overdue-task-detail": 12,
+    "completed-task-detail": 15,
+    "tag-filter-task": 14,
+    "tag-detail": 10,
+    "agenda-tasks": 10,
+    "api-agenda": 4,
+    "api-sync": 17,
+}
 
+# Optional bearer token the Prometheus scraper must send to /metrics (None leaves the endpoint open)
+TASK_METRICS_TOKEN = None
+
+# Live updates (tasks.events): broker fanning the events out to the open streams (None picks it by database vendor:
+# LISTEN / NOTIFY on PostgreSQL, in-process otherwise) and seconds between keep-alives of an idle stream
+TASK_EVENTS_BROKER = None
+TASK_EVENTS_HEARTBEAT = 15
+
+# Rows fetched per round trip of the server-side cursor of the streaming exports (tasks.export)
+TASK_EXPORT_CHUNK_SIZE = 2000
+
+# Rows validated and inserted per bulk_create batch of the imports (tasks.importer)
+TASK_IMPORT_BATCH_SIZE = 1000
+
+LOGGING = {
+    "version": 1,
+    "disable_existing_loggers": False,
+    "handlers": {
+        "console": {
+            "class": "logging.StreamHandler",
+        },
+    },
+    "loggers": {
+        # one JSON line per request in production; only the budget warnings while developing
+        "tasks.instrumentation": {
+            "handlers": ["console"],
+            "level": "WARNING" if DEBUG else "INFO",
+            "propagate": False,
+        },
+    },
+}
 
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
@@ -1,6 +1,44 @@
 from django.contrib import admin
+
+from .counters import task_state
 from .models import Task, TagTask
+from .services import save_task, delete_task, save_tag, delete_tag, reassign_task, delete_in_bulk
+
+
+@admin.register(Task)
+class TaskAdmin(admin.ModelAdmin):
+    """
+    Routes admin writes through the services, so the counters, the cached pages and the change sequences of the owners
+    stay current.
+    """
+
+    def save_model(self, request, obj, form, change):
+        original = Task.objects.filter(pk=obj.pk).first() if change else None
+        if original is not None and original.user_id != obj.user_id:
+            # moved to another user: both counters rows are recounted
+            reassign_task(obj, original.user_id)
+            return
+        save_task(obj, task_state(original) if original else None)
+
+    def delete_model(self, request, obj):
+        delete_task(obj)
+
+    def delete_queryset(self, request, queryset):
+        delete_in_bulk(queryset)
+
+
+@admin.register(TagTask)
+class TagTaskAdmin(admin.ModelAdmin):
+    """
+    Routes admin writes through the services, so the counters, the cached pages and the change sequences of the owners
+    stay current.
+    """
+
+    def save_model(self, request, obj, form, change):
+        save_tag(obj)
 
-admin.site.register(Task)
+    def delete_model(self, request, obj):
+        delete_tag(obj)
 
-admin.site.register(TagTask)
+    def delete_queryset(self, request, queryset):
+        delete_in_bulk(queryset)
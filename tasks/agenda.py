@@ -0,0 +1,83 @@
+"""
+The agenda: the open tasks of a user due in a range of days, grouped by day.
+
+A range is read with one query, a scan of the (user, date) range of the open tasks (`task_open_user_date_idx`) from
+the start of its first day to the start of the day after its last one, so its cost follows the number of tasks due in
+the range, not the length of the range or the user's other tasks. The days are those of the user's time zone: the
+bounds are its midnights, and the rows, read in date order, are grouped by their local day in a single pass.
+"""
+import datetime
+from typing import Iterable, List, Tuple
+
+from django.utils import timezone
+
+from .counters import day_range
+from .models import Task, TaskQuerySet
+
+# the range shown without `start` / `end`, and the longest range served
+DEFAULT_DAYS = 7
+MAX_DAYS = 366
+# the most tasks of a range served; the agenda of a longer range is cut off (`truncated`)
+MAX_TASKS = 2000
+
+
+def tasks_in_range(user, start: datetime.datetime, end: datetime.datetime) -> TaskQuerySet:
+    """
+    Returns the open tasks of a user due from `start` (included) to `end` (excluded) as list rows with their tag
+    names, in date order.
+    """
+
+    return (Task.objects.filter(user=user, completed=False, date__gte=start, date__lt=end)
+            .order_by("date", "id").rows(with_tag=True))
+
+
+def group_by_day(tasks: Iterable[Task], tz) -> List[Tuple[datetime.date, list]]:
+    """
+    Groups tasks ordered by date by their day in the time zone `tz`.
+
+    :return: list of (day, tasks) tuples in date order, for the days with tasks.
+    """
+
+    days = []
+    for task in tasks:
+        day = timezone.localtime(task.date, tz).date()
+        if not days or days[-1][0] != day:
+            days.append((day, []))
+        days[-1][1].append(task)
+    return days
+
+
+def agenda(user, first: datetime.date, last: datetime.date, tz) -> dict:
+    """
+    Returns the open tasks of a user due from the day `first` to the day `last` (included) of the time zone `tz`.
+
+    :param user: The user.
+    :param first: The first day.
+    :param last: The last day.
+    :param tz: The time zone of the days.
+    :return: dict with the `days` (list of (day, tasks) tuples, see `group_by_day`), the `amount` of tasks and whether
+        the range was `truncated` to MAX_TASKS tasks.
+    """
+
+    start, end = day_range(first, last, tz)
+    tasks = list(tasks_in_range(user, start, end)[:MAX_TASKS + 1])
+    truncated = len(tasks) > MAX_TASKS
+    if truncated:
+        tasks.pop()
+    return {"days": group_by_day(tasks, tz), "amount": len(tasks), "truncated": truncated}
+
+
+def agenda_json(days: List[Tuple[datetime.date, list]], tz) -> list:
+    """
+    Serializes the days of an agenda, with the due dates of the tasks in the time zone `tz`.
+    """
+
+    return [{
+        "date": day.isoformat(),
+        "tasks": [{
+            "id": task.id,
+            "title": task.title,
+            "date": timezone.localtime(task.date, tz).isoformat(),
+            "tag": task.tag.tag_name if task.tag_id else None,
+        } for task in tasks],
+    } for day, tasks in days]
@@ -0,0 +1,150 @@
+import json
+
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_GET, require_POST, require_http_methods
+
+from . import agenda, sync
+from .counters import get_counters, counters_json
+from .forms import AgendaForm
+from .models import Task
+from .services import toggle_tasks, delete_tasks, rename_task
+
+
+@login_required
+@require_POST
+def toggle_task(request, task_id: int) -> JsonResponse:
+    """
+    Toggles the completion status of a task and returns its new state with the refreshed counters.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param task_id: The ID of the task to be toggled.
+    :return: JsonResponse with the task and the counters.
+    """
+
+    toggled = toggle_tasks(request.user, [task_id])
+    if not toggled:
+        raise Http404("Task does not exist or you do not have permission to change it.")
+
+    return JsonResponse({
+        "task": {"id": task_id, "completed": toggled[task_id]},
+        "counters": counters_json(get_counters(request.user)),
+    })
+
+
+@login_required
+@require_POST
+def delete_task(request, task_id: int) -> JsonResponse:
+    """
+    Deletes a task and returns the refreshed counters.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param task_id: The ID of the task to be deleted.
+    :return: JsonResponse with the deleted task ID and the counters.
+    """
+
+    if not delete_tasks(request.user, [task_id]):
+        raise Http404("Task does not exist or you do not have permission to delete it.")
+
+    return JsonResponse({
+        "deleted": task_id,
+        "counters": counters_json(get_counters(request.user)),
+    })
+
+
+@login_required
+@require_POST
+def edit_task_title(request, task_id: int) -> JsonResponse:
+    """
+    Renames a task in place with a single UPDATE.
+
+    :param request: The HTTP request object containing metadata about the request; `title` holds the new title.
+    :param task_id: The ID of the task to be renamed.
+    :return: JsonResponse with the task and the counters, or the validation errors with status 400.
+    """
+
+    title = request.POST.get('title', '').strip()
+    max_length = Task._meta.get_field('title').max_length
+    if not title or len(title) > max_length:
+        return JsonResponse({"errors": {"title": [f"Enter a title of 1 to {max_length} characters."]}}, status=400)
+
+    if not rename_task(request.user, task_id, title):
+        raise Http404("Task does not exist or you do not have permission to change it.")
+
+    return JsonResponse({
+        "task": {"id": task_id, "title": title},
+        "counters": counters_json(get_counters(request.user)),
+    })
+
+
+@login_required
+@require_GET
+def agenda_tasks(request) -> JsonResponse:
+    """
+    Returns the open tasks due in a range of days, grouped by day (see `tasks.agenda`).
+
+    The range is given by `?start=` and `?end=` (ISO dates, the end included, at most `agenda.MAX_DAYS` days) in the
+    time zone `?tz=` (an IANA name); it defaults to the week from today in the current time zone. Only the days with
+    tasks are listed, and `truncated` tells whether the range holds more than `agenda.MAX_TASKS` tasks.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: JsonResponse with the range and its days, or the validation errors with status 400.
+    """
+
+    range_form = AgendaForm(request.GET)
+    if not range_form.is_valid():
+        return JsonResponse({"errors": range_form.errors}, status=400)
+
+    start, end, tz = (range_form.cleaned_data[name] for name in ('start', 'end', 'tz'))
+    result = agenda.agenda(request.user, start, end, tz)
+    return JsonResponse({
+        "start": start.isoformat(),
+        "end": end.isoformat(),
+        "time_zone": str(tz),
+        "days": agenda.agenda_json(result["days"], tz),
+        "truncated": result["truncated"],
+    })
+
+
+@login_required
+@require_http_methods(["GET", "POST"])
+def sync_changes(request) -> JsonResponse:
+    """
+    Delta sync endpoint (version 1) for mobile and offline clients.
+
+    GET returns the tasks and tags changed and deleted after `?cursor=` (0 or missing for a first sync), at most
+    `?limit=` rows per kind; the client stores the returned `cursor` and asks again while `more` is true. An expired
+    cursor gets status 410 and the client syncs from scratch.
+
+    POST applies a JSON batch `{"tags": [...], "tasks": [...]}` of upserts and deletions (see `sync.apply_changes`)
+    and returns the created IDs and the conflicting entries.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: JsonResponse with the changes, or with the result of the batch.
+    """
+
+    if request.method == "GET":
+        try:
+            cursor = sync.parse_cursor(request.GET.get('cursor'))
+            limit = min(max(int(request.GET.get('limit', sync.DEFAULT_LIMIT)), 1), sync.MAX_LIMIT)
+        except ValueError:
+            return JsonResponse({"errors": {"cursor": ["Enter a whole number."]}}, status=400)
+        try:
+            return JsonResponse(sync.changes_since(request.user.id, cursor, limit))
+        except sync.CursorExpired as error:
+            return JsonResponse({"errors": {"cursor": [str(error)]}}, status=410)
+
+    try:
+        batch = json.loads(request.body)
+        tags, tasks = batch.get("tags", []), batch.get("tasks", [])
+    except (ValueError, AttributeError):
+        return JsonResponse({"errors": {"body": ["Send a JSON object with tags and tasks lists."]}}, status=400)
+    if not isinstance(tags, list) or not isinstance(tasks, list):
+        return JsonResponse({"errors": {"body": ["Send a JSON object with tags and tasks lists."]}}, status=400)
+    if len(tags) + len(tasks) > sync.MAX_BATCH:
+        return JsonResponse({"errors": {"body": [f"Send at most {sync.MAX_BATCH} entries per batch."]}}, status=413)
+
+    try:
+        return JsonResponse(sync.apply_changes(request.user, tags, tasks))
+    except sync.InvalidChanges as error:
+        return JsonResponse({"errors": error.errors}, status=400)
@@ -1,6 +1,19 @@
 from django.apps import AppConfig
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, post_save, pre_delete
 
 
 class TasksConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "tasks"
+
+    def ready(self):
+        from . import shards
+        from .middleware import install_query_counter
+        from .search import sqlite
+
+        connection_created.connect(install_query_counter)
+        post_migrate.connect(sqlite.install, sender=self)
+        post_save.connect(shards.place_new_user, sender=settings.AUTH_USER_MODEL)
+        pre_delete.connect(shards.delete_user_data, sender=settings.AUTH_USER_MODEL)
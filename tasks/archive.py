@@ -0,0 +1,176 @@
+"""
+The archive tier of the completed tasks.
+
+Completed tasks left unchanged for TASK_ARCHIVE_AFTER_DAYS are moved from `Task` to `ArchivedTask` in batches by
+`manage.py archive_tasks`, so the hot table and the indexes of the open-task queries only hold the tasks in use.
+
+    reads     The completed list reads both tiers as one list (`completed_tiers` with `pagination.paginate`), and so
+              does its search (`search.search_tasks`). The sidebar counts the archived tasks as completed
+              (`counters`). The delta sync and the export send them as completed tasks.
+    writes    A write to tasks given by ID first moves the archived ones among them back to `Task` (`restore`) in
+              the same transaction, so the services only ever change `Task` rows; un-completing an archived task
+              restores it.
+    storage   With TASK_ARCHIVE_COMPRESS the description of an archived task is stored as zlib-compressed JSON
+              (`payload`). The columns of the list and of the title search stay plain.
+
+Archiving and restoring keep the ID of the task. Archiving takes a number of the owner's change sequence (see
+`tasks.sync`), so it serializes with the owner's writes and `shards.move_user` copies it like any other change.
+"""
+import datetime
+import json
+import zlib
+from typing import Optional
+
+from django.conf import settings
+from django.db import router, transaction
+from django.utils import timezone
+
+from . import shards, sync
+from .models import Task, ArchivedTask
+
+# the fields of a task stored in the compressed payload
+PACKED_FIELDS = ("description",)
+
+
+def cutoff(days: int = None) -> datetime.datetime:
+    """
+    The archiving threshold: completed tasks last changed before it are archived.
+
+    :param days: The age in days; defaults to TASK_ARCHIVE_AFTER_DAYS.
+    """
+
+    if days is None:
+        days = getattr(settings, "TASK_ARCHIVE_AFTER_DAYS", 90)
+    return timezone.now() - datetime.timedelta(days=days)
+
+
+def pack(task: Task, seq: int, compress: bool = False) -> ArchivedTask:
+    """
+    Builds the archived row of a completed task.
+
+    :param task: The task to archive.
+    :param seq: The owner's change sequence number of the archiving.
+    :param compress: Whether to store the description compressed in `payload`.
+    :return: The unsaved ArchivedTask.
+    """
+
+    archived = ArchivedTask(id=task.id, user_id=task.user_id, title=task.title, description=task.description,
+                            tag_id=task.tag_id, date=task.date, updated_at=task.updated_at, seq=seq)
+    if compress:
+        fields = {name: getattr(task, name) for name in PACKED_FIELDS}
+        archived.payload = zlib.compress(json.dumps(fields, separators=(",", ":")).encode())
+        archived.description = ""
+    return archived
+
+
+def unpack(payload) -> dict:
+    """
+    Returns the fields stored in the `payload` of an archived task (empty without a payload).
+    """
+
+    return json.loads(zlib.decompress(payload)) if payload else {}
+
+
+def task_values(row: dict) -> dict:
+    """
+    Turns the values of an archived task (a `values()` row with its `payload`) into the values of a completed task.
+    """
+
+    return {**row, **unpack(row.pop("payload", None)), "completed": True}
+
+
+def unarchive(archived: ArchivedTask) -> Task:
+    """
+    Builds the `Task` of an archived task (unsaved; its ID is the ID of the task).
+    """
+
+    return Task(id=archived.id, user_id=archived.user_id, title=archived.title, tag_id=archived.tag_id,
+                date=archived.date, completed=True, updated_at=archived.updated_at, seq=archived.seq,
+                **{"description": archived.description, **unpack(archived.payload)})
+
+
+def completed_tiers(user) -> list:
+    """
+    Returns the completed tasks of a user as list rows: those of `Task` and the archived ones, to be read as one list
+    (see `pagination.paginate`).
+    """
+
+    return [Task.objects.filter(user=user, completed=True).rows(), ArchivedTask.objects.filter(user=user).rows()]
+
+
+def get_archived(user, task_id: int) -> Optional[Task]:
+    """
+    Returns an archived task of a user as an unsaved `Task`, e.g. for its detail form (saved with
+    `services.save_task(..., restore=True)`).
+
+    :return: Task, or None if the user has no archived task with this ID.
+    """
+
+    archived = ArchivedTask.objects.filter(user=user, pk=task_id).first()
+    return unarchive(archived) if archived is not None else None
+
+
+def restore(user_id: int, task_ids) -> list:
+    """
+    Moves archived tasks of a user back to `Task`, unchanged but for their `updated_at` stamp (which keeps them from
+    being archived again right away).
+
+    Must be called inside the transaction of the write it precedes, after it took its sequence number (which holds
+    back `archive_tasks`). The tasks are still completed; the write decides what becomes of them.
+
+    :param user_id: The owner of the tasks.
+    :param task_ids: The IDs of the tasks (any of them, archived or not), or an ArchivedTask `values("id")` queryset.
+    :return: list of the IDs of the restored tasks.
+    """
+
+    archived = list(ArchivedTask.objects.filter(user_id=user_id, pk__in=task_ids))
+    if not archived:
+        return []
+    Task.objects.bulk_create([unarchive(row) for row in archived])
+    ArchivedTask.objects.filter(pk__in=[row.id for row in archived]).delete()
+    return [row.id for row in archived]
+
+
+def _archive_user(user_id: int, task_ids: list, before: datetime.datetime, compress: bool) -> int:
+    """
+    Archives the given tasks of one user that are still completed and unchanged since `before`, in one transaction.
+    """
+
+    try:
+        with transaction.atomic(using=router.db_for_write(Task)):
+            seq = sync.next_seq(user_id)
+            tasks = list(Task.objects.filter(pk__in=task_ids, user_id=user_id, completed=True, updated_at__lt=before))
+            ArchivedTask.objects.bulk_create([pack(task, seq, compress) for task in tasks])
+            Task.objects.filter(pk__in=[task.id for task in tasks]).delete()
+    except shards.ShardMoved:
+        # the user's data is on another shard now; it is archived there
+        return 0
+    return len(tasks)
+
+
+def archive_completed(before: datetime.datetime, batch_size: int = 1000, compress: bool = None) -> int:
+    """
+    Moves the completed tasks unchanged since `before` to the archive, in batches of `batch_size` tasks taken in ID
+    order. Every user of a batch is archived in a short transaction of their own. With sharding it archives the tasks
+    of the selected shard; the `archive_tasks` command runs it on every shard.
+
+    :param before: Completed tasks last changed before this moment are archived.
+    :param batch_size: The number of tasks read per batch.
+    :param compress: Whether to compress the descriptions; defaults to TASK_ARCHIVE_COMPRESS.
+    :return: The number of archived tasks.
+    """
+
+    if compress is None:
+        compress = getattr(settings, "TASK_ARCHIVE_COMPRESS", False)
+    archived, last_id = 0, 0
+    while True:
+        batch = list(Task.objects.filter(completed=True, updated_at__lt=before, user__isnull=False, id__gt=last_id)
+                     .order_by("id").values_list("id", "user_id")[:batch_size])
+        if not batch:
+            return archived
+        last_id = batch[-1][0]
+        by_user = {}
+        for task_id, user_id in batch:
+            by_user.setdefault(user_id, []).append(task_id)
+        for user_id, task_ids in by_user.items():
+            archived += _archive_user(user_id, task_ids, before, compress)
@@ -0,0 +1,334 @@
+import asyncio
+import datetime
+import json
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.shortcuts import render
+
+from . import archive, events, views
+from .counters import get_counters, counters_json, day_range
+from .forms import TaskForm, TaskTagForm, BulkActionForm
+from .models import Task, TagTask
+from .pagination import paginate, first_page
+from .search import search_tasks
+
+# bucket -> (template, title, counter attribute, descending, sync view handling POST, detail view)
+LIST_PAGES = {
+    "all": ("tasks/all_tasks.html", "All tasks", "open_count", False,
+            views.all_tasks, views.task_detail_all),
+    "today": ("tasks/today_tasks.html", "Today tasks", "today_count", False,
+              views.today_tasks, views.task_detail_today),
+    "overdue": ("tasks/overdue_tasks.html", "Overdue tasks", "overdue_count", False,
+                views.overdue_tasks, views.task_detail_overdue),
+    "completed": ("tasks/completed_tasks.html", "Completed Tasks", "completed_count", True,
+                  views.completed_tasks, views.task_detail_completed),
+}
+
+
+def _bucket_tasks(user, bucket: str):
+    today_start, tomorrow_start = day_range(datetime.date.today())
+    filters = {
+        "all": {"completed": False},
+        "today": {"completed": False, "date__gte": today_start, "date__lt": tomorrow_start},
+        "overdue": {"completed": False, "date__lt": today_start},
+    }
+    if bucket == "completed":
+        # both tiers (see `tasks.archive`)
+        return archive.completed_tiers(user)
+    return Task.objects.filter(user=user, **filters[bucket]).rows()
+
+
+async def _in_thread(function, *args, **kwargs):
+    """
+    Runs blocking ORM work in a worker thread of its own.
+
+    Django's ORM has no async database driver yet: every async ORM call is a hop to the single thread-sensitive
+    executor, so `asyncio.gather` over `aget()` / `acount()` calls still runs the queries one after another. Worker
+    threads (`thread_sensitive=False`) each use their own database connection, which lets independent queries of a
+    page really overlap. Keep pooling / CONN_MAX_AGE on so those connections are reused.
+
+    No request signals run in these threads, so the connection is released here like at the end of a request:
+    handed back to the pool, kept up to CONN_MAX_AGE or closed.
+    """
+
+    def run():
+        try:
+            return function(*args, **kwargs)
+        finally:
+            close_old_connections()
+
+    return await sync_to_async(run, thread_sensitive=False)()
+
+
+def _first_tags(user) -> list:
+    return list(TagTask.objects.filter(user_id=user)[:2])
+
+
+def _search(queryset, query: str, request) -> tuple:
+    tasks = search_tasks(queryset, query)
+    tiers = tasks if isinstance(tasks, list) else [tasks]
+    return sum(tier.count() for tier in tiers), first_page(tasks, request)
+
+
+async def _load(request, user, tasks, descending: bool = False, search: str = "", dated: bool = False) -> tuple:
+    """
+    Fetches the counters row, the sidebar tags and the page of tasks concurrently (see `paginate` for `dated`).
+
+    :return: tuple (counter, first tags, page, number of search results or None).
+    """
+
+    if search:
+        listing = _in_thread(_search, tasks, search, request)
+    else:
+        listing = _in_thread(paginate, tasks, request, descending, dated=dated)
+    counter, first_tags, listing = await asyncio.gather(
+        _in_thread(get_counters, user), _in_thread(_first_tags, user), listing)
+    if search:
+        return counter, first_tags, listing[1], listing[0]
+    return counter, first_tags, listing, None
+
+
+async def _render(request, template: str, context: dict) -> HttpResponse:
+    # Rendering evaluates the tag choices of the forms, so it runs in the request's sync thread in one hop.
+    return await sync_to_async(render)(request, template, context)
+
+
+async def _list_page(request, bucket: str, task_id: int = None) -> HttpResponse:
+    """
+    Renders a task list page (and the detail form of `task_id`, if given) of the given bucket.
+
+    POST requests (creating or editing a task) are handed to the synchronous view.
+    """
+
+    template, title, amount, descending, list_view, detail_view = LIST_PAGES[bucket]
+    if request.method == "POST":
+        if task_id is None:
+            return await sync_to_async(list_view)(request)
+        return await sync_to_async(detail_view)(request, task_id)
+
+    user = request.user = await request.auser()
+    search = request.GET.get('search', '') if bucket in ("all", "completed") and task_id is None else ""
+    listing = _load(request, user, _bucket_tasks(user, bucket), descending, search, bucket in ("today", "overdue"))
+    context = {"Text_of_the_page": title, "edit": task_id is not None}
+    if task_id is None:
+        counter, first_tags, tasks, found = await listing
+        context.update({
+            "form": TaskForm(user=user, initial=None if bucket == "completed" else {'date': datetime.date.today()}),
+            "submitted": 'submitted' in request.GET,
+            "bulk_form": BulkActionForm(user=user),
+            "bulk_bucket": bucket,
+        })
+    else:
+        task_info, (counter, first_tags, tasks, found) = await asyncio.gather(
+            Task.objects.filter(pk=task_id, user=user).detail().afirst(), listing)
+        if task_info is None and bucket == "completed":
+            task_info = await _in_thread(archive.get_archived, user, task_id)
+        if task_info is None:
+            raise Http404("Task does not exist or you do not have permission to view it.")
+        context.update({"form": TaskForm(instance=task_info, user=user), "task": task_info})
+
+    context.update({
+        "amount": getattr(counter, amount) if found is None else found,
+        "content_to_unpack": tasks,
+        "page": tasks,
+        "counter": counter,
+        "first_tags": first_tags,
+    })
+    if bucket == "completed":
+        context["search_url"] = "async-completed-tasks"
+    return await _render(request, template, context)
+
+
+@login_required
+async def all_tasks(request) -> HttpResponse:
+    """
+    Async version of `views.all_tasks`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: HttpResponse: Renders the all tasks page (see `views.all_tasks` for POST requests).
+    """
+
+    return await _list_page(request, "all")
+
+
+@login_required
+async def today_tasks(request) -> HttpResponse:
+    """
+    Async version of `views.today_tasks`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: HttpResponse: Renders the today tasks page (see `views.today_tasks` for POST requests).
+    """
+
+    return await _list_page(request, "today")
+
+
+@login_required
+async def overdue_tasks(request) -> HttpResponse:
+    """
+    Async version of `views.overdue_tasks`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: HttpResponse: Renders the overdue tasks page (see `views.overdue_tasks` for POST requests).
+    """
+
+    return await _list_page(request, "overdue")
+
+
+@login_required
+async def completed_tasks(request) -> HttpResponse:
+    """
+    Async version of `views.completed_tasks`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: HttpResponse: Renders the completed tasks page (see `views.completed_tasks` for POST requests).
+    """
+
+    return await _list_page(request, "completed")
+
+
+@login_required
+async def task_detail_all(request, task_id: int) -> HttpResponse:
+    """
+    Async version of `views.task_detail_all`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param task_id: The ID of the task to be detailed.
+    :return: HttpResponse: Renders the task detail page (see `views.task_detail_all` for POST requests).
+    """
+
+    return await _list_page(request, "all", task_id)
+
+
+@login_required
+async def task_detail_today(request, task_id: int) -> HttpResponse:
+    """
+    Async version of `views.task_detail_today`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param task_id: The ID of the task to be detailed.
+    :return: HttpResponse: Renders the task detail page (see `views.task_detail_today` for POST requests).
+    """
+
+    return await _list_page(request, "today", task_id)
+
+
+@login_required
+async def task_detail_overdue(request, task_id: int) -> HttpResponse:
+    """
+    Async version of `views.task_detail_overdue`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param task_id: The ID of the task to be detailed.
+    :return: HttpResponse: Renders the task detail page (see `views.task_detail_overdue` for POST requests).
+    """
+
+    return await _list_page(request, "overdue", task_id)
+
+
+@login_required
+async def task_detail_completed(request, task_id: int) -> HttpResponse:
+    """
+    Async version of `views.task_detail_completed`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param task_id: The ID of the task to be detailed.
+    :return: HttpResponse: Renders the task detail page (see `views.task_detail_completed` for POST requests).
+    """
+
+    return await _list_page(request, "completed", task_id)
+
+
+@login_required
+async def tag_filter(request, tag_id: int) -> HttpResponse:
+    """
+    Async version of `views.tag_filter`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param tag_id: The ID of the tag to filter tasks by.
+    :return: HttpResponse: Renders the filtered tasks page (see `views.tag_filter` for POST requests).
+    """
+
+    if request.method == "POST":
+        return await sync_to_async(views.tag_filter)(request, tag_id)
+
+    user = request.user = await request.auser()
+    tag_info, (counter, first_tags, tasks, _) = await asyncio.gather(
+        TagTask.objects.filter(pk=tag_id, user_id=user).afirst(),
+        _load(request, user, Task.objects.filter(user=user, tag_id=tag_id, completed=False).rows()))
+    if tag_info is None:
+        raise Http404("Tag does not exist or you do not have permission to view it.")
+
+    return await _render(request, 'tasks/filter_by_tag.html', {
+        "Text_of_the_page": tag_info.tag_name,
+        "amount": counter.tag_open_count(tag_id),
+        "content_to_unpack": tasks,
+        "page": tasks,
+        "counter": counter,
+        "first_tags": first_tags,
+        "form": TaskTagForm(user=user, tag_id=tag_id),
+        "edit": False,
+        "bulk_form": BulkActionForm(user=user),
+        "bulk_bucket": "all",
+        "bulk_filter_tag": tag_info,
+        "tag": tag_info,
+        "submitted": 'submitted' in request.GET,
+    })
+
+
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data, separators=(',', ':'))}\n\n"
+
+
+async def _event_stream(subscription, counter):
+    """
+    Yields the Server-Sent Events of a subscription: the current counters first, then every published event, with a
+    comment line as keep-alive whenever nothing happened for TASK_EVENTS_HEARTBEAT seconds.
+    """
+
+    heartbeat = getattr(settings, "TASK_EVENTS_HEARTBEAT", 15)
+    try:
+        yield "retry: 5000\n\n"
+        yield _sse("counters", {"counters": counters_json(counter)})
+        while True:
+            message = await subscription.get(heartbeat)
+            if message is None:
+                yield ": keep-alive\n\n"
+            else:
+                yield _sse(message["type"], message)
+    finally:
+        subscription.close()
+
+
+@login_required
+async def task_events(request) -> HttpResponse:
+    """
+    Streams the live changes of the user's tasks (created, edited, toggled, deleted) and counters as Server-Sent
+    Events, so open tabs can patch themselves (see `tasks.js`).
+
+    The stream stays open for as long as the tab and only works under ASGI; a WSGI worker would be blocked by it, so
+    there the response is 204, which tells EventSource not to reconnect.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: StreamingHttpResponse with content type text/event-stream.
+    """
+
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse(status=204)
+
+    user = await request.auser()
+    subscription = events.get_broker().subscribe(user.id)
+    try:
+        counter = await _in_thread(get_counters, user)
+    except BaseException:
+        subscription.close()
+        raise
+    response = StreamingHttpResponse(_event_stream(subscription, counter), content_type="text/event-stream")
+    response["Cache-Control"] = "no-cache"
+    response["X-Accel-Buffering"] = "no"
+    return response
@@ -0,0 +1,87 @@
+import datetime
+import hashlib
+from typing import Optional
+
+from django.conf import settings
+from django.contrib import messages
+from django.db.models import Count, F, Max, OuterRef, Subquery
+from django.views.decorators.http import condition
+
+from . import shards
+from .counters import day_start
+from .models import Task, TagTask, TaskCounter
+
+
+def _owner_aggregate(model, owner: str, aggregate) -> Subquery:
+    """
+    A scalar subquery aggregating the rows of `model` owned by the user of the outer counters row.
+    """
+
+    rows = model.objects.filter(**{owner: OuterRef("pk")}).order_by().values(owner)
+    return Subquery(rows.annotate(value=aggregate).values("value"))
+
+
+def user_validator(request) -> Optional[dict]:
+    """
+    Returns what the list pages of the requesting user depend on, with a single query and without rendering them.
+
+    Every page shows the sidebar, so the validator covers all the user's tasks and tags: their latest modification
+    stamps catch creates and edits, the row counts and the stamp of the counters row (saved by every task write,
+    deletes included) catch deletes. The query starts from the user's counters row, so with sharding it and its
+    subqueries run on the user's shard (see `tasks.shards`). The result is stored on the request, as the ETag and the
+    Last-Modified functions both need it. Anonymous users, users without a counters row yet (their first page builds
+    it), non-GET requests and requests with pending messages get None, which disables the conditional response.
+
+    :param request: The HTTP request.
+    :return: dict with the `tasks_changed`, `tasks`, `tags_changed`, `tags` and `counters_changed` values, or None.
+    """
+
+    if not hasattr(request, "_task_validator"):
+        validator = None
+        if (request.method in ("GET", "HEAD") and request.user.is_authenticated
+                and not len(messages.get_messages(request))):
+            with shards.use_user(request.user.id):
+                validator = TaskCounter.objects.filter(user_id=request.user.id).values(
+                    tasks_changed=_owner_aggregate(Task, "user", Max("updated_at")),
+                    tasks=_owner_aggregate(Task, "user", Count("id")),
+                    tags_changed=_owner_aggregate(TagTask, "user_id", Max("updated_at")),
+                    tags=_owner_aggregate(TagTask, "user_id", Count("id")),
+                    counters_changed=F("updated_at"),
+                ).first()
+        request._task_validator = validator
+    return request._task_validator
+
+
+def list_etag(request, *args, **kwargs) -> Optional[str]:
+    """
+    The ETag of a list page: the validator plus the user, the current day (the today / overdue lists change at
+    midnight) and the CSRF cookie the page's forms were rendered for.
+    """
+
+    validator = user_validator(request)
+    if validator is None:
+        return None
+
+    raw = "|".join([
+        str(request.user.id),
+        datetime.date.today().isoformat(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+        *(str(value) for value in validator.values()),
+    ])
+    return hashlib.sha256(raw.encode()).hexdigest()[:32]
+
+
+def list_last_modified(request, *args, **kwargs) -> Optional[datetime.datetime]:
+    """
+    The Last-Modified date of a list page: the latest change of the user's tasks, tags and counters, and no earlier
+    than the start of today.
+    """
+
+    validator = user_validator(request)
+    if validator is None:
+        return None
+    stamps = [validator["tasks_changed"], validator["tags_changed"], validator["counters_changed"]]
+    return max([day_start(datetime.date.today()), *(stamp for stamp in stamps if stamp is not None)])
+
+
+conditional_page = condition(etag_func=list_etag, last_modified_func=list_last_modified)
@@ -0,0 +1,269 @@
+import datetime
+from typing import NamedTuple, Optional, Tuple
+
+from django.db import router, transaction
+from django.db.models import Q, Count, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import Task, ArchivedTask, TaskCounter
+
+
+class TaskState(NamedTuple):
+    """
+    The fields of a task that decide which sidebar counters it is counted in.
+    """
+
+    completed: bool
+    date: Optional[datetime.datetime]
+    tag_id: Optional[int]
+
+
+def day_start(day: datetime.date, tz=None) -> datetime.datetime:
+    """
+    Returns the datetime a `date` is compared as when filtering `Task.date` with it (midnight, default time zone).
+
+    :param day: The day to convert.
+    :param tz: The time zone of the day; defaults to the default time zone.
+    :return: The aware datetime at the start of the day.
+    """
+
+    return timezone.make_aware(datetime.datetime.combine(day, datetime.time()), tz or timezone.get_default_timezone())
+
+
+def day_range(first: datetime.date, last: datetime.date = None, tz=None) -> Tuple[datetime.datetime, datetime.datetime]:
+    """
+    Returns the [start, end) datetimes of the days `first` to `last`, to filter `Task.date` with a range. Filtering
+    the datetimes with a `date` only matches the tasks due at midnight, not those with a time of day.
+
+    :param first: The first day.
+    :param last: The last day (included); defaults to `first`.
+    :param tz: The time zone of the days; defaults to the default time zone.
+    :return: tuple of the aware start of `first` and start of the day after `last`.
+    """
+
+    return day_start(first, tz), day_start((last or first) + datetime.timedelta(days=1), tz)
+
+
+def task_state(task: Task) -> TaskState:
+    """
+    Captures the counter-relevant state of a task.
+
+    :param task: The task to capture.
+    :return: TaskState of the task.
+    """
+
+    date = task.date
+    if date is not None:
+        if not isinstance(date, datetime.datetime):
+            date = day_start(date)
+        elif timezone.is_naive(date):
+            date = timezone.make_aware(date, timezone.get_default_timezone())
+    return TaskState(task.completed, date, task.tag_id)
+
+
+def _deltas(state: Optional[TaskState], today: Tuple[datetime.datetime, datetime.datetime]) -> dict:
+    """
+    Returns the counters a task in the given state contributes to, `today` being the `day_range` of today.
+    """
+
+    if state is None:
+        return {}
+    if state.completed:
+        return {"completed_count": 1}
+
+    deltas = {"open_count": 1}
+    if state.date is not None:
+        if today[0] <= state.date < today[1]:
+            deltas["today_count"] = 1
+        elif state.date < today[0]:
+            deltas["overdue_count"] = 1
+    if state.tag_id is not None:
+        deltas[state.tag_id] = 1
+    return deltas
+
+
+def _count(user_id: int, today: datetime.date) -> dict:
+    """
+    Counts the user's tasks from scratch with one aggregate and one grouped query. The archived tasks (see
+    `tasks.archive`) are completed ones, counted by a subquery of the aggregate.
+    """
+
+    today_start, tomorrow_start = day_range(today)
+    archived = (ArchivedTask.objects.filter(user_id=user_id).order_by().values("user")
+                .annotate(amount=Count("id")).values("amount"))
+    totals = Task.objects.filter(user_id=user_id).aggregate(
+        open_count=Count("id", filter=Q(completed=False)),
+        completed_count=Count("id", filter=Q(completed=True)) + Coalesce(Subquery(archived), 0),
+        today_count=Count("id", filter=Q(completed=False, date__gte=today_start, date__lt=tomorrow_start)),
+        overdue_count=Count("id", filter=Q(completed=False, date__lt=today_start)),
+    )
+    tags = (Task.objects.filter(user_id=user_id, completed=False, tag__isnull=False)
+            .values_list("tag").annotate(open_count=Count("id")))
+    totals["tag_open_counts"] = {str(tag_id): amount for tag_id, amount in tags}
+    return totals
+
+
+def rebuild(user_id: int) -> TaskCounter:
+    """
+    Recomputes the counters row of a user from the `Task` table and the archive.
+
+    :param user_id: The ID of the user.
+    :return: The rebuilt TaskCounter.
+    """
+
+    today = datetime.date.today()
+    counter, _ = TaskCounter.objects.update_or_create(
+        user_id=user_id, defaults={**_count(user_id, today), "counted_on": today})
+    return counter
+
+
+def verify(user_id: int) -> dict:
+    """
+    Compares the stored counters of a user with a fresh count.
+
+    :param user_id: The ID of the user.
+    :return: dict mapping every mismatching counter to a (stored, actual) tuple; empty if the row is correct.
+    """
+
+    counter = TaskCounter.objects.filter(user_id=user_id).first()
+    if counter is None:
+        return {"row": (None, "missing")}
+
+    actual = _count(user_id, counter.counted_on)
+    return {name: (getattr(counter, name), value) for name, value in actual.items()
+            if getattr(counter, name) != value}
+
+
+def rollover(user_ids=None, today: datetime.date = None) -> int:
+    """
+    Recomputes the date-dependent buckets (today, overdue) of every counters row computed for an earlier day.
+
+    Only open tasks due up to today are read, with one grouped query per call, so running it once a day is cheap.
+    With sharding it rolls over the rows of the selected shard (see `tasks.shards`).
+
+    :param user_ids: Optional iterable restricting the rollover to these users.
+    :param today: The day to roll over to; defaults to today.
+    :return: The number of rows rolled over.
+    """
+
+    today = today or datetime.date.today()
+    today_start, tomorrow_start = day_range(today)
+
+    with transaction.atomic(using=router.db_for_write(TaskCounter)):
+        stale = TaskCounter.objects.select_for_update().filter(counted_on__lt=today)
+        if user_ids is not None:
+            stale = stale.filter(user_id__in=user_ids)
+        counters = list(stale)
+        if not counters:
+            return 0
+
+        buckets = {
+            row["user"]: row for row in
+            Task.objects.filter(user_id__in=[counter.user_id for counter in counters], completed=False,
+                                date__lt=tomorrow_start)
+            .values("user")
+            .annotate(today_count=Count("id", filter=Q(date__gte=today_start)),
+                      overdue_count=Count("id", filter=Q(date__lt=today_start)))
+        }
+        for counter in counters:
+            row = buckets.get(counter.user_id, {})
+            counter.today_count = row.get("today_count", 0)
+            counter.overdue_count = row.get("overdue_count", 0)
+            counter.counted_on = today
+        TaskCounter.objects.bulk_update(counters, ["today_count", "overdue_count", "counted_on"])
+
+    return len(counters)
+
+
+def get_counters(user) -> TaskCounter:
+    """
+    Returns the counters row of a user, creating it or rolling it over to today if needed.
+
+    :param user: The user whose counters are requested.
+    :return: TaskCounter of the user.
+    """
+
+    counter = TaskCounter.objects.filter(user=user).first()
+    if counter is None:
+        return rebuild(user.id)
+    if counter.counted_on < datetime.date.today():
+        rollover([user.id])
+        counter.refresh_from_db()
+    return counter
+
+
+def counters_json(counter: TaskCounter) -> dict:
+    """
+    Serializes the sidebar counters of a user.
+
+    :param counter: The user's TaskCounter.
+    :return: dict with the open, completed, today, overdue and per-tag open counts.
+    """
+
+    return {
+        "open": counter.open_count,
+        "completed": counter.completed_count,
+        "today": counter.today_count,
+        "overdue": counter.overdue_count,
+        "tags": counter.tag_open_counts,
+    }
+
+
+def record_change(user_id: Optional[int], before: Optional[TaskState],
+                  after: Optional[TaskState]) -> Optional[TaskCounter]:
+    """
+    Applies a task write to the counters row of its owner.
+
+    Must be called after the write, inside the same transaction. `before` is None for created tasks and `after` is
+    None for deleted ones. A missing or stale row is rebuilt from the table instead, which already includes the write.
+
+    :param user_id: The ID of the task owner.
+    :param before: TaskState before the write.
+    :param after: TaskState after the write.
+    :return: The updated TaskCounter, or None without an owner.
+    """
+
+    return record_changes(user_id, [(before, after)])
+
+
+def record_changes(user_id: Optional[int], changes: list) -> Optional[TaskCounter]:
+    """
+    Applies several task writes of one owner to its counters row with a single UPDATE.
+
+    :param user_id: The ID of the task owner.
+    :param changes: list of (before, after) TaskState pairs, as for `record_change`.
+    :return: The updated TaskCounter, or None without an owner or changes.
+    """
+
+    if user_id is None or not changes:
+        return None
+
+    today = datetime.date.today()
+    counter = TaskCounter.objects.select_for_update().filter(user_id=user_id).first()
+    if counter is None or counter.counted_on != today:
+        return rebuild(user_id)
+
+    today_range = day_range(today)
+    deltas = {}
+    for before, after in changes:
+        for key, value in _deltas(after, today_range).items():
+            deltas[key] = deltas.get(key, 0) + value
+        for key, value in _deltas(before, today_range).items():
+            deltas[key] = deltas.get(key, 0) - value
+
+    tag_counts = dict(counter.tag_open_counts)
+    for key, value in deltas.items():
+        if not value:
+            continue
+        if isinstance(key, str):
+            setattr(counter, key, getattr(counter, key) + value)
+        else:
+            amount = tag_counts.get(str(key), 0) + value
+            if amount:
+                tag_counts[str(key)] = amount
+            else:
+                tag_counts.pop(str(key), None)
+    counter.tag_open_counts = tag_counts
+    counter.save()
+    return counter
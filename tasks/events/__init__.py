@@ -0,0 +1,67 @@
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from .. import shards
+from ..counters import counters_json
+from ..models import Task, TaskCounter
+from .base import Broker
+
+DEFAULT_BROKERS = {
+    'postgresql': 'tasks.events.postgres.PostgresBroker',
+}
+
+
+@lru_cache(maxsize=None)
+def _broker(path: str) -> Broker:
+    return import_string(path)()
+
+
+def get_broker() -> Broker:
+    """
+    Returns the live event broker of this process.
+
+    The broker is taken from the `TASK_EVENTS_BROKER` setting (a dotted path) and otherwise chosen by the database
+    vendor, falling back to the in-process `MemoryBroker`.
+
+    :return: Broker instance, shared by the whole process.
+    """
+
+    path = getattr(settings, 'TASK_EVENTS_BROKER', None)
+    if path is None:
+        path = DEFAULT_BROKERS.get(connection.vendor, 'tasks.events.base.MemoryBroker')
+    return _broker(path)
+
+
+def task_json(task: Task) -> dict:
+    """
+    Serializes the fields of a task shown in the lists.
+    """
+
+    return {
+        "id": task.id,
+        "title": task.title,
+        "completed": task.completed,
+        "date": task.date.isoformat() if task.date else None,
+        "tag": task.tag_id,
+    }
+
+
+def publish(user_id: Optional[int], event: str, counter: Optional[TaskCounter] = None, **data) -> None:
+    """
+    Sends a live event to the open streams of a user once the current transaction commits.
+
+    :param user_id: The ID of the user whose data changed; None is ignored.
+    :param event: The event type: created, edited, toggled, deleted or changed (anything a tab cannot patch in place).
+    :param counter: The user's TaskCounter after the write, sent along as the refreshed counters.
+    :param data: The rest of the event.
+    """
+
+    if user_id is None:
+        return
+    if counter is not None:
+        data["counters"] = counters_json(counter)
+    get_broker().publish(user_id, {"type": event, **data}, using=shards.database(user_id))
@@ -0,0 +1,122 @@
+import asyncio
+import threading
+from collections import defaultdict
+from typing import Optional
+
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+# Events a subscriber has not read yet; a subscriber falling further behind gets a single "changed" event instead.
+QUEUE_SIZE = 100
+
+
+class Subscription:
+    """
+    The live events of one user as received by one open stream (a browser tab).
+
+    Messages are handed over from the publishing thread to the event loop of the stream.
+    """
+
+    def __init__(self, broker: "Broker", user_id: int):
+        self.broker = broker
+        self.user_id = user_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(QUEUE_SIZE)
+
+    def put(self, message: dict) -> None:
+        """
+        Queues a message; safe to call from any thread.
+        """
+
+        try:
+            self.loop.call_soon_threadsafe(self._put, message)
+        except RuntimeError:
+            # the loop of the stream is closed
+            self.close()
+
+    def _put(self, message: dict) -> None:
+        if self.queue.full():
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            message = {"type": "changed"}
+        self.queue.put_nowait(message)
+
+    async def get(self, timeout: float) -> Optional[dict]:
+        """
+        Waits for the next message.
+
+        :param timeout: Seconds to wait.
+        :return: dict, the message, or None if none arrived in time.
+        """
+
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class Broker:
+    """
+    Base class of the live event brokers.
+
+    `publish` is called by `tasks.services` inside the transaction of a write (on the database `using`, the shard of the
+    user's data) and must deliver the message only once it commits. Every process keeps the subscriptions of its own
+    open streams and `dispatch`es the messages to them; brokers fanning out across processes deliver every message to
+    the `dispatch` of every process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._subscriptions = defaultdict(set)
+
+    def publish(self, user_id: int, message: dict, using: str = DEFAULT_DB_ALIAS) -> None:
+        raise NotImplementedError
+
+    def subscribe(self, user_id: int) -> Subscription:
+        """
+        Starts receiving the events of a user. Must be called from the event loop of the stream.
+
+        :param user_id: The ID of the user.
+        :return: Subscription; close it when the stream ends.
+        """
+
+        subscription = Subscription(self, user_id)
+        with self._lock:
+            self._subscriptions[user_id].add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            subscriptions = self._subscriptions.get(subscription.user_id)
+            if subscriptions is not None:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self._subscriptions[subscription.user_id]
+
+    def dispatch(self, user_id: int, message: dict) -> None:
+        """
+        Hands a message to the streams of the user open in this process.
+        """
+
+        with self._lock:
+            subscriptions = list(self._subscriptions.get(user_id, ()))
+        for subscription in subscriptions:
+            subscription.put(message)
+
+    def subscribers(self) -> int:
+        with self._lock:
+            return sum(len(subscriptions) for subscriptions in self._subscriptions.values())
+
+
+class MemoryBroker(Broker):
+    """
+    In-process broker: only reaches the streams served by the process that made the write.
+
+    Enough for a single ASGI worker and for the tests; use a broker fanning out across processes (e.g.
+    `tasks.events.postgres.PostgresBroker`) with several workers.
+    """
+
+    def publish(self, user_id: int, message: dict, using: str = DEFAULT_DB_ALIAS) -> None:
+        transaction.on_commit(lambda: self.dispatch(user_id, message), using=using)
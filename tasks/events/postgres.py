@@ -0,0 +1,101 @@
+import json
+import logging
+import select
+import threading
+import time
+from typing import Iterator
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.backends.postgresql.psycopg_any import is_psycopg3
+
+from .base import Broker
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "task_events"
+
+# NOTIFY payloads are limited to 8000 bytes; larger messages are replaced by a "changed" event.
+MAX_PAYLOAD = 7900
+
+
+class PostgresBroker(Broker):
+    """
+    Fans the events out across worker processes with PostgreSQL `LISTEN` / `NOTIFY`.
+
+    `publish` sends a `NOTIFY` on the connection of the write: PostgreSQL delivers it when the transaction commits and
+    drops it on rollback. Writes on another shard than the listeners' database notify once they commit. Every process
+    with open streams runs one listener thread with a dedicated connection that dispatches the notifications to its
+    subscriptions.
+    """
+
+    def __init__(self, using: str = "default"):
+        super().__init__()
+        self.using = using
+        self._listener = None
+
+    def publish(self, user_id: int, message: dict, using: str = DEFAULT_DB_ALIAS) -> None:
+        payload = json.dumps({"user": user_id, **message}, separators=(",", ":"))
+        if len(payload) > MAX_PAYLOAD:
+            counters = {"counters": message["counters"]} if "counters" in message else {}
+            payload = json.dumps({"user": user_id, "type": "changed", **counters}, separators=(",", ":"))
+        if using == self.using:
+            self._notify(payload)
+        else:
+            transaction.on_commit(lambda: self._notify(payload), using=using)
+
+    def _notify(self, payload: str) -> None:
+        with connections[self.using].cursor() as cursor:
+            cursor.execute("SELECT pg_notify(%s, %s)", [CHANNEL, payload])
+
+    def subscribe(self, user_id: int):
+        with self._lock:
+            if self._listener is None or not self._listener.is_alive():
+                self._listener = threading.Thread(target=self._listen, name="task-events-listener", daemon=True)
+                self._listener.start()
+        return super().subscribe(user_id)
+
+    def _listen(self) -> None:
+        """
+        Receives the notifications of all users, reconnecting with a growing delay after errors.
+        """
+
+        delay = 1
+        while True:
+            try:
+                self._receive()
+            except Exception:
+                logger.exception("Task events listener failed; reconnecting in %ss", delay)
+                time.sleep(delay)
+                delay = min(delay * 2, 30)
+            else:
+                delay = 1
+
+    def _receive(self) -> None:
+        wrapper = connections[self.using]
+        # a connection of its own, outside the connection pool: it stays open as long as the process
+        connection = wrapper.Database.connect(**wrapper.get_connection_params())
+        try:
+            connection.autocommit = True
+            with connection.cursor() as cursor:
+                cursor.execute(f"LISTEN {CHANNEL}")
+            while True:
+                for notify in self._notifies(connection):
+                    message = json.loads(notify.payload)
+                    self.dispatch(message.pop("user"), message)
+        finally:
+            connection.close()
+
+    @staticmethod
+    def _notifies(connection) -> Iterator:
+        """
+        Waits up to 30 seconds for notifications and returns those received.
+        """
+
+        if is_psycopg3:
+            return connection.notifies(timeout=30)
+        if select.select([connection], [], [], 30) == ([], [], []):
+            return []
+        connection.poll()
+        notifies = list(connection.notifies)
+        connection.notifies.clear()
+        return notifies
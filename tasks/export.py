@@ -0,0 +1,155 @@
+import csv
+import heapq
+import zlib
+from typing import Iterable, Iterator
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import F
+from django.http import Http404, StreamingHttpResponse
+
+from . import archive, shards
+from .models import Task, ArchivedTask
+
+FIELDS = ["id", "title", "description", "date", "completed", "tag", "updated_at"]
+# the keys of the fields in the rows of `task_rows`
+COLUMNS = ["id", "title", "description", "date", "completed", "tag_name", "updated_at"]
+
+# content type of every format
+FORMATS = {
+    "csv": "text/csv; charset=utf-8",
+    "ndjson": "application/x-ndjson",
+}
+
+# Rows are joined into chunks of about this size before they are sent (or compressed).
+BUFFER_SIZE = 64 * 1024
+
+
+def task_rows(user_id: int) -> Iterator[dict]:
+    """
+    Reads all tasks of a user with their tag names, in constant memory.
+
+    The tag name comes from a LEFT JOIN in the same query, and the rows are fetched with a server-side cursor
+    (`iterator`) in chunks of TASK_EXPORT_CHUNK_SIZE rows, so no more than one chunk is ever held in memory. The
+    archived tasks (see `tasks.archive`) are read the same way and merged in by ID.
+
+    The rows are read from the user's shard (see `tasks.shards`), chosen when the iteration starts: a streamed response
+    is read after the request has left the `use_user` block of `ShardRoutingMiddleware`.
+
+    :param user_id: The ID of the user.
+    :return: Iterator of dicts, ordered by task ID.
+    """
+
+    using = shards.database(user_id)
+    chunk_size = getattr(settings, "TASK_EXPORT_CHUNK_SIZE", 2000)
+    tasks = (Task.objects.using(using).filter(user_id=user_id).order_by("id").export_rows()
+             .iterator(chunk_size=chunk_size))
+    archived = (ArchivedTask.objects.using(using).filter(user_id=user_id).order_by("id")
+                .values("id", "title", "description", "payload", "date", "updated_at", tag_name=F("tag__tag_name"))
+                .iterator(chunk_size=chunk_size))
+    yield from heapq.merge(tasks, map(archive.task_values, archived), key=lambda row: row["id"])
+
+
+class _Line:
+    """
+    The file-like object `csv.writer` writes a row to, returning it instead of storing it.
+    """
+
+    def write(self, value: str) -> str:
+        return value
+
+
+def csv_lines(rows: Iterable[dict]) -> Iterator[str]:
+    writer = csv.writer(_Line())
+    yield writer.writerow(FIELDS)
+    for row in rows:
+        yield writer.writerow([row[column] for column in COLUMNS])
+
+
+def ndjson_lines(rows: Iterable[dict]) -> Iterator[str]:
+    encoder = DjangoJSONEncoder(ensure_ascii=False, separators=(",", ":"))
+    for row in rows:
+        yield encoder.encode({field: row[column] for field, column in zip(FIELDS, COLUMNS)}) + "\n"
+
+
+def buffered(lines: Iterable[str], size: int = BUFFER_SIZE) -> Iterator[bytes]:
+    """
+    Joins the lines into chunks of about `size` bytes; sending every row on its own costs a write per row.
+    """
+
+    chunk, length = [], 0
+    for line in lines:
+        data = line.encode()
+        chunk.append(data)
+        length += len(data)
+        if length >= size:
+            yield b"".join(chunk)
+            chunk, length = [], 0
+    if chunk:
+        yield b"".join(chunk)
+
+
+def gzipped(chunks: Iterable[bytes]) -> Iterator[bytes]:
+    """
+    Compresses a stream of chunks into one gzip stream, chunk by chunk.
+    """
+
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        data = compressor.compress(chunk)
+        if data:
+            yield data
+    yield compressor.flush()
+
+
+def export(user_id: int, export_format: str, compress: bool = False) -> Iterator[bytes]:
+    """
+    Streams all tasks of a user as CSV or NDJSON, optionally gzip-compressed.
+
+    :param user_id: The ID of the user.
+    :param export_format: "csv" or "ndjson".
+    :param compress: Whether to gzip the output.
+    :return: Iterator of bytes chunks.
+    """
+
+    lines = csv_lines if export_format == "csv" else ndjson_lines
+    chunks = buffered(lines(task_rows(user_id)))
+    return gzipped(chunks) if compress else chunks
+
+
+def parse_format(name: str) -> tuple:
+    """
+    Splits an export file extension like "csv.gz" into the format and whether it is compressed.
+
+    :raises ValueError: for unknown formats.
+    """
+
+    export_format, _, compression = name.partition(".")
+    if export_format not in FORMATS or compression not in ("", "gz"):
+        raise ValueError(name)
+    return export_format, compression == "gz"
+
+
+@login_required
+def export_tasks(request, file_format: str) -> StreamingHttpResponse:
+    """
+    Downloads all tasks of the user with their tags as tasks.csv, tasks.ndjson, tasks.csv.gz or tasks.ndjson.gz.
+
+    The file is streamed while the rows are read (see `export`), so the memory of the worker does not grow with the
+    number of tasks.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :param file_format: The file extension: csv or ndjson, optionally followed by .gz.
+    :return: StreamingHttpResponse with the file as an attachment.
+    """
+
+    try:
+        export_format, compress = parse_format(file_format)
+    except ValueError:
+        raise Http404("Unknown export format.")
+
+    response = StreamingHttpResponse(export(request.user.id, export_format, compress),
+                                     content_type="application/gzip" if compress else FORMATS[export_format])
+    response["Content-Disposition"] = f'attachment; filename="tasks.{file_format}"'
+    return response
@@ -1,6 +1,13 @@
+import datetime
+import zoneinfo
+
 from django import forms
+from django.db.models import QuerySet
 from django.forms import ModelForm
-from .models import Task, TagTask
+from django.utils import timezone
+from . import agenda
+from .counters import day_range
+from .models import Task, ArchivedTask, TagTask
 
 
 class TaskForm(ModelForm):
@@ -96,9 +103,11 @@ class TagForm(ModelForm):
     A form for creating and updating TagTask instances.
 
     This form includes a field for the tag's name and customizes the widget for better styling with Bootstrap.
+    Tag names are unique per user, so the name is checked against the other tags of the current user.
 
     Attributes:
         Meta: A class that defines the model and fields used in the form.
+        __init__: Initializes the form with the current user.
     """
 
     class Meta:
@@ -111,3 +120,187 @@ class TagForm(ModelForm):
         widgets = {
             'tag_name': forms.TextInput(attrs={'class': 'form-control'}),
         }
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes the TagForm.
+
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments, including the current user.
+        """
+
+        self.user = kwargs.pop('user', None)
+        super(TagForm, self).__init__(*args, **kwargs)
+
+    def clean_tag_name(self) -> str:
+        tag_name = self.cleaned_data['tag_name']
+        # the owner is not a field of the form, so the model's unique constraint is not validated by it
+        if self.user is not None and TagTask.objects.filter(user_id=self.user, tag_name=tag_name).exclude(
+                pk=self.instance.pk).exists():
+            raise forms.ValidationError("You already have a tag with this name.")
+        return tag_name
+
+
+class MultipleIntegerField(forms.Field):
+    """
+    A field accepting a repeated integer parameter (e.g. several `task_id` checkboxes).
+    """
+
+    widget = forms.MultipleHiddenInput
+
+    def to_python(self, value):
+        if not value:
+            return []
+        try:
+            return [int(item) for item in value]
+        except (TypeError, ValueError):
+            raise forms.ValidationError("Enter whole numbers.", code='invalid')
+
+
+class BulkActionForm(forms.Form):
+    """
+    A form describing a bulk action on a set of tasks.
+
+    The tasks are selected by their IDs (`task_id`) or, with `select_all`, by a filter alone: a list (`bucket`) and/or
+    a tag (`filter_tag`), e.g. "all overdue tasks tagged Work". Selected IDs are narrowed by the filter as well.
+
+    Attributes:
+        action: The action to apply: complete, reopen, delete, retag or reschedule.
+        task_id: The IDs of the selected tasks.
+        select_all: Whether to ignore the IDs and select every task matching the filter.
+        bucket: The list whose tasks are selected when no IDs are given.
+        filter_tag: The tag whose tasks are selected when no IDs are given.
+        tag: The new tag of the tasks (retag); empty removes the tag.
+        days: The number of days to shift the due dates by (reschedule).
+    """
+
+    ACTIONS = [
+        ('complete', 'Complete'),
+        ('reopen', 'Reopen'),
+        ('delete', 'Delete'),
+        ('retag', 'Change tag'),
+        ('reschedule', 'Shift due date'),
+    ]
+    BUCKETS = [
+        ('', '---------'),
+        ('all', 'All'),
+        ('today', 'Today'),
+        ('overdue', 'Overdue'),
+        ('completed', 'Completed'),
+    ]
+
+    action = forms.ChoiceField(choices=ACTIONS, widget=forms.Select(attrs={'class': 'form-select'}))
+    task_id = MultipleIntegerField(required=False)
+    select_all = forms.BooleanField(required=False)
+    bucket = forms.ChoiceField(choices=BUCKETS, required=False, widget=forms.HiddenInput)
+    filter_tag = forms.ModelChoiceField(queryset=TagTask.objects.none(), required=False, widget=forms.HiddenInput)
+    tag = forms.ModelChoiceField(queryset=TagTask.objects.none(), required=False,
+                                 widget=forms.Select(attrs={'class': 'form-select custom-tag-select'}))
+    days = forms.IntegerField(required=False, min_value=-3650, max_value=3650,
+                              widget=forms.NumberInput(attrs={'class': 'form-control', 'placeholder': 'Days'}))
+
+    def __init__(self, *args, **kwargs):
+        """
+        Initializes the BulkActionForm.
+
+        This method restricts both tag fields to the tags of the current user.
+
+        :param args: Additional positional arguments.
+        :param kwargs: Additional keyword arguments, including the current user.
+        """
+
+        user = kwargs.pop('user', None)
+        super(BulkActionForm, self).__init__(*args, **kwargs)
+        self.user = user
+        if user:
+            self.fields['tag'].queryset = TagTask.objects.filter(user_id=user)
+            self.fields['filter_tag'].queryset = TagTask.objects.filter(user_id=user)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if cleaned_data.get('select_all'):
+            if not (cleaned_data.get('bucket') or cleaned_data.get('filter_tag')):
+                raise forms.ValidationError("Choose a list or a tag to select all tasks of.", code='empty_filter')
+        elif not cleaned_data.get('task_id'):
+            raise forms.ValidationError("Select some tasks.", code='empty_selection')
+        if cleaned_data.get('action') == 'reschedule' and cleaned_data.get('days') is None:
+            self.add_error('days', "Enter the number of days to shift the due dates by.")
+        return cleaned_data
+
+    def selected_tasks(self) -> QuerySet:
+        """
+        Returns the tasks selected by the cleaned form: the given IDs (or all tasks), narrowed by the filters.
+
+        :return: QuerySet of the user's selected tasks.
+        """
+
+        today_start, tomorrow_start = day_range(datetime.date.today())
+        buckets = {
+            'all': {'completed': False},
+            'today': {'completed': False, 'date__gte': today_start, 'date__lt': tomorrow_start},
+            'overdue': {'completed': False, 'date__lt': today_start},
+            'completed': {'completed': True},
+        }
+
+        tasks = Task.objects.filter(user=self.user)
+        if not self.cleaned_data.get('select_all'):
+            tasks = tasks.filter(id__in=self.cleaned_data['task_id'])
+        if self.cleaned_data.get('bucket'):
+            tasks = tasks.filter(**buckets[self.cleaned_data['bucket']])
+        if self.cleaned_data.get('filter_tag'):
+            tasks = tasks.filter(tag=self.cleaned_data['filter_tag'])
+        return tasks
+
+    def selected_archived(self) -> QuerySet:
+        """
+        Returns the archived tasks selected by the cleaned form (see `tasks.archive`): the given IDs (or all archived
+        tasks), none for the lists of open tasks.
+
+        :return: QuerySet of the user's selected archived tasks.
+        """
+
+        tasks = ArchivedTask.objects.filter(user=self.user)
+        if not self.cleaned_data.get('select_all'):
+            tasks = tasks.filter(id__in=self.cleaned_data['task_id'])
+        if self.cleaned_data.get('bucket') not in (None, '', 'completed'):
+            tasks = tasks.none()
+        if self.cleaned_data.get('filter_tag'):
+            tasks = tasks.filter(tag=self.cleaned_data['filter_tag'])
+        return tasks
+
+
+class AgendaForm(forms.Form):
+    """
+    The range of days of the agenda (see `tasks.agenda`), read from the query string.
+
+    Attributes:
+        start: The first day; defaults to today in the time zone.
+        end: The last day (included); defaults to DEFAULT_DAYS days from `start`. At most MAX_DAYS days are shown.
+        tz: The IANA name of the user's time zone (e.g. "Europe/Paris"); defaults to the current time zone.
+    """
+
+    start = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    end = forms.DateField(required=False, widget=forms.DateInput(attrs={'class': 'form-control', 'type': 'date'}))
+    tz = forms.CharField(required=False, max_length=64, widget=forms.HiddenInput)
+
+    def clean_tz(self):
+        name = self.cleaned_data['tz']
+        if not name:
+            return timezone.get_current_timezone()
+        try:
+            return zoneinfo.ZoneInfo(name)
+        except (zoneinfo.ZoneInfoNotFoundError, ValueError):
+            raise forms.ValidationError("Enter a time zone name such as Europe/Paris.", code='invalid')
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if 'tz' not in cleaned_data or self.has_error('start') or self.has_error('end'):
+            return cleaned_data
+        start = cleaned_data.get('start') or timezone.localdate(timezone=cleaned_data['tz'])
+        end = cleaned_data.get('end') or start + datetime.timedelta(days=agenda.DEFAULT_DAYS - 1)
+        if end < start:
+            raise forms.ValidationError("The end of the range is before its start.", code='invalid_range')
+        if (end - start).days >= agenda.MAX_DAYS:
+            raise forms.ValidationError(f"Ask for at most {agenda.MAX_DAYS} days.", code='range_too_long')
+        cleaned_data['start'], cleaned_data['end'] = start, end
+        return cleaned_data
@@ -0,0 +1,247 @@
+import csv
+import gzip
+import io
+import json
+import time
+from contextlib import contextmanager
+from itertools import islice
+from typing import IO, Iterable, Iterator
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.http import JsonResponse
+from django.utils import timezone
+from django.views.decorators.http import require_POST
+
+from . import counters, events, metrics, page_cache, shards, sync
+from .models import Task, TagTask
+
+TASK_FIELDS = ("title", "description", "date", "completed")
+
+# Errors kept in the report; further failed rows are only counted.
+MAX_ERRORS = 1000
+
+TRUE_VALUES = {"true", "t", "yes", "y", "1", "x", "done", "completed"}
+
+
+class ImportReport:
+    """
+    The outcome of an import.
+
+    Attributes:
+        created (int): Tasks created.
+        tags_created (int): Tags created (names that matched none of the user's tags).
+        failed (int): Rows skipped because they were invalid.
+        errors (list): (line, errors per field) of the first MAX_ERRORS failed rows.
+        seconds (float): Duration of the import.
+    """
+
+    def __init__(self):
+        self.created = self.tags_created = self.failed = 0
+        self.errors = []
+        self.seconds = 0.0
+
+    def fail(self, line: int, errors: dict) -> None:
+        self.failed += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append((line, errors))
+
+    @property
+    def rows_per_second(self) -> float:
+        return (self.created + self.failed) / self.seconds if self.seconds else 0.0
+
+    def as_dict(self) -> dict:
+        return {
+            "created": self.created,
+            "tags_created": self.tags_created,
+            "failed": self.failed,
+            "errors": [{"line": line, "errors": errors} for line, errors in self.errors],
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(self.rows_per_second, 1),
+        }
+
+
+@contextmanager
+def _text(stream: IO[bytes]) -> Iterator[io.TextIOWrapper]:
+    """
+    Decodes an uploaded file as UTF-8 (with or without BOM), gunzipping it on the fly if it starts with the gzip magic.
+
+    The wrappers are detached (or, for the gzip reader, closed without its file object) when the block ends, so the
+    stream stays open for the caller, who owns it.
+    """
+
+    buffered = stream if hasattr(stream, "peek") else io.BufferedReader(stream)
+    compressed = buffered.peek(2)[:2] == b"\x1f\x8b"
+    binary = gzip.GzipFile(fileobj=buffered) if compressed else buffered
+    text = io.TextIOWrapper(binary, encoding="utf-8-sig", newline="")
+    try:
+        yield text
+    finally:
+        text.detach()
+        if compressed:
+            binary.close()
+        if buffered is not stream:
+            buffered.detach()
+
+
+def csv_rows(stream: IO[bytes]) -> Iterator[tuple]:
+    """
+    Parses a CSV file with a header row (the columns of the CSV export) one row at a time.
+
+    :return: Iterator of (line number, dict of the row).
+    """
+
+    with _text(stream) as text:
+        reader = csv.DictReader(text)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def ndjson_rows(stream: IO[bytes]) -> Iterator[tuple]:
+    """
+    Parses a file of JSON objects, one per line (the NDJSON export), one line at a time.
+
+    :return: Iterator of (line number, dict of the row, or None for a line that is not a JSON object).
+    """
+
+    with _text(stream) as text:
+        for line_number, line in enumerate(text, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row if isinstance(row, dict) else None
+
+
+PARSERS = {"csv": csv_rows, "ndjson": ndjson_rows}
+
+
+def parse_format(filename: str) -> str:
+    """
+    Picks the parser of a file by its extension (tasks.csv, tasks.ndjson.gz, …).
+
+    :raises ValueError: for unknown extensions.
+    """
+
+    name = filename.lower().removesuffix(".gz")
+    for export_format in PARSERS:
+        if name.endswith(f".{export_format}"):
+            return export_format
+    raise ValueError(filename)
+
+
+def _clean_row(row: dict) -> tuple:
+    """
+    Validates the task fields of a row with the model fields and its tag name with the tag model field.
+
+    :return: tuple (dict of the task values, tag name or None, dict of the errors per field).
+    """
+
+    # CSV cells are strings, so "", "true" or "done" are read as well as JSON's null and true
+    row = {key: value for key, value in row.items() if key is not None}
+    if "completed" in row and not isinstance(row["completed"], bool):
+        row["completed"] = str(row["completed"] or "").strip().lower() in TRUE_VALUES
+    if row.get("date") == "":
+        row["date"] = None
+    if "description" in row and row["description"] is None:
+        row["description"] = ""
+    values, errors = sync.clean_fields(Task, row, TASK_FIELDS, creating=True)
+    if values.get("date") is not None and timezone.is_naive(values["date"]):
+        values["date"] = timezone.make_aware(values["date"])
+
+    tag_name = str(row.get("tag") or "").strip() or None
+    if tag_name is not None:
+        _, tag_errors = sync.clean_fields(TagTask, {"tag_name": tag_name}, ("tag_name",), creating=True)
+        errors.update({"tag": messages for messages in tag_errors.values()})
+    return values, tag_name, errors
+
+
+def _import_batch(user, rows: list, tags: dict, report: ImportReport) -> None:
+    """
+    Validates a batch of rows, creates the tags it names that do not exist yet and inserts its tasks, with one
+    `bulk_create` per model.
+    """
+
+    seq = sync.next_seq(user.id)
+    valid = []
+    for line, row in rows:
+        if row is None:
+            report.fail(line, {"row": ["Not a JSON object."]})
+            continue
+        values, tag_name, errors = _clean_row(row)
+        if errors:
+            report.fail(line, errors)
+        else:
+            valid.append((values, tag_name))
+
+    new_names = list(dict.fromkeys(name for _, name in valid if name is not None and name not in tags))
+    for tag in TagTask.objects.bulk_create([TagTask(user_id=user, tag_name=name, seq=seq) for name in new_names]):
+        tags[tag.tag_name] = tag.id
+    report.tags_created += len(new_names)
+
+    Task.objects.bulk_create([Task(user=user, tag_id=tags.get(name), seq=seq, **values) for values, name in valid])
+    report.created += len(valid)
+
+
+def import_tasks(user, rows: Iterable[tuple], batch_size: int = None) -> ImportReport:
+    """
+    Imports tasks (and the tags they name) for a user from parsed rows, e.g. from `csv_rows` or `ndjson_rows`.
+
+    The rows are consumed lazily in batches of `batch_size` (TASK_IMPORT_BATCH_SIZE by default), so memory stays
+    bounded by one batch. Tag names are matched against a map of the user's tags loaded with a single query; names
+    not in it are created once. Invalid rows are skipped and reported, the valid ones are written; the whole import
+    runs in one transaction and the counters are rebuilt once at the end.
+
+    :param user: The user the tasks are imported for.
+    :param rows: Iterable of (line number, dict of the row) tuples.
+    :param batch_size: Rows validated and inserted per batch.
+    :return: ImportReport.
+    """
+
+    batch_size = batch_size or getattr(settings, "TASK_IMPORT_BATCH_SIZE", 1000)
+    report = ImportReport()
+    started = time.perf_counter()
+    rows = iter(rows)
+    with shards.atomic(user.id):
+        # tag name -> ID (tag names are unique per user)
+        tags = dict(TagTask.objects.filter(user_id=user).values_list("tag_name", "id"))
+        while batch := list(islice(rows, batch_size)):
+            _import_batch(user, batch, tags, report)
+
+        if report.created or report.tags_created:
+            counter = counters.rebuild(user.id)
+            page_cache.bump_version(user.id)
+            events.publish(user.id, "changed", counter)
+    metrics.TASKS_CREATED.inc(report.created)
+    report.seconds = time.perf_counter() - started
+    return report
+
+
+@login_required
+@require_POST
+def upload_tasks(request) -> JsonResponse:
+    """
+    Imports the tasks of an uploaded CSV or NDJSON file (optionally gzipped), e.g. an export of this app or of another
+    to-do tool converted to its columns: title, description, date, completed and tag (a tag name).
+
+    The upload is parsed while it is read from the upload handler's file (see `import_tasks`).
+
+    :param request: The HTTP request object containing metadata about the request; `file` holds the upload.
+    :return: JsonResponse with the import report, or the errors with status 400.
+    """
+
+    upload = request.FILES.get("file")
+    if upload is None:
+        return JsonResponse({"errors": {"file": ["Upload a CSV or NDJSON file."]}}, status=400)
+    try:
+        parser = PARSERS[parse_format(upload.name)]
+    except ValueError:
+        return JsonResponse({"errors": {"file": ["Upload a .csv or .ndjson file, optionally gzipped."]}}, status=400)
+
+    try:
+        report = import_tasks(request.user, parser(upload.file))
+    except (UnicodeDecodeError, csv.Error, OSError, EOFError) as error:
+        return JsonResponse({"errors": {"file": [f"Could not read the file: {error}"]}}, status=400)
+    return JsonResponse(report.as_dict())
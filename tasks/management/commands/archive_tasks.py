@@ -0,0 +1,32 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from tasks import archive, shards
+
+
+class Command(BaseCommand):
+    """
+    Moves the completed tasks left unchanged for --days days to the archive table (see `tasks.archive`), in batches
+    of --batch-size tasks. Runs on every shard (see `tasks.shards`).
+
+    Usage (e.g. daily from cron):
+        python manage.py archive_tasks [--days 90] [--batch-size 1000] [--compress]
+    """
+
+    help = "Moves old completed tasks to the archive table."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, help="Archive the completed tasks unchanged for DAYS days "
+                                                     "(default: TASK_ARCHIVE_AFTER_DAYS).")
+        parser.add_argument('--batch-size', type=int, default=getattr(settings, "TASK_ARCHIVE_BATCH_SIZE", 1000),
+                            help="Tasks read per batch.")
+        parser.add_argument('--compress', action='store_true', default=None,
+                            help="Store the descriptions compressed (default: TASK_ARCHIVE_COMPRESS).")
+
+    def handle(self, *args, **options):
+        before = archive.cutoff(options['days'])
+        archived = 0
+        for alias in shards.databases():
+            with shards.use(alias):
+                archived += archive.archive_completed(before, options['batch_size'], options['compress'])
+        self.stdout.write(f"Archived {archived} tasks.")
@@ -0,0 +1,126 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from tasks.middleware import QueryCounter, counting
+from .bench_routes import percentile
+from .seed_tasks import USERNAME_PREFIX
+
+MODES = {
+    # mode -> (URL name, served through ASGI)
+    "wsgi sync": ("all-tasks", False),
+    "asgi sync": ("all-tasks", True),
+    "asgi async": ("async-all-tasks", True),
+}
+
+
+class Command(BaseCommand):
+    """
+    Compares the latency of the all tasks page as a sync view under WSGI, the same view under ASGI and its async
+    version (`tasks.async_views`) under ASGI, at growing concurrency.
+
+    WSGI is modelled as a pool of worker threads each sending requests through the test client; ASGI as concurrent
+    tasks on one event loop sending requests through the async test client. Both run in-process, so the numbers
+    compare the request handling of Django and not the web servers. The page cache is disabled for all modes. The
+    queries per request are counted on every connection, including those of the threads the async view hands work to.
+
+    Usage:
+        python manage.py seed_tasks --clear
+        python manage.py bench_asgi
+        python manage.py bench_asgi --concurrency 1 10 100 --requests 500
+    """
+
+    help = "Benchmarks sync WSGI against async ASGI handling of the task list page."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 10, 50],
+                            help="Numbers of concurrent requests to benchmark at.")
+        parser.add_argument('--requests', type=int, default=200, help="Requests per mode and concurrency.")
+        parser.add_argument('--users', type=int, default=10, help="Number of seeded users to spread the load over.")
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by("id")[:options['users']])
+        if not users:
+            raise CommandError("No seeded users; run `manage.py seed_tasks` first.")
+
+        sessions = []
+        for user in users:
+            client = Client()
+            client.force_login(user)
+            sessions.append(client.cookies)
+
+        self.stdout.write(f"{'mode':<12}{'concurrency':>12}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'req/s':>9}"
+                          f"{'queries':>9}{'errors':>8}")
+        # the async test client always sends `Host: testserver`
+        with override_settings(TASK_PAGE_CACHE=None, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, "testserver"]):
+            for concurrency in options['concurrency']:
+                for mode, (url_name, asgi) in MODES.items():
+                    run = self.run_asgi if asgi else self.run_wsgi
+                    results, elapsed = run(reverse(url_name), sessions, concurrency, options['requests'])
+                    durations = sorted(duration for duration, _, _ in results)
+                    queries = sum(count for _, count, _ in results) / len(results)
+                    errors = sum(error for _, _, error in results)
+                    self.stdout.write(
+                        f"{mode:<12}{concurrency:>12}{percentile(durations, 50) * 1000:>9.2f}"
+                        f"{percentile(durations, 95) * 1000:>9.2f}{percentile(durations, 99) * 1000:>9.2f}"
+                        f"{len(durations) / elapsed:>9.1f}{queries:>9.1f}{errors:>8}")
+
+    def run_wsgi(self, path: str, sessions: list, concurrency: int, requests: int) -> tuple:
+        """
+        Sends `requests` GET requests from `concurrency` threads.
+
+        :return: tuple (list of (duration, queries, error) tuples of the requests, elapsed seconds).
+        """
+
+        def request(n: int) -> tuple:
+            client = Client(raise_request_exception=False)
+            client.cookies = sessions[n % len(sessions)]
+            with counting(QueryCounter()) as counter:
+                started = time.perf_counter()
+                response = client.get(path)
+                duration = time.perf_counter() - started
+            return duration, counter.count, response.status_code >= 400
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(request, range(requests)))
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        return results, elapsed
+
+    def run_asgi(self, path: str, sessions: list, concurrency: int, requests: int) -> tuple:
+        """
+        Sends `requests` GET requests as `concurrency` concurrent tasks on one event loop.
+
+        :return: tuple (list of (duration, queries, error) tuples of the requests, elapsed seconds).
+        """
+
+        async def worker(numbers: range, results: list):
+            for n in numbers:
+                client = AsyncClient(raise_request_exception=False)
+                client.cookies = sessions[n % len(sessions)]
+                # each task has a context of its own, so the concurrent requests are counted apart
+                with counting(QueryCounter()) as counter:
+                    started = time.perf_counter()
+                    response = await client.get(path)
+                    duration = time.perf_counter() - started
+                results.append((duration, counter.count, response.status_code >= 400))
+
+        async def main() -> list:
+            results = []
+            await asyncio.gather(*(worker(range(first, requests, concurrency), results)
+                                   for first in range(concurrency)))
+            return results
+
+        started = time.perf_counter()
+        results = asyncio.run(main())
+        elapsed = time.perf_counter() - started
+        connections.close_all()
+        return results, elapsed
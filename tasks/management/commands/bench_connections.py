@@ -0,0 +1,150 @@
+import copy
+import statistics
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.core import signals
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from ToDoList.database import MODES, POOL, connection_settings
+from tasks.models import Task, TaskCounter
+from tasks.pagination import PAGE_SIZE
+from .bench_routes import percentile
+from .seed_tasks import USERNAME_PREFIX
+
+
+class Command(BaseCommand):
+    """
+    Measures the cost of opening database connections per request, with connections opened per request, kept open
+    (CONN_MAX_AGE) and pooled (psycopg 3's pool, PostgreSQL only).
+
+    Every mode gets a copy of the `default` database entry under an alias of its own. A request is simulated the
+    way Django's handlers run one, between the `request_started` and `request_finished` signals (which close or hand
+    back the connections), and runs the queries of a list page: the counters row and a page of tasks of a seeded
+    user. The test client cannot be used here: it disconnects those signals to keep the test database open.
+
+    Run it against the PostgreSQL database of the settings, or against a SQLite file as a stand-in (no pool mode;
+    opening a SQLite connection is much cheaper than a PostgreSQL one, so the differences are smaller).
+
+    Usage:
+        python manage.py seed_tasks --clear
+        python manage.py bench_connections
+        python manage.py bench_connections --threads 1 8 --requests 2000 --settings=...
+    """
+
+    help = "Benchmarks the connect overhead per request with and without persistent or pooled connections."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, nargs='+', default=[1, 8],
+                            help="Numbers of threads sending requests at the same time.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per mode and number of threads.")
+        parser.add_argument('--users', type=int, default=10, help="Number of seeded users to spread the load over.")
+        parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES), help="Modes to benchmark.")
+
+    def handle(self, *args, **options):
+        default = connections["default"].settings_dict
+        if connections["default"].vendor == "sqlite" and connections["default"].is_in_memory_db():
+            raise CommandError("An in-memory SQLite database cannot be shared between connections; use a file.")
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX).order_by("id")[:options['users']])
+        if not users:
+            raise CommandError("No seeded users; run `manage.py seed_tasks` first.")
+
+        modes = [mode for mode in options['modes']
+                 if mode != POOL or default["ENGINE"] == "django.db.backends.postgresql"]
+        if len(modes) < len(options['modes']):
+            self.stdout.write("Skipping the pool: connection pools need PostgreSQL with psycopg 3.")
+
+        self.stdout.write(f"{'mode':<13}{'threads':>8}{'mean ms':>9}{'p50 ms':>9}{'p95 ms':>9}{'req/s':>9}"
+                          f"{'connects':>10}")
+        for threads in options['threads']:
+            means = {}
+            for mode in modes:
+                alias = self.add_alias(default, mode, threads)
+                try:
+                    durations, elapsed, connects = self.run(alias, users, threads, options['requests'])
+                    if mode == POOL:
+                        # `connection_created` is sent for every connection taken from the pool
+                        connects = connections[alias].pool.get_stats().get("connections_num", 0)
+                finally:
+                    self.remove_alias(alias)
+                means[mode] = statistics.mean(durations)
+                durations.sort()
+                self.stdout.write(
+                    f"{mode:<13}{threads:>8}{means[mode] * 1000:>9.3f}{percentile(durations, 50) * 1000:>9.3f}"
+                    f"{percentile(durations, 95) * 1000:>9.3f}{len(durations) / elapsed:>9.1f}{connects:>10}")
+            if "per-request" in means and len(means) > 1:
+                reuse = min(mean for mode, mean in means.items() if mode != "per-request")
+                self.stdout.write(f"connect overhead per request at {threads} thread(s): "
+                                  f"{(means['per-request'] - reuse) * 1000:.3f} ms")
+
+    def add_alias(self, default: dict, mode: str, threads: int) -> str:
+        """
+        Registers a copy of the default database entry with the connection settings of `mode`.
+        """
+
+        alias = f"bench-{mode}"
+        entry = copy.deepcopy(default)
+        options = {key: value for key, value in entry["OPTIONS"].items() if key != "pool"}
+        entry.update(connection_settings(entry["ENGINE"], mode, min_size=1, max_size=threads))
+        entry["OPTIONS"] = {**options, **entry["OPTIONS"]}
+        connections.settings[alias] = entry
+        return alias
+
+    def remove_alias(self, alias: str) -> None:
+        connections[alias].close()
+        if getattr(connections[alias], "pool", None):
+            connections[alias].close_pool()
+        del connections[alias]
+        del connections.settings[alias]
+
+    def run(self, alias: str, users: list, threads: int, requests: int) -> tuple:
+        """
+        Sends `requests` simulated requests from `threads` threads.
+
+        :return: tuple (list of request durations, elapsed seconds, number of connections made).
+        """
+
+        durations, connects = [], []
+
+        def count(sender, connection, **kwargs):
+            if connection.alias == alias:
+                connects.append(1)
+
+        def worker(numbers: range):
+            try:
+                for n in numbers:
+                    started = time.perf_counter()
+                    signals.request_started.send(sender=self.__class__)
+                    try:
+                        self.page(alias, users[n % len(users)])
+                    finally:
+                        signals.request_finished.send(sender=self.__class__)
+                    durations.append(time.perf_counter() - started)
+            finally:
+                connections[alias].close()
+
+        connection_created.connect(count)
+        try:
+            workers = [threading.Thread(target=worker, args=(range(first, requests, threads),))
+                       for first in range(threads)]
+            started = time.perf_counter()
+            for thread in workers:
+                thread.start()
+            for thread in workers:
+                thread.join()
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+        return durations, elapsed, len(connects)
+
+    @staticmethod
+    def page(alias: str, user: User) -> None:
+        """
+        The queries of a list page: the user's counters row and the first page of their open tasks.
+        """
+
+        TaskCounter.objects.using(alias).filter(user_id=user.id).first()
+        list(Task.objects.using(alias).filter(user=user, completed=False).rows().order_by("date", "id")[:PAGE_SIZE])
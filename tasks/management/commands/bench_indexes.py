@@ -0,0 +1,123 @@
+import datetime
+import random
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+
+from tasks import agenda
+from tasks.counters import day_range
+from tasks.models import Task, TagTask
+from tasks.pagination import page_ranges
+
+USERNAME_PREFIX = "bench-index-"
+
+
+class Command(BaseCommand):
+    """
+    Seeds a large `Task` table and asserts that the hot list queries of `tasks/views.py` are served by the composite
+    and partial indexes declared on `Task`.
+
+    Usage:
+        python manage.py bench_indexes                      # 1M tasks over 1000 users, removed afterwards
+        python manage.py bench_indexes --tasks 100000 --keep
+
+    Run it against a disposable database: it inserts (and by default deletes) `bench-index-*` users.
+    """
+
+    help = ("Seeds tasks and checks the EXPLAIN plans of the overdue, today, agenda, all, keyset page and tag-filter "
+            "queries.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=1_000_000, help="Number of tasks to seed.")
+        parser.add_argument('--users', type=int, default=1000, help="Number of users the tasks are spread over.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Rows per bulk_create batch.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded rows after the run.")
+
+    def handle(self, *args, **options):
+        started = time.perf_counter()
+        users = self.seed(options['tasks'], options['users'], options['batch_size'])
+        self.stdout.write(f"Seeded {options['tasks']} tasks in {time.perf_counter() - started:.1f}s")
+
+        try:
+            self.analyze()
+            failures = self.check_plans(users[0])
+        finally:
+            if not options['keep']:
+                User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        if failures:
+            raise CommandError(f"No index used (or rows sorted) for: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS("All queries use an index."))
+
+    def seed(self, tasks_amount: int, users_amount: int, batch_size: int) -> list:
+        """
+        Creates the users, one tag each, and `tasks_amount` tasks with a mix of past / today / future dates and a
+        third of them completed.
+        """
+
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        users = User.objects.bulk_create(User(username=f"{USERNAME_PREFIX}{n}") for n in range(users_amount))
+        tags = {tag.user_id_id: tag for tag in TagTask.objects.bulk_create(
+            TagTask(user_id=user, tag_name="Work") for user in users)}
+
+        rng = random.Random(0)
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time(), tzinfo=datetime.timezone.utc)
+        batch = []
+        for n in range(tasks_amount):
+            user = users[n % users_amount]
+            batch.append(Task(
+                user=user,
+                title=f"Task {n}",
+                tag=tags[user.id] if rng.random() < 0.3 else None,
+                date=today + datetime.timedelta(days=rng.randint(-60, 30)),
+                completed=rng.random() < 0.33,
+            ))
+            if len(batch) == batch_size:
+                with transaction.atomic():
+                    Task.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Task.objects.bulk_create(batch)
+        return users
+
+    def analyze(self):
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+
+    def check_plans(self, user) -> list:
+        """
+        Prints the plan of every query and returns the names of those that do not use one of the expected indexes, or
+        that sort their rows although the index holds them in order (the keyset page).
+        """
+
+        today_start, tomorrow_start = day_range(datetime.date.today())
+        tag = TagTask.objects.get(user_id=user)
+        queries = {
+            "overdue": (Task.objects.filter(user=user, completed=False, date__lt=today_start),
+                        ("task_user_completed_date_idx", "task_open_user_date_idx")),
+            "today": (Task.objects.filter(user=user, completed=False, date__gte=today_start, date__lt=tomorrow_start),
+                      ("task_user_completed_date_idx", "task_open_user_date_idx")),
+            "agenda": (agenda.tasks_in_range(user, today_start, today_start + datetime.timedelta(days=366)),
+                       ("task_user_completed_date_idx", "task_open_user_date_idx")),
+            "all": (Task.objects.filter(user=user, completed=False),
+                    ("task_user_completed_date_idx", "task_open_user_date_idx")),
+            "tag-filter": (Task.objects.filter(tag_id=tag.id, user=user, completed=False),
+                           ("task_tag_user_completed_idx",)),
+        }
+        # a page deep into the all-tasks list: its (date, id) range must be read off the index in order
+        keyset_page = page_ranges(Task.objects.filter(user=user, completed=False).rows(), (today_start, 0), False)[0]
+        ordered = {"keyset page": (keyset_page, ("task_user_completed_date_idx", "task_open_user_date_idx"))}
+        queries.update(ordered)
+
+        failures = []
+        for name, (queryset, indexes) in queries.items():
+            plan = queryset.explain()
+            used = any(index in plan for index in indexes)
+            sorted_ = name in ordered and ("TEMP B-TREE" in plan or "Sort" in plan)
+            status = "NO INDEX" if not used else "SORTED" if sorted_ else "ok"
+            self.stdout.write(f"-- {name}: {status}\n{plan}\n")
+            if not used or sorted_:
+                failures.append(name)
+        return failures
@@ -0,0 +1,140 @@
+import datetime
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import RequestFactory
+
+from tasks.counters import day_range
+from tasks.models import Task, TagTask
+from tasks.pagination import paginate
+
+USERNAME = "bench-projections"
+
+WORDS = (
+    "report budget meeting review invoice client release deploy backup design draft email call plan sprint "
+    "refactor document schedule follow update research prepare order payment travel doctor grocery birthday"
+).split()
+
+
+def _size(value) -> int:
+    """
+    Approximates the bytes a value takes on the wire: the encoded length of text, 8 bytes for other values.
+    """
+
+    if value is None:
+        return 0
+    if isinstance(value, str):
+        return len(value.encode())
+    if isinstance(value, (bytes, memoryview)):
+        return len(value)
+    return 8
+
+
+class Command(BaseCommand):
+    """
+    Compares a page of each task list read as whole rows (what the views did before) with the `rows()` projection
+    of `TaskQuerySet` the views use now.
+
+    A user with --tasks tasks is seeded, their descriptions --description-size bytes long. For every page the command
+    reports the bytes of the fetched values, the peak memory of building the page of model instances and the median
+    time of the query.
+
+    Usage:
+        python manage.py bench_projections
+        python manage.py bench_projections --tasks 5000 --description-size 10000 --repeat 20
+    """
+
+    help = "Benchmarks the bytes and memory of a task list page read as whole rows and as list rows."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tasks', type=int, default=2000, help="Number of tasks to seed.")
+        parser.add_argument('--description-size', type=int, default=2000, help="Bytes per task description.")
+        parser.add_argument('--repeat', type=int, default=10, help="Runs of every page.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded rows after the run.")
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=USERNAME).delete()
+        user = User.objects.create(username=USERNAME)
+        try:
+            tag = self.seed(user, options['tasks'], options['description_size'])
+            today_start, tomorrow_start = day_range(datetime.date.today())
+            pages = {
+                "all": (Task.objects.filter(user=user, completed=False), False, False),
+                "today": (Task.objects.filter(user=user, completed=False, date__gte=today_start,
+                                              date__lt=tomorrow_start), False, True),
+                "overdue": (Task.objects.filter(user=user, completed=False, date__lt=today_start), False, True),
+                "completed": (Task.objects.filter(user=user, completed=True), True, False),
+                "tag": (Task.objects.filter(user=user, tag_id=tag.id, completed=False), False, False),
+            }
+            request = RequestFactory().get("/")
+
+            self.stdout.write(f"{'page':<11}{'projection':<12}{'rows':>6}{'bytes':>11}{'peak KiB':>10}{'ms':>8}")
+            for name, (queryset, descending, dated) in pages.items():
+                for projection, tasks in (("whole rows", queryset), ("rows()", queryset.rows())):
+                    rows, size, peak, duration = self.measure(tasks, request, descending, dated, options['repeat'])
+                    self.stdout.write(f"{name:<11}{projection:<12}{rows:>6}{size:>11}{peak / 1024:>10.1f}"
+                                      f"{duration * 1000:>8.2f}")
+        finally:
+            if not options['keep']:
+                user.delete()
+
+    def seed(self, user, tasks_amount: int, description_size: int) -> TagTask:
+        """
+        Creates `tasks_amount` tasks with a mix of past / today / future dates, a third of them completed and a
+        third tagged.
+        """
+
+        rng = random.Random(0)
+        tag = TagTask.objects.create(user_id=user, tag_name="Work")
+        today = datetime.datetime.combine(datetime.date.today(), datetime.time(), tzinfo=datetime.timezone.utc)
+        with transaction.atomic():
+            Task.objects.bulk_create(
+                (Task(user=user,
+                      title=" ".join(rng.sample(WORDS, 3)),
+                      description=" ".join(rng.choices(WORDS, k=description_size // 6))[:description_size],
+                      date=today + datetime.timedelta(days=rng.randint(-30, 30)),
+                      completed=n % 3 == 0,
+                      tag=tag if n % 3 == 1 else None)
+                 for n in range(tasks_amount)),
+                batch_size=1000,
+            )
+        return tag
+
+    def measure(self, queryset, request, descending: bool, dated: bool, repeat: int) -> tuple:
+        """
+        Builds the first page of a queryset `repeat` times.
+
+        :return: tuple (number of rows, bytes of the fetched values, peak bytes allocated, median duration).
+        """
+
+        page = paginate(queryset, request, descending, dated=dated)
+        # the SQL of the page queries, run on a cursor to see the values the database sends
+        with connection.execute_wrapper(self.capture):
+            self.captured = []
+            paginate(queryset, request, descending, dated=dated)
+        size = 0
+        with connection.cursor() as cursor:
+            for sql, params in self.captured:
+                cursor.execute(sql, params)
+                size += sum(_size(value) for row in cursor.fetchall() for value in row)
+
+        tracemalloc.start()
+        paginate(queryset, request, descending, dated=dated)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            paginate(queryset, request, descending, dated=dated)
+            durations.append(time.perf_counter() - started)
+        return len(page), size, peak, statistics.median(durations)
+
+    def capture(self, execute, sql, params, many, context):
+        self.captured.append((sql, params))
+        return execute(sql, params, many, context)
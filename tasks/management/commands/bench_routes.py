@@ -0,0 +1,288 @@
+import datetime
+import json
+import time
+import uuid
+from pathlib import Path
+from typing import Callable, NamedTuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from members import urls as members_urls
+from tasks import urls as tasks_urls
+from tasks.middleware import QueryCounter, counting
+from tasks.models import Task, TagTask
+from tasks.services import save_task, save_tag
+from .seed_tasks import USERNAME_PREFIX, PASSWORD
+
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / "benchmarks" / "routes_baseline.json"
+# the last day of the longest agenda range (a year from today)
+YEAR_AHEAD = datetime.date.today() + datetime.timedelta(days=365)
+
+
+def allowed_host() -> str:
+    """
+    A host name the project accepts (ALLOWED_HOSTS), so the requests are not rejected with 400.
+    """
+
+    for host in settings.ALLOWED_HOSTS:
+        if host != "*":
+            return host.lstrip(".")
+    return "localhost"
+
+
+class Fixture:
+    """
+    The data one benchmark user drives the routes with: a logged-in client, an open task and a tag.
+    """
+
+    def __init__(self, user: User):
+        self.user = user
+        self.client = self.new_client(login=True)
+        self.task = Task.objects.filter(user=user, completed=False).order_by("id").first()
+        self.tag = TagTask.objects.filter(user_id=user).order_by("id").first()
+
+    def new_client(self, login: bool = False) -> Client:
+        client = Client(SERVER_NAME=allowed_host(), raise_request_exception=False)
+        if login:
+            client.force_login(self.user)
+        return client
+
+    def throwaway_task(self, tagged: bool = False) -> Task:
+        return save_task(Task(user=self.user, title="Benchmark task", tag=self.tag if tagged else None))
+
+    def throwaway_tag(self) -> TagTask:
+        # tag names are unique per user
+        return save_tag(TagTask(user_id=self.user, tag_name=f"Benchmark tag {uuid.uuid4().hex[:8]}"))
+
+
+class Route(NamedTuple):
+    """
+    A benchmarked request. `prepare` runs before the timed request and returns (client, path, POST data).
+    """
+
+    name: str
+    method: str
+    prepare: Callable
+
+
+def _get(name: str, *args, query: str = "") -> Callable:
+    def prepare(fx: Fixture):
+        return fx.client, reverse(name, args=[arg(fx) for arg in args]) + query, None
+    return prepare
+
+
+def _post(name: str, *args, data: Callable = None) -> Callable:
+    def prepare(fx: Fixture):
+        return fx.client, reverse(name, args=[arg(fx) for arg in args]), data(fx) if data else {}
+    return prepare
+
+
+def _delete(name: str, tagged: bool = False, method: str = "GET") -> Callable:
+    def prepare(fx: Fixture):
+        task = fx.throwaway_task(tagged)
+        args = [task.tag_id, task.id] if tagged else [task.id]
+        return fx.client, reverse(name, args=args), {} if method == "POST" else None
+    return prepare
+
+
+def _task(fx: Fixture) -> int:
+    return fx.task.id
+
+
+def _tag(fx: Fixture) -> int:
+    return fx.tag.id
+
+
+def _logout(fx: Fixture):
+    return fx.new_client(login=True), reverse('logout_user'), None
+
+
+ROUTES = [
+    Route("home", "GET", lambda fx: (fx.client, "/", None)),
+    Route("all-tasks", "GET", _get('all-tasks')),
+    Route("all-tasks (search)", "GET", _get('all-tasks', query="?search=report")),
+    Route("today-tasks", "GET", _get('today-tasks')),
+    Route("overdue-tasks", "GET", _get('overdue-tasks')),
+    Route("completed-tasks", "GET", _get('completed-tasks')),
+    Route("agenda-tasks", "GET", _get('agenda-tasks')),
+    Route("all-task-detail", "GET", _get('all-task-detail', _task)),
+    Route("today-task-detail", "GET", _get('today-task-detail', _task)),
+    Route("overdue-task-detail", "GET", _get('overdue-task-detail', _task)),
+    Route("completed-task-detail", "GET", _get('completed-task-detail', _task)),
+    Route("all-tags", "GET", _get('all-tags')),
+    Route("tag-detail", "GET", _get('tag-detail', _tag)),
+    Route("fiter-by-tag", "GET", _get('fiter-by-tag', _tag)),
+    Route("tag-filter-task", "GET", _get('tag-filter-task', _tag, _task)),
+    Route("toggle-task", "POST", _post('toggle-task', _task)),
+    Route("toggle-tasks", "POST", _post('toggle-tasks', data=lambda fx: {"task_id": [fx.task.id]})),
+    Route("bulk-tasks", "POST", _post('bulk-tasks', data=lambda fx: {
+        "action": "reschedule", "select_all": 1, "bucket": "overdue", "days": 0})),
+    Route("api-toggle-task", "POST", _post('api-toggle-task', _task)),
+    Route("api-edit-task-title", "POST", _post('api-edit-task-title', _task,
+                                               data=lambda fx: {"title": fx.task.title})),
+    Route("api-sync", "GET", _get('api-sync')),
+    Route("api-agenda", "GET", _get('api-agenda')),
+    Route("api-agenda (year)", "GET", _get('api-agenda', query=f"?end={YEAR_AHEAD}")),
+    Route("delete-all-task", "GET", _delete('delete-all-task')),
+    Route("delete-overdue-task", "GET", _delete('delete-overdue-task')),
+    Route("delete-today-task", "GET", _delete('delete-today-task')),
+    Route("delete-completed-task", "GET", _delete('delete-completed-task')),
+    Route("delete-filtered-task", "GET", _delete('delete-filtered-task', tagged=True)),
+    Route("api-delete-task", "POST", _delete('api-delete-task', method="POST")),
+    Route("delete-tag", "GET", lambda fx: (fx.client, reverse('delete-tag', args=[fx.throwaway_tag().id]), None)),
+    Route("async-all-tasks", "GET", _get('async-all-tasks')),
+    Route("async-today-tasks", "GET", _get('async-today-tasks')),
+    Route("async-overdue-tasks", "GET", _get('async-overdue-tasks')),
+    Route("async-completed-tasks", "GET", _get('async-completed-tasks')),
+    Route("async-all-task-detail", "GET", _get('async-all-task-detail', _task)),
+    Route("async-today-task-detail", "GET", _get('async-today-task-detail', _task)),
+    Route("async-overdue-task-detail", "GET", _get('async-overdue-task-detail', _task)),
+    Route("async-completed-task-detail", "GET", _get('async-completed-task-detail', _task)),
+    Route("async-fiter-by-tag", "GET", _get('async-fiter-by-tag', _tag)),
+    Route("task-events", "GET", _get('task-events')),
+    Route("export-tasks", "GET", lambda fx: (fx.client, reverse('export-tasks', args=["csv.gz"]), None)),
+    Route("import-tasks", "POST", lambda fx: (fx.client, reverse('import-tasks'), {
+        "file": SimpleUploadedFile("tasks.csv", b"title,tag\nBenchmark import,Benchmark import\n")})),
+    Route("metrics", "GET", _get('metrics')),
+    Route("login", "GET", lambda fx: (fx.new_client(), reverse('login'), None)),
+    Route("login (POST)", "POST", lambda fx: (fx.new_client(), reverse('login'), {
+        "username": fx.user.username, "password": PASSWORD})),
+    Route("logout_user", "GET", _logout),
+    Route("register", "GET", lambda fx: (fx.new_client(), reverse('register'), None)),
+]
+
+
+def percentile(durations: list, percent: float) -> float:
+    """
+    Nearest-rank percentile of a sorted list.
+    """
+
+    index = max(0, min(len(durations) - 1, round(percent / 100 * len(durations) + 0.5) - 1))
+    return durations[index]
+
+
+class Command(BaseCommand):
+    """
+    Drives every route of `tasks/urls.py` and `members/urls.py` in-process through the Django test client as users
+    seeded by `seed_tasks`, and reports the p50 / p95 / p99 latency, the queries per request and the throughput of
+    each route.
+
+    Results can be stored as a baseline JSON and later runs compared against it: a route regresses when its p95
+    grows beyond --tolerance or it issues more queries than in the baseline.
+
+    Usage:
+        python manage.py seed_tasks --clear
+        python manage.py bench_routes --save-baseline       # records benchmarks/routes_baseline.json
+        python manage.py bench_routes --fail-on-regression  # compares with it
+
+    Run it against a disposable database: the write routes toggle, reschedule and delete the seeded data.
+    """
+
+    help = "Benchmarks every route with the seeded users and compares the results with a baseline."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=5, help="Number of seeded users to drive the routes with.")
+        parser.add_argument('--requests', type=int, default=50, help="Timed requests per route.")
+        parser.add_argument('--route', action='append', help="Only benchmark these routes.")
+        parser.add_argument('--no-page-cache', action='store_true', help="Render every page (TASK_PAGE_CACHE=None).")
+        parser.add_argument('--baseline', type=Path, default=DEFAULT_BASELINE, help="Baseline JSON to compare with.")
+        parser.add_argument('--save-baseline', action='store_true', help="Store the results as the new baseline.")
+        parser.add_argument('--tolerance', type=float, default=0.25, help="Allowed p95 growth, 0.25 = 25%%.")
+        parser.add_argument('--fail-on-regression', action='store_true', help="Exit with an error on regressions.")
+
+    def handle(self, *args, **options):
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX, tagtask__isnull=False,
+                                         task__completed=False).distinct().order_by("id")[:options['users']])
+        if not users:
+            raise CommandError("No seeded users with tags and open tasks; run `manage.py seed_tasks` first.")
+
+        self.warn_uncovered()
+        routes = [route for route in ROUTES if not options['route'] or route.name in options['route']]
+        with override_settings(**({"TASK_PAGE_CACHE": None} if options['no_page_cache'] else {})):
+            fixtures = [Fixture(user) for user in users]
+            results = {route.name: self.run(route, fixtures, options['requests']) for route in routes}
+
+        baseline_path = Path(options['baseline'])
+        baseline = {}
+        if baseline_path.exists() and not options['save_baseline']:
+            baseline = json.loads(baseline_path.read_text())["routes"]
+        regressions = self.report(results, baseline, options['tolerance'])
+
+        if options['save_baseline']:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            baseline_path.write_text(json.dumps({
+                "database": connection.vendor,
+                "users": len(users),
+                "requests": options['requests'],
+                "routes": results,
+            }, indent=2) + "\n")
+            self.stdout.write(f"Baseline stored in {baseline_path}")
+
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"Regressions: {', '.join(regressions)}")
+
+    def warn_uncovered(self):
+        names = {pattern.name for module in (tasks_urls, members_urls) for pattern in module.urlpatterns}
+        uncovered = names - {route.name for route in ROUTES} - {None}
+        if uncovered:
+            self.stderr.write(f"Routes without a benchmark: {', '.join(sorted(uncovered))}")
+
+    def run(self, route: Route, fixtures: list, requests: int) -> dict:
+        """
+        Sends one untimed warm-up request and `requests` timed ones, round-robin over the users.
+        """
+
+        durations, queries, errors = [], [], 0
+        for n in range(requests + 1):
+            client, path, data = route.prepare(fixtures[n % len(fixtures)])
+            # counts the queries on every connection, including those of the threads the async views hand work to
+            with counting(QueryCounter()) as counter:
+                started = time.perf_counter()
+                if route.method == "POST":
+                    response = client.post(path, data)
+                else:
+                    response = client.get(path)
+                duration = time.perf_counter() - started
+            if n == 0:
+                continue
+            durations.append(duration)
+            queries.append(counter.count)
+            errors += response.status_code >= 400
+
+        durations.sort()
+        return {
+            "p50_ms": round(percentile(durations, 50) * 1000, 2),
+            "p95_ms": round(percentile(durations, 95) * 1000, 2),
+            "p99_ms": round(percentile(durations, 99) * 1000, 2),
+            "queries": round(sum(queries) / len(queries), 1),
+            "rps": round(len(durations) / sum(durations), 1),
+            "errors": errors,
+        }
+
+    def report(self, results: dict, baseline: dict, tolerance: float) -> list:
+        """
+        Prints the results (with the change against the baseline) and returns the names of the regressed routes.
+        """
+
+        self.stdout.write(f"{'route':<24}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'queries':>9}{'req/s':>9}"
+                          f"{'errors':>8}  vs baseline")
+        regressions = []
+        for name, result in results.items():
+            line = (f"{name:<24}{result['p50_ms']:>9.2f}{result['p95_ms']:>9.2f}{result['p99_ms']:>9.2f}"
+                    f"{result['queries']:>9.1f}{result['rps']:>9.1f}{result['errors']:>8}")
+            base = baseline.get(name)
+            if base:
+                change = result['p95_ms'] / base['p95_ms'] - 1 if base['p95_ms'] else 0.0
+                regressed = change > tolerance or result['queries'] > base['queries']
+                line += f"  p95 {change:+.0%}, queries {result['queries'] - base['queries']:+.1f}"
+                if regressed:
+                    regressions.append(name)
+                    line = self.style.ERROR(line + "  REGRESSION")
+            self.stdout.write(line)
+        return regressions
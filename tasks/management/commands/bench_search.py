@@ -0,0 +1,92 @@
+import random
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tasks.models import Task
+from tasks.search import get_backend
+from tasks.search.base import IContainsSearchBackend
+
+USERNAME = "bench-search"
+
+WORDS = (
+    "report budget meeting review invoice client release deploy backup design draft email call plan sprint "
+    "refactor document schedule follow update research prepare order payment travel doctor grocery birthday"
+).split()
+
+QUERIES = ["budget", "rev", "client meeting", "deploy backup", "invoce", "nothing-matches"]
+
+
+class Command(BaseCommand):
+    """
+    Compares the configured search backend with the `icontains` search the `all_tasks` view used before.
+
+    Tasks are seeded for a single user in growing steps (10k, 100k and 1M by default) and every query in QUERIES is
+    timed against both backends at each size.
+
+    Usage:
+        python manage.py bench_search
+        python manage.py bench_search --sizes 10000 100000 --repeat 5
+    """
+
+    help = "Benchmarks the task search backend against the icontains search."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', type=int, nargs='+', default=[10_000, 100_000, 1_000_000],
+                            help="Numbers of tasks to benchmark at.")
+        parser.add_argument('--repeat', type=int, default=10, help="Runs of every query.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Rows per bulk_create batch.")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded rows after the run.")
+
+    def handle(self, *args, **options):
+        User.objects.filter(username=USERNAME).delete()
+        user = User.objects.create(username=USERNAME)
+        backends = {"icontains": IContainsSearchBackend(), "backend": get_backend()}
+        self.stdout.write(f"Configured backend: {type(backends['backend']).__name__}")
+
+        rng = random.Random(0)
+        seeded = 0
+        try:
+            for size in sorted(options['sizes']):
+                seeded = self.seed(user, seeded, size, rng, options['batch_size'])
+                self.stdout.write(f"\n{size} tasks")
+                self.stdout.write(f"{'query':<18}" + "".join(f"{name:>22}" for name in backends))
+                for query in QUERIES:
+                    timings = [self.time(backend, user, query, options['repeat']) for backend in backends.values()]
+                    self.stdout.write(f"{query:<18}" + "".join(
+                        f"{median * 1000:>11.2f} ms {hits:>6} hits" for median, hits in timings))
+        finally:
+            if not options['keep']:
+                user.delete()
+
+    def seed(self, user, start: int, size: int, rng: random.Random, batch_size: int) -> int:
+        """
+        Adds tasks with random word titles and descriptions until the user has `size` of them.
+        """
+
+        for offset in range(start, size, batch_size):
+            with transaction.atomic():
+                Task.objects.bulk_create(
+                    Task(user=user,
+                         title=" ".join(rng.sample(WORDS, 3)),
+                         description=" ".join(rng.choices(WORDS, k=12)))
+                    for _ in range(offset, min(offset + batch_size, size))
+                )
+        return max(start, size)
+
+    def time(self, backend, user, query: str, repeat: int) -> tuple:
+        """
+        Runs one search `repeat` times the way the view does (count + first page) and returns the median time.
+        """
+
+        durations = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            tasks = backend.search(Task.objects.filter(user=user, completed=False), query)
+            hits = tasks.count()
+            list(tasks[:50])
+            durations.append(time.perf_counter() - started)
+        return statistics.median(durations), hits
@@ -0,0 +1,45 @@
+import sys
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import shards
+from tasks.export import FORMATS, export
+
+
+class Command(BaseCommand):
+    """
+    Exports all tasks of a user with their tags, streaming the rows like the export endpoint does (see
+    `tasks.export`), so exports of large accounts run in constant memory.
+
+    Usage:
+        python manage.py export_tasks alice > alice.csv
+        python manage.py export_tasks alice --format ndjson --gzip --output alice.ndjson.gz
+    """
+
+    help = "Streams all tasks of a user as CSV or NDJSON, optionally gzip-compressed."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="The user whose tasks are exported.")
+        parser.add_argument('--format', choices=sorted(FORMATS), default="csv", help="Output format.")
+        parser.add_argument('--gzip', action='store_true', help="Compress the output with gzip.")
+        parser.add_argument('--output', default="-", help="Output file; - (the default) writes to stdout.")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']!r} does not exist.")
+
+        with shards.use_user(user.id):
+            chunks = export(user.id, options['format'], options['gzip'])
+            if options['output'] == "-":
+                self.write(chunks, sys.stdout.buffer)
+            else:
+                with open(options['output'], "wb") as output:
+                    self.write(chunks, output)
+
+    @staticmethod
+    def write(chunks, output) -> None:
+        for chunk in chunks:
+            output.write(chunk)
+        output.flush()
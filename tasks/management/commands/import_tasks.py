@@ -0,0 +1,43 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks.importer import PARSERS, import_tasks, parse_format
+
+
+class Command(BaseCommand):
+    """
+    Imports tasks and tags for a user from a CSV or NDJSON file (optionally gzipped), streaming it in batches like the
+    upload endpoint does (see `tasks.importer`), and reports the throughput and the rows that failed.
+
+    Usage:
+        python manage.py import_tasks alice todoist.csv
+        python manage.py import_tasks alice tasks.ndjson.gz --batch-size 5000
+    """
+
+    help = "Imports tasks and tags for a user from a CSV or NDJSON file."
+
+    def add_arguments(self, parser):
+        parser.add_argument('username', help="The user the tasks are imported for.")
+        parser.add_argument('path', help="The file to import.")
+        parser.add_argument('--format', choices=sorted(PARSERS), help="File format; by default from the extension.")
+        parser.add_argument('--batch-size', type=int, help="Rows per bulk_create batch (TASK_IMPORT_BATCH_SIZE).")
+
+    def handle(self, *args, **options):
+        user = User.objects.filter(username=options['username']).first()
+        if user is None:
+            raise CommandError(f"User {options['username']!r} does not exist.")
+        try:
+            parser = PARSERS[options['format'] or parse_format(options['path'])]
+        except ValueError:
+            raise CommandError("Unknown file format; pass --format.")
+
+        with open(options['path'], "rb") as stream:
+            report = import_tasks(user, parser(stream), options['batch_size'])
+
+        for line, errors in report.errors:
+            fields = "; ".join(f"{field}: {' '.join(messages)}" for field, messages in errors.items())
+            self.stderr.write(f"line {line}: {fields}")
+        if report.failed > len(report.errors):
+            self.stderr.write(f"… and {report.failed - len(report.errors)} more failed rows")
+        self.stdout.write(f"Imported {report.created} tasks and {report.tags_created} new tags, {report.failed} "
+                          f"rows failed, in {report.seconds:.2f}s ({report.rows_per_second:.0f} rows/s)")
@@ -0,0 +1,30 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import shards
+
+
+class Command(BaseCommand):
+    """
+    Applies the migrations to the default database and every shard of TASK_SHARDS, then points the ID sequences of
+    every shard at its block of IDs (see `tasks.shards.reserve_ids`).
+
+    Every database gets the whole schema; the data migrations of the task models run on the rows of the shard being
+    migrated. Run it instead of `migrate` once sharding is on.
+
+    Usage:
+        python manage.py migrate_shards
+    """
+
+    help = "Migrates the default database and every shard."
+
+    def handle(self, *args, **options):
+        if not shards.aliases():
+            raise CommandError("No shards configured (TASK_SHARDS); use `manage.py migrate`.")
+        for alias in shards.databases():
+            self.stdout.write(f"Migrating {alias}")
+            with shards.use(alias):
+                call_command("migrate", database=alias, interactive=False, verbosity=options['verbosity'],
+                             stdout=self.stdout, stderr=self.stderr)
+            if alias in shards.aliases():
+                shards.reserve_ids(alias)
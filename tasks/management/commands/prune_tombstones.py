@@ -0,0 +1,30 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from tasks import shards
+from tasks.sync import prune_tombstones
+
+
+class Command(BaseCommand):
+    """
+    Deletes the tombstones of old deletions (see `tasks.sync`). Clients that have not synced since then are told to
+    sync from scratch. Runs on every shard (see `tasks.shards`).
+
+    Usage (e.g. daily from cron):
+        python manage.py prune_tombstones --days 90
+    """
+
+    help = "Deletes the delta sync tombstones older than --days days."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=90, help="Keep the tombstones of the last DAYS days.")
+
+    def handle(self, *args, **options):
+        before = timezone.now() - datetime.timedelta(days=options['days'])
+        pruned = 0
+        for alias in shards.databases():
+            with shards.use(alias):
+                pruned += prune_tombstones(before)
+        self.stdout.write(f"Pruned {pruned} tombstones.")
@@ -0,0 +1,48 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import shards
+
+
+class Command(BaseCommand):
+    """
+    Moves users onto the shards the hash ring of TASK_SHARDS assigns them, e.g. after a shard was added or to move the
+    users with data from before the sharding off the default database. Users keep working while they are moved (see
+    `tasks.shards.move_user`); writes during the final switch of a user are answered with a retry.
+
+    Usage:
+        python manage.py rebalance_shards --dry-run
+        python manage.py rebalance_shards [--limit 1000] [--user USERNAME]
+    """
+
+    help = "Moves users to the shards the consistent hash ring assigns them."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help="Only report the users that would move.")
+        parser.add_argument('--limit', type=int, help="Move at most this many users.")
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Restrict to this user (repeatable).")
+
+    def handle(self, *args, **options):
+        if not shards.aliases():
+            raise CommandError("No shards configured (TASK_SHARDS).")
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+
+        ring = shards.ring()
+        moved = 0
+        for user_id in list(users.values_list('id', flat=True)):
+            if options['limit'] is not None and moved >= options['limit']:
+                break
+            source, target = shards.database(user_id), ring.shard(user_id)
+            if source == target:
+                continue
+            moved += 1
+            if options['dry_run']:
+                self.stdout.write(f"User {user_id}: {source} -> {target}")
+                continue
+            report = shards.move_user(user_id, target)
+            self.stdout.write(f"User {user_id}: {source} -> {target}, {report['rows']} rows in {report['passes']} "
+                              f"passes")
+        self.stdout.write(f"{'Would move' if options['dry_run'] else 'Moved'} {moved} users.")
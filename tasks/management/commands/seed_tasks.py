@@ -0,0 +1,143 @@
+import datetime
+import math
+import random
+import time
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from tasks import counters
+from tasks.models import Task, TagTask, SyncSequence
+
+USERNAME_PREFIX = "seed-"
+PASSWORD = "seed-password"
+
+TAG_NAMES = ["Work", "Home", "Errands", "Health", "Finance", "Study", "Family", "Travel", "Garden", "Side project"]
+
+WORDS = (
+    "report budget meeting review invoice client release deploy backup design draft email call plan sprint "
+    "refactor document schedule follow update research prepare order payment travel doctor grocery birthday"
+).split()
+
+
+class Command(BaseCommand):
+    """
+    Seeds users with realistic task lists for load tests and benchmarks (see `bench_routes`).
+
+    Distributions per user:
+        - tasks: log-normal around --tasks-per-user (most users have a few dozen tasks, a few have thousands)
+        - tags: 0 to 8, most users have 1 to 3; 60% of the tasks of a user with tags are tagged
+        - completion ratio: Beta(2, 3), about 40% of the tasks completed on average
+        - due dates: 10% without a date; open tasks 25% overdue, 15% today, 60% upcoming; completed tasks in the past
+
+    The users are called `seed-<n>` and share the password `seed-password`. Their tasks and tags are numbered in their
+    change sequences (see `tasks.sync`) and their counters rows are built at the end.
+
+    Usage:
+        python manage.py seed_tasks                         # 100 users, ~200 tasks each
+        python manage.py seed_tasks --users 1000 --tasks-per-user 500 --clear
+    """
+
+    help = "Seeds users with tasks, tags, due dates and completion ratios drawn from realistic distributions."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100, help="Number of users to create.")
+        parser.add_argument('--tasks-per-user', type=int, default=200, help="Mean number of tasks per user.")
+        parser.add_argument('--batch-size', type=int, default=10_000, help="Rows per bulk_create batch.")
+        parser.add_argument('--seed', type=int, default=0, help="Random seed, for reproducible data sets.")
+        parser.add_argument('--clear', action='store_true', help="Delete the previously seeded users first.")
+
+    def handle(self, *args, **options):
+        if options['clear']:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        started = time.perf_counter()
+        users, tasks_amount = self.seed(options['users'], options['tasks_per_user'], options['batch_size'],
+                                        random.Random(options['seed']))
+        for user in users:
+            counters.rebuild(user.id)
+        self.stdout.write(f"Seeded {len(users)} users and {tasks_amount} tasks "
+                          f"in {time.perf_counter() - started:.1f}s")
+
+    def seed(self, users_amount: int, tasks_per_user: int, batch_size: int, rng: random.Random) -> tuple:
+        """
+        Creates the users, their tags and their tasks.
+
+        :return: tuple (list of the created users, number of created tasks).
+        """
+
+        first = User.objects.filter(username__startswith=USERNAME_PREFIX).count()
+        password = make_password(PASSWORD)
+        users = User.objects.bulk_create(
+            User(username=f"{USERNAME_PREFIX}{n}", password=password) for n in range(first, first + users_amount))
+
+        seqs = {}
+
+        def next_seq(user) -> int:
+            seqs[user.id] = seqs.get(user.id, 0) + 1
+            return seqs[user.id]
+
+        tags = TagTask.objects.bulk_create(
+            TagTask(user_id=user, tag_name=name, seq=next_seq(user))
+            for user in users
+            for name in rng.sample(TAG_NAMES, min(8, int(rng.expovariate(1 / 2.5)))))
+        tags_of = {}
+        for tag in tags:
+            tags_of.setdefault(tag.user_id_id, []).append(tag)
+
+        today = counters.day_start(datetime.date.today())
+        # log-normal with sigma 1: the mean is exp(mu + 1/2)
+        mu = math.log(max(tasks_per_user, 1)) - 0.5
+        batch = []
+        created = 0
+        for user in users:
+            user_tags = tags_of.get(user.id, [])
+            completion = rng.betavariate(2, 3)
+            for _ in range(min(int(rng.lognormvariate(mu, 1)), tasks_per_user * 20)):
+                task = self.task(user, user_tags, completion, today, rng)
+                task.seq = next_seq(user)
+                batch.append(task)
+                if len(batch) == batch_size:
+                    created += self.flush(batch)
+        created += self.flush(batch)
+        SyncSequence.objects.bulk_create(SyncSequence(user_id=user_id, last_seq=seq) for user_id, seq in seqs.items())
+        return users, created
+
+    @staticmethod
+    def task(user, tags: list, completion: float, today: datetime.datetime, rng: random.Random) -> Task:
+        completed = rng.random() < completion
+        roll = rng.random()
+        if roll < 0.1:
+            date = None
+        elif completed:
+            date = today - datetime.timedelta(days=rng.randint(0, 90))
+        elif roll < 0.1 + 0.9 * 0.25:
+            date = today - datetime.timedelta(days=rng.randint(1, 60))
+        elif roll < 0.1 + 0.9 * 0.40:
+            date = today
+        else:
+            date = today + datetime.timedelta(days=rng.randint(1, 30))
+
+        return Task(
+            user=user,
+            title=" ".join(rng.sample(WORDS, rng.randint(2, 4))).capitalize(),
+            description=" ".join(rng.choices(WORDS, k=rng.randint(0, 20))),
+            tag=rng.choice(tags) if tags and rng.random() < 0.6 else None,
+            date=date,
+            completed=completed,
+        )
+
+    @staticmethod
+    def flush(batch: list) -> int:
+        """
+        Inserts and empties a batch of tasks.
+        """
+
+        amount = len(batch)
+        if batch:
+            with transaction.atomic():
+                Task.objects.bulk_create(batch)
+            batch.clear()
+        return amount
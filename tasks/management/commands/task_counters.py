@@ -0,0 +1,57 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+
+from tasks import counters, shards
+
+
+class Command(BaseCommand):
+    """
+    Maintains the denormalized `TaskCounter` rows, on the shards of their users (see `tasks.shards`).
+
+    Usage:
+        python manage.py task_counters --rollover          # daily: refresh the today / overdue buckets
+        python manage.py task_counters --verify            # report rows that drifted from the Task table
+        python manage.py task_counters --rebuild [--user]  # recompute rows from the Task table
+    """
+
+    help = "Rebuilds, verifies or rolls over the per-user task counters."
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group(required=True)
+        action.add_argument('--rebuild', action='store_true', help="Recompute the counters from the Task table.")
+        action.add_argument('--verify', action='store_true', help="Compare the counters with the Task table.")
+        action.add_argument('--rollover', action='store_true', help="Refresh the date-dependent buckets.")
+        parser.add_argument('--user', action='append', dest='usernames', metavar='USERNAME',
+                            help="Restrict to this user (repeatable).")
+
+    def handle(self, *args, **options):
+        users = User.objects.order_by('id')
+        if options['usernames']:
+            users = users.filter(username__in=options['usernames'])
+        user_ids = list(users.values_list('id', flat=True))
+
+        if options['rollover']:
+            amount = 0
+            for alias in shards.databases():
+                with shards.use(alias):
+                    amount += counters.rollover(user_ids if options['usernames'] else None)
+            self.stdout.write(f"Rolled over {amount} counter rows.")
+            return
+
+        if options['rebuild']:
+            for user_id in user_ids:
+                with shards.atomic(user_id):
+                    counters.rebuild(user_id)
+            self.stdout.write(f"Rebuilt counters for {len(user_ids)} users.")
+            return
+
+        drifted = 0
+        for user_id in user_ids:
+            with shards.use_user(user_id):
+                mismatches = counters.verify(user_id)
+            if mismatches:
+                drifted += 1
+                self.stdout.write(f"User {user_id}: {mismatches}")
+        if drifted:
+            raise CommandError(f"{drifted} of {len(user_ids)} counter rows differ from the Task table.")
+        self.stdout.write(f"Counters of {len(user_ids)} users are consistent.")
@@ -0,0 +1,89 @@
+import os
+
+from django.conf import settings
+from django.contrib.sessions.models import Session
+from django.http import HttpResponse, HttpResponseForbidden
+from django.utils import timezone
+from django.utils.crypto import constant_time_compare
+from prometheus_client import (CollectorRegistry, Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST,
+                               generate_latest, multiprocess)
+
+# Request metrics, observed by tasks.middleware.QueryInstrumentationMiddleware
+REQUEST_LATENCY = Histogram(
+    "todolist_request_duration_seconds", "Time spent handling a request.", ["view", "method"],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0),
+)
+REQUEST_QUERIES = Histogram(
+    "todolist_request_queries", "Database queries issued by a request.", ["view"],
+    buckets=(1, 2, 4, 8, 12, 16, 24, 32, 64),
+)
+REQUEST_SQL_TIME = Histogram(
+    "todolist_request_sql_duration_seconds", "Time a request spent in database queries.", ["view"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0),
+)
+
+# Page cache lookups (tasks.page_cache); hit ratio: rate(..{outcome="hits"}) / rate(..{outcome=~"hits|misses"})
+PAGE_CACHE_LOOKUPS = Counter(
+    "todolist_page_cache_lookups_total", "Page cache lookups by outcome.", ["outcome"],
+)
+
+# Business counters (tasks.services); per minute: rate(...[5m]) * 60
+TASKS_CREATED = Counter("todolist_tasks_created_total", "Tasks created.")
+TASKS_TOGGLED = Counter("todolist_tasks_toggled_total", "Tasks completed or reopened.")
+TASKS_DELETED = Counter("todolist_tasks_deleted_total", "Tasks deleted.")
+
+# Set when the endpoint is scraped; every process reports the same database value, the latest one wins.
+ACTIVE_SESSIONS = Gauge(
+    "todolist_active_sessions", "Sessions that have not expired yet.", multiprocess_mode="mostrecent",
+)
+
+
+def observe_request(record: dict) -> None:
+    """
+    Records the measurements of one request (see `QueryInstrumentationMiddleware`).
+
+    :param record: dict with the `view`, `method`, `queries`, `sql_ms` and `total_ms` of the request.
+    """
+
+    view = record["view"] or "unresolved"
+    REQUEST_LATENCY.labels(view, record["method"]).observe(record["total_ms"] / 1000)
+    REQUEST_QUERIES.labels(view).observe(record["queries"])
+    REQUEST_SQL_TIME.labels(view).observe(record["sql_ms"] / 1000)
+
+
+def registry() -> CollectorRegistry:
+    """
+    Returns the registry to expose.
+
+    With the PROMETHEUS_MULTIPROC_DIR environment variable set (several gunicorn / uvicorn workers), every process
+    writes its samples to memory-mapped files in that directory and the registry aggregates them all, whichever worker
+    serves the scrape. The directory must be emptied before the workers start, and the server should call
+    `prometheus_client.multiprocess.mark_process_dead(pid)` when a worker exits.
+
+    :return: CollectorRegistry to expose.
+    """
+
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        collector_registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(collector_registry)
+        return collector_registry
+    return REGISTRY
+
+
+def metrics(request) -> HttpResponse:
+    """
+    Exposes the metrics in the Prometheus text format.
+
+    If TASK_METRICS_TOKEN is set, the scraper must send it as `Authorization: Bearer <token>`.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: HttpResponse with the metrics, or 403 if the token does not match.
+    """
+
+    token = getattr(settings, "TASK_METRICS_TOKEN", None)
+    if token and not constant_time_compare(request.headers.get("Authorization", ""), f"Bearer {token}"):
+        return HttpResponseForbidden()
+
+    ACTIVE_SESSIONS.set(Session.objects.filter(expire_date__gt=timezone.now()).count())
+
+    return HttpResponse(generate_latest(registry()), content_type=CONTENT_TYPE_LATEST)
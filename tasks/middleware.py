@@ -0,0 +1,271 @@
+import json
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+
+from . import metrics, routers, shards
+
+logger = logging.getLogger("tasks.instrumentation")
+
+
+class QueryBudgetExceeded(AssertionError):
+    """
+    Raised in strict mode when a view issues more queries than its budget allows.
+    """
+
+
+class QueryCounter:
+    """
+    Database execute wrapper that counts the statements of a request and sums their duration.
+
+    Savepoint statements are timed but not counted: they only exist inside outer transactions (e.g. in tests), so
+    counting them would make the same view cost more under the test runner than in production. The statements of a
+    request may run in several threads at once (see `tasks.async_views._in_thread`), so the totals are updated under a
+    lock.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.add(sql, time.perf_counter() - started)
+
+    def add(self, sql: str, duration: float) -> None:
+        counted = not sql.startswith(("SAVEPOINT", "RELEASE SAVEPOINT", "ROLLBACK TO SAVEPOINT"))
+        with self.lock:
+            self.duration += duration
+            self.count += counted
+
+
+# The counters of the enclosing `counting` blocks (e.g. a benchmark's around the middleware's). Context variables are
+# copied into the threads `sync_to_async` / `async_to_sync` run code in, so the queries a request issues from worker
+# threads are counted with those of its own thread.
+_counters: ContextVar[tuple] = ContextVar("query_counters", default=())
+
+
+def _count_query(execute, sql, params, many, context):
+    counters = _counters.get()
+    if not counters:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for counter in counters:
+            counter.add(sql, duration)
+
+
+def install_query_counter(sender, connection, **kwargs) -> None:
+    """
+    `connection_created` receiver that adds the execute wrapper of `counting` to every database connection, in
+    whichever thread it is opened.
+
+    The wrapper goes first in the list: `execute_wrapper()` blocks pop the last one, and a connection is often opened
+    by the first query inside such a block.
+    """
+
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _count_query)
+
+
+@contextmanager
+def counting(counter: QueryCounter):
+    """
+    Counts the queries issued in the block, and in the threads it hands work to, on all database connections. Blocks
+    nest: a query counts for every enclosing block.
+
+    :param counter: The QueryCounter to count the queries with.
+    """
+
+    token = _counters.set((*_counters.get(), counter))
+    try:
+        yield counter
+    finally:
+        _counters.reset(token)
+
+
+class QueryInstrumentationMiddleware:
+    """
+    Records the query count, SQL time, time spent outside SQL (view code and template rendering) and response size of
+    every request, labelled by URL name.
+
+    The measurements are logged as one JSON line per request on the `tasks.instrumentation` logger, recorded in the
+    request histograms of `tasks.metrics` and, if
+    TASK_INSTRUMENTATION_HEADERS is set, returned in `Server-Timing` and `X-Query-Count` headers. Views listed in
+    TASK_QUERY_BUDGETS (URL name -> maximum number of queries, TASK_QUERY_BUDGET_DEFAULT for the others) that exceed
+    their budget are logged as a warning, or raise QueryBudgetExceeded when TASK_QUERY_BUDGET_STRICT is set (tests
+    and development).
+
+    The queries are counted per request (see `counting`), including those the async views run in worker threads. The
+    middleware runs in both sync and async chains, so the async views are served without a hop to a sync thread.
+    With TASK_INSTRUMENTATION off the middleware removes itself from the chain at startup and costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, "TASK_INSTRUMENTATION", False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.headers = getattr(settings, "TASK_INSTRUMENTATION_HEADERS", False)
+        self.budgets = getattr(settings, "TASK_QUERY_BUDGETS", {})
+        self.default_budget = getattr(settings, "TASK_QUERY_BUDGET_DEFAULT", None)
+        self.strict = getattr(settings, "TASK_QUERY_BUDGET_STRICT", False)
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with counting(QueryCounter()) as counter:
+            response = self.get_response(request)
+        return self.record(request, response, counter, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with counting(QueryCounter()) as counter:
+            response = await self.get_response(request)
+        return self.record(request, response, counter, time.perf_counter() - started)
+
+    def record(self, request, response, counter: QueryCounter, total: float):
+        """
+        Logs and exports the measurements of a request, adds the timing headers and enforces the query budget.
+        """
+
+        match = request.resolver_match
+        view = match.view_name if match else None
+        size = None if response.streaming else len(response.content)
+        record = {
+            "view": view,
+            "method": request.method,
+            "status": response.status_code,
+            "queries": counter.count,
+            "sql_ms": round(counter.duration * 1000, 2),
+            "app_ms": round((total - counter.duration) * 1000, 2),
+            "total_ms": round(total * 1000, 2),
+            "bytes": size,
+        }
+        logger.info(json.dumps(record), extra={"instrumentation": record})
+        metrics.observe_request(record)
+
+        if self.headers:
+            response["Server-Timing"] = ", ".join([
+                f'db;dur={record["sql_ms"]};desc="{counter.count} queries"',
+                f'app;dur={record["app_ms"]}',
+                f'total;dur={record["total_ms"]}',
+            ])
+            response["X-Query-Count"] = str(counter.count)
+
+        budget = self.budgets.get(view, self.default_budget)
+        if budget is not None and counter.count > budget:
+            message = f"{view} issued {counter.count} queries, its budget is {budget}"
+            if self.strict:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message, extra={"instrumentation": record})
+
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets the GET / HEAD requests of users who did not write within TASK_REPLICA_PIN_SECONDS read the task models from
+    the read replicas (see `tasks.routers.ReplicaRouter`); all other requests read from the primary.
+
+    Must come after AuthenticationMiddleware. Runs in both sync and async chains. Without TASK_READ_REPLICAS the
+    middleware removes itself from the chain at startup and costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not routers.replicas():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        primary = request.method not in ("GET", "HEAD") or (
+            request.user.is_authenticated and routers.is_pinned(request.user.id))
+        token = routers.begin_request(primary)
+        try:
+            return self.get_response(request)
+        finally:
+            routers.end_request(token)
+
+    async def __acall__(self, request):
+        primary = request.method not in ("GET", "HEAD")
+        if not primary:
+            user = request.user = await request.auser()
+            primary = user.is_authenticated and await routers.ais_pinned(user.id)
+        token = routers.begin_request(primary)
+        try:
+            return await self.get_response(request)
+        finally:
+            routers.end_request(token)
+
+
+class ShardRoutingMiddleware:
+    """
+    Routes the queries of the task models of a request to the shard holding the data of its user (see
+    `tasks.shards`).
+
+    A write that reaches the old shard of a user who was moved meanwhile is rolled back and answered with 503 and
+    `Retry-After`; the retry goes to the new shard. Must come after AuthenticationMiddleware. Runs in both sync and
+    async chains. Without TASK_SHARDS the middleware removes itself from the chain at startup and costs nothing.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not shards.aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if not request.user.is_authenticated:
+            return self.get_response(request)
+        with shards.use_user(request.user.id):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        user = request.user = await request.auser()
+        if not user.is_authenticated:
+            return await self.get_response(request)
+        with shards.use_user(user.id):
+            return await self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, shards.ShardMoved):
+            response = HttpResponse("Your tasks are being moved, please retry.", status=503)
+            response["Retry-After"] = "1"
+            return response
+        return None
@@ -0,0 +1,36 @@
+# Generated by Django 5.1.1 on 2026-10-17 09:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0004_remove_task_shared_with_users"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="TaskCounter",
+            fields=[
+                (
+                    "user",
+                    models.OneToOneField(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        primary_key=True,
+                        related_name="task_counter",
+                        serialize=False,
+                        to=settings.AUTH_USER_MODEL,
+                    ),
+                ),
+                ("open_count", models.PositiveIntegerField(default=0)),
+                ("completed_count", models.PositiveIntegerField(default=0)),
+                ("today_count", models.PositiveIntegerField(default=0)),
+                ("overdue_count", models.PositiveIntegerField(default=0)),
+                ("tag_open_counts", models.JSONField(blank=True, default=dict)),
+                ("counted_on", models.DateField()),
+            ],
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.1.1 on 2026-10-17 10:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0005_taskcounter"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["user", "completed", "date"], name="task_user_completed_date_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                fields=["tag", "user", "completed"], name="task_tag_user_completed_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(
+                condition=models.Q(("completed", False)),
+                fields=["user", "date"],
+                name="task_open_user_date_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.1 on 2026-10-17 11:00
+
+from django.db import migrations
+
+# `search_vector` is a generated column, so PostgreSQL keeps it up to date itself.
+INSTALL_SQL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    """
+    ALTER TABLE tasks_task ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX task_search_vector_idx ON tasks_task USING gin (search_vector)",
+    "CREATE INDEX task_title_trgm_idx ON tasks_task USING gin (title gin_trgm_ops)",
+]
+
+UNINSTALL_SQL = [
+    "DROP INDEX IF EXISTS task_title_trgm_idx",
+    "DROP INDEX IF EXISTS task_search_vector_idx",
+    "ALTER TABLE tasks_task DROP COLUMN IF EXISTS search_vector",
+]
+
+
+def install_search(apps, schema_editor):
+    # The generated tsvector column and GIN indexes are PostgreSQL-only; SQLite gets its FTS5 stand-in from the
+    # post_migrate handler in tasks.apps.
+    if schema_editor.connection.vendor == "postgresql":
+        for statement in INSTALL_SQL:
+            schema_editor.execute(statement)
+
+
+def uninstall_search(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for statement in UNINSTALL_SQL:
+            schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0006_task_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
@@ -0,0 +1,88 @@
+# Generated by Django 5.1.1 on 2026-10-17 12:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def number_existing_rows(apps, schema_editor):
+    """
+    Gives the existing tasks and tags of every user distinct sequence numbers, so the first sync of a client can be
+    paged like any later one.
+    """
+
+    Task = apps.get_model("tasks", "Task")
+    TagTask = apps.get_model("tasks", "TagTask")
+    SyncSequence = apps.get_model("tasks", "SyncSequence")
+
+    last_seqs = {}
+    for model, owner in ((TagTask, "user_id_id"), (Task, "user_id")):
+        rows = []
+        existing = model.objects.filter(**{f"{owner}__isnull": False}).only("id", owner).order_by(owner, "id")
+        for row in existing.iterator():
+            user_id = getattr(row, owner)
+            row.seq = last_seqs[user_id] = last_seqs.get(user_id, 0) + 1
+            rows.append(row)
+            if len(rows) == 5000:
+                model.objects.bulk_update(rows, ["seq"])
+                rows = []
+        model.objects.bulk_update(rows, ["seq"])
+    SyncSequence.objects.bulk_create(
+        SyncSequence(user_id=user_id, last_seq=last_seq) for user_id, last_seq in last_seqs.items())
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0008_updated_at"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="task",
+            name="seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="tagtask",
+            name="seq",
+            field=models.BigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(fields=["user", "seq"], name="task_user_seq_idx"),
+        ),
+        migrations.AddIndex(
+            model_name="tagtask",
+            index=models.Index(fields=["user_id", "seq"], name="tag_user_seq_idx"),
+        ),
+        migrations.CreateModel(
+            name="SyncSequence",
+            fields=[
+                ("user", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                              related_name="sync_sequence", serialize=False,
+                                              to=settings.AUTH_USER_MODEL)),
+                ("last_seq", models.BigIntegerField(default=0)),
+                ("pruned_seq", models.BigIntegerField(default=0)),
+            ],
+        ),
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                ("id", models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name="ID")),
+                ("kind", models.CharField(choices=[("task", "Task"), ("tag", "Tag")], max_length=4)),
+                ("object_id", models.IntegerField()),
+                ("seq", models.BigIntegerField()),
+                ("deleted_at", models.DateTimeField(auto_now_add=True)),
+                ("user", models.ForeignKey(on_delete=django.db.models.deletion.CASCADE,
+                                           to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["user", "seq"], name="tombstone_user_seq_idx"),
+                    models.Index(fields=["deleted_at"], name="tombstone_deleted_at_idx"),
+                ],
+            },
+        ),
+        migrations.RunPython(number_existing_rows, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.1.1 on 2026-10-17 14:00
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def merge_duplicate_tags(apps, schema_editor):
+    """
+    Merges the tags a user has under the same name into the oldest one, so the names can be made unique per user.
+
+    The tasks of the merged tags are moved to the kept tag under a new sequence number, the merged tags are deleted
+    with tombstones (so sync clients drop them) and their open counts are folded into the kept tag's counter.
+    """
+
+    Task = apps.get_model("tasks", "Task")
+    TagTask = apps.get_model("tasks", "TagTask")
+    TaskCounter = apps.get_model("tasks", "TaskCounter")
+    SyncSequence = apps.get_model("tasks", "SyncSequence")
+    Tombstone = apps.get_model("tasks", "Tombstone")
+
+    duplicates = (TagTask.objects.filter(user_id__isnull=False).values("user_id", "tag_name")
+                  .annotate(kept=Min("id"), amount=Count("id")).filter(amount__gt=1))
+    for group in list(duplicates):
+        user_id, kept = group["user_id"], group["kept"]
+        merged = list(TagTask.objects.filter(user_id=user_id, tag_name=group["tag_name"])
+                      .exclude(pk=kept).values_list("id", flat=True))
+
+        sequence, _ = SyncSequence.objects.get_or_create(user_id=user_id)
+        sequence.last_seq += 1
+        sequence.save(update_fields=["last_seq"])
+        Task.objects.filter(tag_id__in=merged).update(tag_id=kept, seq=sequence.last_seq)
+        TagTask.objects.filter(pk__in=merged).delete()
+        Tombstone.objects.bulk_create(
+            Tombstone(user_id=user_id, kind="tag", object_id=tag_id, seq=sequence.last_seq) for tag_id in merged)
+
+        counter = TaskCounter.objects.filter(user_id=user_id).first()
+        if counter is not None:
+            counts = counter.tag_open_counts
+            moved = sum(counts.pop(str(tag_id), 0) for tag_id in merged)
+            if moved:
+                counts[str(kept)] = counts.get(str(kept), 0) + moved
+            counter.save(update_fields=["tag_open_counts"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0009_sync"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RunPython(merge_duplicate_tags, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="tagtask",
+            constraint=models.UniqueConstraint(fields=["user_id", "tag_name"], name="tag_user_name_unique"),
+        ),
+    ]
@@ -0,0 +1,79 @@
+# Generated by Django 5.1.1 on 2026-10-17 16:00
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0010_tag_name_unique"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        # 64-bit IDs: every shard allocates them from a block of its own (see tasks.shards.reserve_ids)
+        migrations.AlterField(
+            model_name="task",
+            name="id",
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name="tagtask",
+            name="id",
+            field=models.BigAutoField(primary_key=True, serialize=False),
+        ),
+        migrations.AlterField(
+            model_name="tombstone",
+            name="object_id",
+            field=models.BigIntegerField(),
+        ),
+        # the users stay on the default database while their data may live on another shard
+        migrations.AlterField(
+            model_name="task",
+            name="user",
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True,
+                                    on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name="tagtask",
+            name="user_id",
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True,
+                                    on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name="taskcounter",
+            name="user",
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE,
+                                       primary_key=True, related_name="task_counter", serialize=False,
+                                       to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name="syncsequence",
+            name="user",
+            field=models.OneToOneField(db_constraint=False, on_delete=django.db.models.deletion.CASCADE,
+                                       primary_key=True, related_name="sync_sequence", serialize=False,
+                                       to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name="tombstone",
+            name="user",
+            field=models.ForeignKey(db_constraint=False, on_delete=django.db.models.deletion.CASCADE,
+                                    to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name="syncsequence",
+            name="moved_to",
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.CreateModel(
+            name="ShardPlacement",
+            fields=[
+                ("user", models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True,
+                                              related_name="shard_placement", serialize=False,
+                                              to=settings.AUTH_USER_MODEL)),
+                ("shard", models.CharField(max_length=100)),
+                ("moved_at", models.DateTimeField(blank=True, null=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.1.1 on 2026-10-17 18:00
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0011_sharding"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedTask",
+            fields=[
+                ("id", models.BigIntegerField(primary_key=True, serialize=False)),
+                ("title", models.CharField(max_length=200)),
+                ("description", models.TextField(blank=True)),
+                ("payload", models.BinaryField(blank=True, null=True)),
+                ("date", models.DateTimeField(blank=True, null=True)),
+                ("updated_at", models.DateTimeField()),
+                ("seq", models.BigIntegerField(default=0, editable=False)),
+                ("archived_at", models.DateTimeField(default=django.utils.timezone.now)),
+                ("tag", models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE,
+                                          to="tasks.tagtask")),
+                ("user", models.ForeignKey(blank=True, db_constraint=False, null=True,
+                                           on_delete=django.db.models.deletion.CASCADE,
+                                           to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                "indexes": [
+                    models.Index(fields=["user", "date"], name="archived_user_date_idx"),
+                    models.Index(fields=["user", "seq"], name="archived_user_seq_idx"),
+                ],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.1.1 on 2026-10-17 20:00
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("tasks", "0012_archived_task"),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name="task",
+            name="task_user_completed_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(fields=["user", "completed", "date", "id"], name="task_user_completed_date_idx"),
+        ),
+        migrations.RemoveIndex(
+            model_name="task",
+            name="task_open_user_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="task",
+            index=models.Index(condition=models.Q(("completed", False)), fields=["user", "date", "id"],
+                               name="task_open_user_date_idx"),
+        ),
+        migrations.RemoveIndex(
+            model_name="archivedtask",
+            name="archived_user_date_idx",
+        ),
+        migrations.AddIndex(
+            model_name="archivedtask",
+            index=models.Index(fields=["user", "date", "id"], name="archived_user_date_idx"),
+        ),
+    ]
@@ -4,6 +4,42 @@ from django.utils import timezone
 from django.contrib.auth.models import User
 
 
+class TaskQuerySet(models.QuerySet):
+    """
+    Named projections of the task queries: each page reads only the columns it shows.
+    """
+
+    # what a row of the task lists shows, plus `date` (the keyset pagination cursor)
+    ROW_FIELDS = ("id", "title", "completed", "date")
+
+    def rows(self, with_tag: bool = False) -> "TaskQuerySet":
+        """
+        The tasks as rows of a list: leaves out `description` (an unbounded text) and the bookkeeping columns.
+
+        :param with_tag: Whether the rows show their tag name; it is then read with a JOIN in the same query.
+        """
+
+        if with_tag:
+            return self.select_related("tag").only(*self.ROW_FIELDS, "tag__tag_name")
+        return self.only(*self.ROW_FIELDS)
+
+    def detail(self) -> "TaskQuerySet":
+        """
+        The tasks as edited in a detail form. The whole row is read: `save()` of an instance with deferred fields only
+        writes the loaded ones and would leave out the `updated_at` stamp.
+        """
+
+        return self.all()
+
+    def export_rows(self) -> "TaskQuerySet":
+        """
+        The tasks as dicts of the exported columns, with the tag name from a LEFT JOIN in the same query.
+        """
+
+        return self.values("id", "title", "description", "date", "completed", "updated_at",
+                           tag_name=models.F("tag__tag_name"))
+
+
 class Task(models.Model):
     """
     Represents a task in the task management system.
@@ -16,15 +52,99 @@ class Task(models.Model):
         tag (TagTask): The tag associated with the task.
         date (datetime): The date and time when the task was created.
         completed (bool): Indicates whether the task is completed.
+        updated_at (datetime): When the task was last changed (validator of the conditional list pages).
+        seq (int): The owner's change sequence number of the last write (see `tasks.sync`).
+
+    The per-user models of this module may live on a shard other than the users (see `tasks.shards`), so their
+    foreign keys to `auth.User` have no database constraint; the deletion of a user still cascades to them.
     """
 
-    id = models.AutoField(primary_key=True)
-    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, blank=True, null=True)
+    id = models.BigAutoField(primary_key=True)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, blank=True, null=True, db_constraint=False)
     title = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     tag = models.ForeignKey('TagTask', on_delete=models.CASCADE, blank=True, null=True)
     date = models.DateTimeField(default=timezone.now, blank=True, null=True)
     completed = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(auto_now=True)
+    seq = models.BigIntegerField(default=0, editable=False)
+
+    objects = TaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # user=…, completed=…, date…, id… (all / today / overdue / completed lists and the counters; `id` is the
+            # tie-breaker of the keyset pages, so that their ORDER BY date, id is read off the index without a sort)
+            models.Index(fields=['user', 'completed', 'date', 'id'], name='task_user_completed_date_idx'),
+            # tag_id=…, user=…, completed=… (tag filter)
+            models.Index(fields=['tag', 'user', 'completed'], name='task_tag_user_completed_idx'),
+            # open tasks only: small, and covers the today / overdue date ranges
+            models.Index(fields=['user', 'date', 'id'], condition=models.Q(completed=False),
+                         name='task_open_user_date_idx'),
+            # max(updated_at) per user (ETag / Last-Modified of the list pages)
+            models.Index(fields=['user', 'updated_at'], name='task_user_updated_idx'),
+            # user=…, seq > cursor (delta sync)
+            models.Index(fields=['user', 'seq'], name='task_user_seq_idx'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class ArchivedTaskQuerySet(models.QuerySet):
+    """
+    The projections of `TaskQuerySet` that the pages reading both tiers (see `tasks.archive`) need.
+    """
+
+    ROW_FIELDS = ("id", "title", "date")
+
+    def rows(self) -> "ArchivedTaskQuerySet":
+        return self.only(*self.ROW_FIELDS)
+
+
+class ArchivedTask(models.Model):
+    """
+    A completed task moved out of the `Task` table by `archive_tasks`, so the indexes of the open-task queries only
+    hold the tasks still in use (see `tasks.archive`). It keeps the ID of the task and is moved back by the first
+    write to it.
+
+    Attributes:
+        id (int): The ID of the task.
+        user (User): The owner of the task.
+        title (str): The title of the task.
+        description (str): The description of the task; empty if it is stored in `payload`.
+        payload (bytes): zlib-compressed JSON of the fields stored compressed (the description), with
+            TASK_ARCHIVE_COMPRESS; None otherwise.
+        tag (TagTask): The tag of the task.
+        date (datetime): The date of the task.
+        updated_at (datetime): When the task was last changed before it was archived.
+        seq (int): The owner's change sequence number of the archiving.
+        archived_at (datetime): When the task was archived.
+    """
+
+    id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, blank=True, null=True, db_constraint=False)
+    title = models.CharField(max_length=200)
+    description = models.TextField(blank=True)
+    payload = models.BinaryField(blank=True, null=True)
+    tag = models.ForeignKey('TagTask', on_delete=models.CASCADE, blank=True, null=True)
+    date = models.DateTimeField(blank=True, null=True)
+    updated_at = models.DateTimeField()
+    seq = models.BigIntegerField(default=0, editable=False)
+    archived_at = models.DateTimeField(default=timezone.now)
+
+    # archived tasks are completed tasks (the list templates read it)
+    completed = True
+
+    objects = ArchivedTaskQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # user=…, date…, id… (completed list, merged with the completed tasks of `Task`)
+            models.Index(fields=['user', 'date', 'id'], name='archived_user_date_idx'),
+            # user=…, seq > cursor (delta sync)
+            models.Index(fields=['user', 'seq'], name='archived_user_seq_idx'),
+        ]
 
     def __str__(self):
         return self.title
@@ -38,11 +158,136 @@ class TagTask(models.Model):
         id (int): The primary key for the tag.
         user_id (User): The user to whom the tag is assigned.
         tag_name (str): The name of the tag.
+        updated_at (datetime): When the tag was last changed.
+        seq (int): The owner's change sequence number of the last write (see `tasks.sync`).
     """
 
-    id = models.AutoField(primary_key=True)
-    user_id = models.ForeignKey('auth.User', on_delete=models.CASCADE, blank=True, null=True)
+    id = models.BigAutoField(primary_key=True)
+    user_id = models.ForeignKey('auth.User', on_delete=models.CASCADE, blank=True, null=True, db_constraint=False)
     tag_name = models.CharField(max_length=200)
+    updated_at = models.DateTimeField(auto_now=True)
+    seq = models.BigIntegerField(default=0, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user_id', 'seq'], name='tag_user_seq_idx'),
+        ]
+        constraints = [
+            # also the index of the lookups of a user's tag by name
+            models.UniqueConstraint(fields=['user_id', 'tag_name'], name='tag_user_name_unique'),
+        ]
 
     def __str__(self):
         return self.tag_name
+
+
+class TaskCounter(models.Model):
+    """
+    Denormalized per-user task counters served to the sidebar.
+
+    The row is maintained in the same transaction as every task write (see `tasks.counters`), so reading the sidebar
+    costs a single primary-key lookup instead of an aggregate over all the user's tasks.
+
+    Attributes:
+        user (User): The user the counters belong to.
+        open_count (int): Number of tasks that are not completed.
+        completed_count (int): Number of completed tasks.
+        today_count (int): Number of open tasks due today.
+        overdue_count (int): Number of open tasks due before today.
+        tag_open_counts (dict): Number of open tasks per tag id.
+        counted_on (date): The day the today / overdue buckets were computed for.
+        updated_at (datetime): When the row was last saved; moves on deletes too, unlike the task stamps.
+    """
+
+    user = models.OneToOneField('auth.User', on_delete=models.CASCADE, primary_key=True, related_name='task_counter',
+                                db_constraint=False)
+    open_count = models.PositiveIntegerField(default=0)
+    completed_count = models.PositiveIntegerField(default=0)
+    today_count = models.PositiveIntegerField(default=0)
+    overdue_count = models.PositiveIntegerField(default=0)
+    tag_open_counts = models.JSONField(default=dict, blank=True)
+    counted_on = models.DateField()
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def tag_open_count(self, tag_id: int) -> int:
+        return self.tag_open_counts.get(str(tag_id), 0)
+
+    def __str__(self):
+        return f"Counters of {self.user_id}"
+
+
+class SyncSequence(models.Model):
+    """
+    The change sequence of a user: every write to their tasks and tags takes the next number (see `tasks.sync`).
+
+    Taking a number locks the row until the write commits, so the numbers of a user are committed in order and a
+    client that has seen every change up to N never misses a later one.
+
+    Attributes:
+        user (User): The user the sequence belongs to.
+        last_seq (int): The last number taken.
+        pruned_seq (int): The highest number of the deletions already pruned from the tombstones; clients with an
+            older cursor have to sync from scratch.
+        moved_to (str): The shard the user's data was moved to; set on the shard they left, where it turns away
+            the writes still in flight (see `tasks.shards.move_user`).
+    """
+
+    user = models.OneToOneField('auth.User', on_delete=models.CASCADE, primary_key=True, related_name='sync_sequence',
+                                db_constraint=False)
+    last_seq = models.BigIntegerField(default=0)
+    pruned_seq = models.BigIntegerField(default=0)
+    moved_to = models.CharField(max_length=100, blank=True, null=True)
+
+    def __str__(self):
+        return f"Sequence of {self.user_id}"
+
+
+class Tombstone(models.Model):
+    """
+    Records a deleted task or tag, so the delta sync can tell clients to drop it.
+
+    Attributes:
+        user (User): The owner of the deleted row.
+        kind (str): "task" or "tag".
+        object_id (int): The primary key of the deleted row.
+        seq (int): The owner's change sequence number of the deletion.
+        deleted_at (datetime): When the row was deleted; tombstones are pruned by age (`prune_tombstones`).
+    """
+
+    TASK = "task"
+    TAG = "tag"
+    KINDS = [(TASK, "Task"), (TAG, "Tag")]
+
+    user = models.ForeignKey('auth.User', on_delete=models.CASCADE, db_constraint=False)
+    kind = models.CharField(max_length=4, choices=KINDS)
+    object_id = models.BigIntegerField()
+    seq = models.BigIntegerField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['user', 'seq'], name='tombstone_user_seq_idx'),
+            models.Index(fields=['deleted_at'], name='tombstone_deleted_at_idx'),
+        ]
+
+    def __str__(self):
+        return f"Deleted {self.kind} {self.object_id}"
+
+
+class ShardPlacement(models.Model):
+    """
+    The directory entry of a user: the shard holding their tasks, tags, counters, sequence and tombstones (see
+    `tasks.shards`). The entries live on the default database.
+
+    Attributes:
+        user (User): The user.
+        shard (str): The DATABASES alias of the shard.
+        moved_at (datetime): When the user was last moved to another shard; None if never.
+    """
+
+    user = models.OneToOneField('auth.User', on_delete=models.CASCADE, primary_key=True, related_name='shard_placement')
+    shard = models.CharField(max_length=100)
+    moved_at = models.DateTimeField(blank=True, null=True)
+
+    def __str__(self):
+        return f"User {self.user_id} on {self.shard}"
@@ -0,0 +1,185 @@
+import datetime
+import hashlib
+import threading
+import time
+from functools import wraps
+from typing import Optional
+
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_cache_control
+
+from . import metrics, routers, shards
+
+VERSION_KEY = "tasks:page-version:{user_id}"
+PAGE_KEY = "tasks:page:{user_id}:{version}:{digest}"
+
+# Rendered pages larger than this are not cached, so the cache holds at most MAX_ENTRIES × MAX_BYTES.
+DEFAULT_MAX_BYTES = 256 * 1024
+
+
+class PageCacheStats:
+    """
+    Process-wide hit / miss counters of the page cache.
+
+    Attributes:
+        hits (int): Pages served from the cache.
+        misses (int): Pages rendered and stored in the cache.
+        bypasses (int): Pages rendered without looking at the cache (pending messages, no CSRF cookie yet).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self) -> None:
+        with self._lock:
+            self.hits = self.misses = self.bypasses = 0
+
+    def record(self, outcome: str) -> None:
+        with self._lock:
+            setattr(self, outcome, getattr(self, outcome) + 1)
+        metrics.PAGE_CACHE_LOOKUPS.labels(outcome).inc()
+
+    def as_dict(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "bypasses": self.bypasses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+stats = PageCacheStats()
+
+
+def get_cache():
+    """
+    Returns the cache configured by the TASK_PAGE_CACHE setting (a CACHES alias), or None if caching is disabled.
+    """
+
+    alias = getattr(settings, "TASK_PAGE_CACHE", "default")
+    return caches[alias] if alias else None
+
+
+def get_version(user_id: int, cache=None) -> int:
+    """
+    Returns the data version of a user, the part of every page key that writes change.
+
+    A missing version (first request, or evicted by the cache) starts at the current time in nanoseconds, so it can
+    never match the version of pages cached before.
+
+    :param user_id: The ID of the user.
+    :param cache: The page cache; defaults to `get_cache()`.
+    :return: int, the current version.
+    """
+
+    cache = cache or get_cache()
+    key = VERSION_KEY.format(user_id=user_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), timeout=None)
+        version = cache.get(key, time.time_ns())
+    return version
+
+
+def bump_version(user_id: Optional[int]) -> None:
+    """
+    Makes every cached page of a user unreachable by incrementing their data version.
+
+    Inside a transaction the version is bumped again when it commits: a page rendered between the first bump and the
+    commit still shows the old data and must not stay reachable under the new version.
+
+    The user's reads are also pinned to the primary database for a while (see `routers.pin_to_primary`): like
+    cached pages, lagging read replicas must not show them their data from before the change.
+
+    :param user_id: The ID of the user whose data changed.
+    """
+
+    routers.pin_to_primary(user_id)
+    cache = get_cache()
+    if cache is None or user_id is None:
+        return
+
+    key = VERSION_KEY.format(user_id=user_id)
+
+    def bump():
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), timeout=None)
+
+    bump()
+    using = shards.database(user_id)
+    if transaction.get_connection(using).in_atomic_block:
+        transaction.on_commit(bump, using=using)
+
+
+def page_key(request, version: int) -> str:
+    """
+    Builds the cache key of the page requested by `request`.
+
+    Besides the user and their data version the key covers the full path (filters, search, cursors), the current day
+    (the today / overdue lists change at midnight without any write) and the CSRF cookie the page's forms were
+    rendered for.
+
+    :param request: The HTTP request.
+    :param version: The data version of the user.
+    :return: str, the cache key.
+    """
+
+    raw = "|".join([
+        request.get_full_path(),
+        datetime.date.today().isoformat(),
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ""),
+    ])
+    digest = hashlib.sha256(raw.encode()).hexdigest()[:32]
+    return PAGE_KEY.format(user_id=request.user.id, version=version, digest=digest)
+
+
+def cache_page_per_user(view):
+    """
+    Serves GET requests of a list view from the page cache, keyed by the user and their data version.
+
+    Pages are never deleted: writes bump the user's version (see `bump_version`) and the stale pages age out of the
+    cache through its LRU eviction. Requests with pending messages, without a CSRF cookie yet or from anonymous users
+    are rendered as usual.
+    """
+
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        cache = get_cache()
+        if cache is None or request.method != "GET" or not request.user.is_authenticated:
+            return view(request, *args, **kwargs)
+
+        if not request.COOKIES.get(settings.CSRF_COOKIE_NAME) or len(messages.get_messages(request)):
+            stats.record("bypasses")
+            return view(request, *args, **kwargs)
+
+        key = page_key(request, get_version(request.user.id, cache))
+        cached = cache.get(key)
+        if cached is not None:
+            stats.record("hits")
+            content, content_type = cached
+            response = HttpResponse(content, content_type=content_type)
+            response["X-Page-Cache"] = "HIT"
+            patch_cache_control(response, private=True)
+            return response
+
+        stats.record("misses")
+        response = view(request, *args, **kwargs)
+        max_bytes = getattr(settings, "TASK_PAGE_CACHE_MAX_BYTES", DEFAULT_MAX_BYTES)
+        if (response.status_code == 200 and not response.streaming and not response.cookies
+                and len(response.content) <= max_bytes):
+            cache.set(key, (response.content, response["Content-Type"]),
+                      getattr(settings, "TASK_PAGE_CACHE_TIMEOUT", 300))
+        response["X-Page-Cache"] = "MISS"
+        patch_cache_control(response, private=True)
+        return response
+
+    return wrapper
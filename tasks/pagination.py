@@ -0,0 +1,193 @@
+import base64
+import datetime
+from typing import Optional
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+
+PAGE_SIZE = 50
+
+
+def encode_cursor(date: Optional[datetime.datetime], pk: int) -> str:
+    """
+    Encodes a (date, id) position as an opaque, URL-safe cursor.
+
+    :param date: The date of the task at the position (None for tasks without a date).
+    :param pk: The ID of the task at the position.
+    :return: str, the cursor.
+    """
+
+    raw = f"{date.isoformat() if date else ''}|{pk}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> Optional[tuple]:
+    """
+    Decodes a cursor produced by `encode_cursor`.
+
+    :param cursor: The cursor to decode.
+    :return: tuple (date, id), or None if the cursor is malformed.
+    """
+
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        date, pk = raw.split("|")
+        date = parse_datetime(date) if date else None
+        return date, int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def page_ranges(queryset, cursor: Optional[tuple], reverse: bool, dated: bool = False) -> list:
+    """
+    Returns the querysets that read the rows after `cursor` in ascending (date NULLS LAST, id) order, or the rows
+    before it walking towards the start if `reverse`, one after the other.
+
+    The tasks with a date and those without one are two ranges of the (..., date, id) indexes: the first is bounded
+    by `date >= cursor date` (`<=` walking back) and ordered by (date, id), the second is ordered by id, so each is a
+    seek followed by an ordered read of the index. A single `OR date IS NULL` predicate would leave the index without
+    a range bound, and deep pages would scan the user's rows from the start.
+
+    :param queryset: The filtered task queryset.
+    :param cursor: The (date, id) position to start from, or None for the first page.
+    :param reverse: Whether to walk towards the start.
+    :param dated: Whether the queryset only holds tasks with a date, which leaves out the range of those without one.
+    :return: list of ordered querysets.
+    """
+
+    direction = "-" if reverse else ""
+    with_date = queryset.filter(date__isnull=False).order_by(f"{direction}date", f"{direction}id")
+    without_date = queryset.filter(date__isnull=True).order_by(f"{direction}id")
+    if cursor is None:
+        ranges = [without_date, with_date] if reverse else [with_date, without_date]
+    else:
+        date, pk = cursor
+        if date is None:
+            without_date = without_date.filter(id__lt=pk) if reverse else without_date.filter(id__gt=pk)
+            ranges = [without_date, with_date] if reverse else [without_date]
+        elif reverse:
+            ranges = [with_date.filter(Q(date__lt=date) | Q(id__lt=pk), date__lte=date)]
+        else:
+            ranges = [with_date.filter(Q(date__gt=date) | Q(id__gt=pk), date__gte=date), without_date]
+    if dated:
+        ranges = [rows_range for rows_range in ranges if rows_range is not without_date]
+    return ranges
+
+
+def _page_query(queryset, cursor: Optional[tuple], reverse: bool, limit: int, dated: bool = False) -> list:
+    """
+    Reads at most `limit` rows of the ranges of `page_ranges`, in their order: the second range only if the first one
+    does not fill the page.
+    """
+
+    rows = []
+    for rows_range in page_ranges(queryset, cursor, reverse, dated):
+        if len(rows) >= limit:
+            break
+        rows.extend(rows_range[:limit - len(rows)])
+    return rows
+
+
+class KeysetPage:
+    """
+    One page of a keyset-paginated task list.
+
+    Attributes:
+        object_list (list): The tasks of the page.
+        has_previous (bool): Whether there are tasks before this page.
+        has_next (bool): Whether there are tasks after this page.
+        previous_query (str): Query string of the previous page (keeps the other GET parameters).
+        next_query (str): Query string of the next page (keeps the other GET parameters).
+    """
+
+    def __init__(self, object_list: list, has_previous: bool, has_next: bool, params):
+        self.object_list = object_list
+        self.has_previous = has_previous and bool(object_list)
+        self.has_next = has_next and bool(object_list)
+        self.previous_query = self._query(params, "before", object_list[0] if object_list else None)
+        self.next_query = self._query(params, "after", object_list[-1] if object_list else None)
+
+    @staticmethod
+    def _query(params, key: str, task) -> str:
+        if task is None:
+            return ""
+        params = params.copy()
+        params.pop("before", None)
+        params.pop("after", None)
+        params[key] = encode_cursor(task.date, task.id)
+        return params.urlencode()
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _sort_key(task) -> tuple:
+    """
+    The (date NULLS LAST, id) position of a task, for merging the pages of several querysets.
+    """
+
+    return task.date is None, task.date.timestamp() if task.date else 0, task.id
+
+
+def paginate(queryset, request, descending: bool = False, page_size: int = None, dated: bool = False) -> KeysetPage:
+    """
+    Returns the page of `queryset` selected by the `after` / `before` cursor in the request.
+
+    Tasks are ordered by (date, id), with tasks without a date last (first when `descending`). A page seeks the cursor
+    in the (date, id) order of an index and reads `page_size + 1` rows from there (see `page_ranges`; a second query
+    reads the tasks without a date when those with one do not fill the page), so its cost does not depend on how deep
+    the page is. A list of querysets (the tiers of `tasks.archive`) is paginated as one list of their rows: every
+    queryset is read that way and the rows are merged.
+
+    :param queryset: The filtered task queryset, or a list of them.
+    :param request: The HTTP request carrying the cursor.
+    :param descending: Whether to list the newest tasks first.
+    :param page_size: The number of tasks per page; defaults to PAGE_SIZE.
+    :param dated: Whether the queryset only holds tasks with a date (e.g. the today / overdue lists), which saves
+        reading the tasks without one.
+    :return: KeysetPage with the tasks of the page.
+    """
+
+    page_size = page_size or PAGE_SIZE
+
+    after = decode_cursor(request.GET.get("after", ""))
+    before = None if after else decode_cursor(request.GET.get("before", ""))
+
+    # Walking backwards means fetching in the opposite order and reversing the rows afterwards.
+    backwards = before is not None
+    cursor = before or after
+    querysets = queryset if isinstance(queryset, (list, tuple)) else [queryset]
+    rows = []
+    for queryset in querysets:
+        rows.extend(_page_query(queryset, cursor, descending != backwards, page_size + 1, dated))
+    if len(querysets) > 1:
+        rows.sort(key=_sort_key, reverse=descending != backwards)
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+
+    if backwards:
+        rows.reverse()
+        return KeysetPage(rows, has_previous=has_more, has_next=True, params=request.GET)
+    return KeysetPage(rows, has_previous=after is not None, has_next=has_more, params=request.GET)
+
+
+def first_page(queryset, request, page_size: int = None) -> KeysetPage:
+    """
+    Returns the first `page_size` rows of a queryset in its own order, without cursors (e.g. ranked search results).
+
+    :param queryset: The ordered task queryset, or a list of them, whose rows follow each other.
+    :param request: The HTTP request.
+    :param page_size: The number of tasks on the page; defaults to PAGE_SIZE.
+    :return: KeysetPage with the tasks of the page.
+    """
+
+    page_size = page_size or PAGE_SIZE
+    rows = []
+    for queryset in queryset if isinstance(queryset, (list, tuple)) else [queryset]:
+        if len(rows) < page_size:
+            rows.extend(queryset[:page_size - len(rows)])
+    return KeysetPage(rows, has_previous=False, has_next=False, params=request.GET)
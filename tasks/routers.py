@@ -0,0 +1,184 @@
+import logging
+import random
+import time
+from contextvars import ContextVar
+from typing import Optional
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from . import shards
+
+logger = logging.getLogger(__name__)
+
+PIN_KEY = "tasks:replica-pin:{user_id}"
+
+# alias -> time.monotonic() until which a replica that failed to connect is skipped
+_down = {}
+
+
+class ReadState:
+    """
+    Where the queries of one request read from.
+
+    Attributes:
+        primary (bool): Whether the request reads from the primary: it is not a GET / HEAD request, its user wrote
+            within TASK_REPLICA_PIN_SECONDS or it has written itself.
+        replica (str): The replica alias the request reads from, picked on its first read.
+    """
+
+    def __init__(self, primary: bool):
+        self.primary = primary
+        self.replica = None
+
+
+_state: ContextVar[Optional[ReadState]] = ContextVar("tasks_read_state", default=None)
+
+
+def replicas() -> list:
+    return getattr(settings, "TASK_READ_REPLICAS", [])
+
+
+def begin_request(primary: bool):
+    """
+    Lets the reads of the current request (see `ReplicaRoutingMiddleware`) go to a replica unless `primary` is set.
+
+    :return: Token for `end_request`.
+    """
+
+    return _state.set(ReadState(primary))
+
+
+def end_request(token) -> None:
+    _state.reset(token)
+
+
+def pin_to_primary(user_id: Optional[int]) -> None:
+    """
+    Sends the reads of a user who just wrote to the primary for TASK_REPLICA_PIN_SECONDS, so they never see a replica
+    lagging behind their own changes. The pin lives in the default cache, so it holds across the workers (and the
+    devices of the user) when that cache is shared.
+
+    :param user_id: The ID of the user who wrote.
+    """
+
+    state = _state.get()
+    if state is not None:
+        state.primary = True
+    if user_id is not None and replicas():
+        timeout = getattr(settings, "TASK_REPLICA_PIN_SECONDS", 10)
+        caches["default"].set(PIN_KEY.format(user_id=user_id), True, timeout)
+
+
+def is_pinned(user_id: int) -> bool:
+    return bool(caches["default"].get(PIN_KEY.format(user_id=user_id)))
+
+
+async def ais_pinned(user_id: int) -> bool:
+    return bool(await caches["default"].aget(PIN_KEY.format(user_id=user_id)))
+
+
+def _pick_replica() -> Optional[str]:
+    """
+    Picks a replica at random among those that did not fail recently, connecting to it to check that it is up.
+    A replica that cannot be reached is skipped for TASK_REPLICA_RETRY_SECONDS.
+
+    :return: The alias of the replica, or None if none is reachable.
+    """
+
+    now = time.monotonic()
+    candidates = [alias for alias in replicas() if _down.get(alias, 0) <= now]
+    random.shuffle(candidates)
+    for alias in candidates:
+        try:
+            connections[alias].ensure_connection()
+        except DatabaseError:
+            logger.warning("Read replica %s is unreachable; reading from the primary", alias, exc_info=True)
+            _down[alias] = now + getattr(settings, "TASK_REPLICA_RETRY_SECONDS", 30)
+        else:
+            return alias
+    return None
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of the task models made by read-only requests to the read replicas in TASK_READ_REPLICAS, and
+    everything else to the primary (the default database).
+
+    Reads go to the primary:
+        - outside requests (management commands, background work) and in requests that are not GET / HEAD
+        - for the rest of a request once it wrote anything, and inside transactions
+        - for a user who wrote within the last TASK_REPLICA_PIN_SECONDS (see `pin_to_primary`)
+        - for the models of other apps (sessions and users must never lag behind a login)
+        - when no replica can be reached
+
+    A request reads from a single replica, so its queries see one consistent state.
+    """
+
+    def db_for_read(self, model, **hints) -> str:
+        state = _state.get()
+        if (state is None or state.primary or model._meta.app_label != "tasks" or not replicas()
+                or connections[DEFAULT_DB_ALIAS].in_atomic_block):
+            return DEFAULT_DB_ALIAS
+        if state.replica is None:
+            state.replica = _pick_replica()
+            if state.replica is None:
+                state.primary = True
+                return DEFAULT_DB_ALIAS
+        return state.replica
+
+    def db_for_write(self, model, **hints) -> str:
+        state = _state.get()
+        if state is not None:
+            state.primary = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        # the replicas hold the same rows as the primary
+        databases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints) -> Optional[bool]:
+        # the replicas get their schema from the primary through replication
+        return False if db in replicas() else None
+
+
+class ShardRouter:
+    """
+    Sends the queries of the per-user task models to the shard selected for the current request or block (see
+    `tasks.shards`) and those of the shard directory to the default database; everything else is left to the next
+    router. Related rows are read from the shard their instance came from.
+
+    Every shard gets all the migrations (`migrate_shards`), so it must come before `ReplicaRouter`, which does not
+    route the sharded models once this router does. Without TASK_SHARDS it routes nothing.
+    """
+
+    def _route(self, model, hints) -> Optional[str]:
+        if not shards.aliases():
+            return None
+        if model._meta.label_lower == "tasks.shardplacement":
+            return shards.DIRECTORY
+        if model._meta.label_lower not in shards.SHARDED_MODELS:
+            return None
+        instance = hints.get("instance")
+        if instance is not None and instance._meta.label_lower in shards.SHARDED_MODELS and instance._state.db:
+            return instance._state.db
+        return shards.current()
+
+    def db_for_read(self, model, **hints) -> Optional[str]:
+        return self._route(model, hints)
+
+    def db_for_write(self, model, **hints) -> Optional[str]:
+        return self._route(model, hints)
+
+    def allow_relation(self, obj1, obj2, **hints) -> Optional[bool]:
+        if not shards.aliases():
+            return None
+        sharded = [obj for obj in (obj1, obj2) if obj._meta.label_lower in shards.SHARDED_MODELS]
+        if len(sharded) == 2:
+            return obj1._state.db == obj2._state.db
+        # the owner of a row on a shard is a user on the default database
+        return True if sharded else None
@@ -0,0 +1,47 @@
+from django.conf import settings
+from django.db import connections
+from django.utils.module_loading import import_string
+
+from ..models import ArchivedTask
+from .base import SearchBackend, ArchiveSearchBackend
+
+DEFAULT_BACKENDS = {
+    'postgresql': 'tasks.search.postgres.PostgresSearchBackend',
+    'sqlite': 'tasks.search.sqlite.SQLiteSearchBackend',
+}
+
+
+def get_backend(using: str = 'default') -> SearchBackend:
+    """
+    Returns the task search backend.
+
+    The backend is taken from the `TASK_SEARCH_BACKEND` setting (a dotted path) and otherwise chosen by the database
+    vendor, falling back to the portable `icontains` backend.
+
+    :param using: The database alias the search runs against.
+    :return: SearchBackend instance.
+    """
+
+    path = getattr(settings, 'TASK_SEARCH_BACKEND', None)
+    if path is None:
+        path = DEFAULT_BACKENDS.get(connections[using].vendor, 'tasks.search.base.IContainsSearchBackend')
+    return import_string(path)()
+
+
+def search_tasks(queryset, query: str):
+    """
+    Filters a task queryset by a search query and orders it by relevance.
+
+    Archived tasks (see `tasks.archive`) are searched with `ArchiveSearchBackend`; a list of querysets (the tiers of
+    the completed tasks) gives the list of their results, to be shown one after another (`pagination.first_page`).
+
+    :param queryset: The task queryset to search in, or a list of them.
+    :param query: The text typed in the search box.
+    :return: QuerySet of the matching tasks, best matches first; a list of them for a list.
+    """
+
+    if isinstance(queryset, (list, tuple)):
+        return [search_tasks(tier, query) for tier in queryset]
+    if queryset.model is ArchivedTask:
+        return ArchiveSearchBackend().search(queryset, query)
+    return get_backend(queryset.db).search(queryset, query)
@@ -0,0 +1,50 @@
+import re
+
+from django.db.models import Q, QuerySet
+
+
+class SearchBackend:
+    """
+    Base class of the task search backends.
+
+    A backend turns the text typed in the search box into a filtered task queryset ordered by relevance.
+    """
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        raise NotImplementedError
+
+    @staticmethod
+    def terms(query: str) -> list:
+        """
+        Splits a search query into words, dropping any query syntax characters.
+
+        :param query: The text typed in the search box.
+        :return: list of the words.
+        """
+
+        return re.findall(r"\w+", query)
+
+
+class IContainsSearchBackend(SearchBackend):
+    """
+    Portable backend matching the whole query as a substring of the title or description (sequential scan).
+    """
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        return queryset.filter(Q(title__icontains=query) | Q(description__icontains=query)).order_by('id')
+
+
+class ArchiveSearchBackend(SearchBackend):
+    """
+    Backend of the archived tasks (see `tasks.archive`): every word must be in the title or the description, in any
+    order. The archive has no full-text index, which would slow down archiving for a rarely searched table, and
+    compressed descriptions are not searched.
+    """
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        terms = self.terms(query)
+        if not terms:
+            return queryset.none()
+        for term in terms:
+            queryset = queryset.filter(Q(title__icontains=term) | Q(description__icontains=term))
+        return queryset.order_by('-date', '-id')
@@ -0,0 +1,37 @@
+from django.db.models import BooleanField, FloatField, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .base import SearchBackend
+
+# The text search configuration of the queries. It has to match the one `search_vector` is built with: migration 0007
+# creates that generated column (PostgreSQL keeps it up to date itself), its GIN index and the trigram index of the
+# titles.
+CONFIG = 'english'
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Full-text search over the GIN-indexed `search_vector` column, with prefix matching on every word and a trigram
+    match on the title so that typos still find the task.
+
+    Both conditions are OR-ed in a single query (a BitmapOr of the two GIN indexes); full-text hits rank first
+    (`ts_rank`, title weighted over description), then trigram similarity.
+    """
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        terms = self.terms(query)
+        if not terms:
+            return queryset.none()
+
+        table = queryset.model._meta.db_table
+        tsquery = f"to_tsquery('{CONFIG}', %s)"
+        prefix_query = " & ".join(f"{term}:*" for term in terms)
+        text = " ".join(terms)
+
+        return (queryset
+                .filter(RawSQL(f"({table}.search_vector @@ {tsquery} OR {table}.title %% %s)",
+                               [prefix_query, text], output_field=BooleanField()))
+                .annotate(rank=RawSQL(f"ts_rank({table}.search_vector, {tsquery})", [prefix_query],
+                                      output_field=FloatField()),
+                          similarity=RawSQL(f"similarity({table}.title, %s)", [text], output_field=FloatField()))
+                .order_by('-rank', '-similarity', 'id'))
@@ -0,0 +1,75 @@
+from django.db.models import BooleanField, QuerySet
+from django.db.models.expressions import RawSQL
+
+from .base import SearchBackend
+
+FTS_TABLE = 'tasks_task_fts'
+
+INSTALL_SQL = [
+    f"""
+    CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE}
+    USING fts5(title, description, content='tasks_task', content_rowid='id')
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_insert AFTER INSERT ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_delete AFTER DELETE ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS tasks_task_fts_update AFTER UPDATE OF title, description ON tasks_task BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, title, description)
+        VALUES ('delete', old.id, old.title, old.description);
+        INSERT INTO {FTS_TABLE}(rowid, title, description) VALUES (new.id, new.title, new.description);
+    END
+    """,
+    f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')",
+]
+
+
+def install(sender, using: str = 'default', **kwargs) -> None:
+    """
+    `post_migrate` handler creating the FTS5 index of `tasks_task` and the triggers keeping it in sync.
+
+    It runs after every migrate because SQLite drops the triggers whenever a migration rebuilds `tasks_task`.
+
+    :param sender: The app config that was migrated.
+    :param using: The database alias that was migrated.
+    """
+
+    from django.db import connections
+
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or 'tasks_task' not in connection.introspection.table_names():
+        return
+    with connection.cursor() as cursor:
+        for statement in INSTALL_SQL:
+            cursor.execute(statement)
+
+
+class SQLiteSearchBackend(SearchBackend):
+    """
+    SQLite FTS5 stand-in for the PostgreSQL backend: prefix matching on every word, title matches ranked first.
+
+    Both conditions are uncorrelated `IN (SELECT rowid …)` subqueries, which SQLite evaluates once per query. FTS5 has
+    no typo tolerance, so there is no trigram fallback.
+    """
+
+    def search(self, queryset: QuerySet, query: str) -> QuerySet:
+        terms = self.terms(query)
+        if not terms:
+            return queryset.none()
+
+        table = queryset.model._meta.db_table
+        match = " ".join(f'"{term}"*' for term in terms)
+        matching = f"{table}.id IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)"
+
+        return (queryset
+                .filter(RawSQL(matching, [match], output_field=BooleanField()))
+                .annotate(title_match=RawSQL(matching, [f"title : ({match})"], output_field=BooleanField()))
+                .order_by('-title_match', 'id'))
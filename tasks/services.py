@@ -0,0 +1,326 @@
+import datetime
+from typing import Optional
+
+from django.db import connections, router, transaction
+from django.db.models import F, QuerySet
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import archive, counters, events, metrics, page_cache, shards, sync
+from .counters import TaskState
+from .models import Task, ArchivedTask, TagTask, Tombstone
+
+
+def save_task(task: Task, before: Optional[TaskState] = None, restore: bool = False) -> Task:
+    """
+    Saves a created or edited task and updates its owner's counters in the same transaction.
+
+    Every write in this module also bumps the owner's page cache version (see `page_cache.bump_version`) and sends a
+    live event to their open tabs once it commits (see `tasks.events`). Writes take the next number of the owner's
+    change sequence and deletions leave tombstones, for the delta sync of the API (see `tasks.sync`). The transactions
+    run on the shard of the owner's data (see `shards.atomic`). Writes to tasks given by ID move the archived ones
+    among them back to `Task` first (see `tasks.archive`).
+
+    :param task: The task to save.
+    :param before: TaskState captured before the task was modified; None for new tasks.
+    :param restore: Whether the task was read from the archive (`archive.get_archived`) and is moved back first.
+    :return: The saved task.
+    """
+
+    with shards.atomic(task.user_id):
+        if task.user_id is not None:
+            task.seq = sync.next_seq(task.user_id)
+        # the archived row is dropped and the task inserted in its place (unless a write restored it meanwhile)
+        restore = restore and ArchivedTask.objects.filter(user_id=task.user_id, pk=task.pk).delete()[0] > 0
+        task.save(force_insert=restore)
+        counter = counters.record_change(task.user_id, before, counters.task_state(task))
+        page_cache.bump_version(task.user_id)
+        events.publish(task.user_id, "created" if before is None else "edited", counter, task=events.task_json(task))
+    if before is None:
+        metrics.TASKS_CREATED.inc()
+    return task
+
+
+def _db_datetime(value) -> Optional[datetime.datetime]:
+    """
+    Converts a datetime read with a raw cursor (SQLite returns naive UTC strings) to an aware datetime.
+    """
+
+    if isinstance(value, str):
+        value = parse_datetime(value)
+    if value is not None and timezone.is_naive(value):
+        value = timezone.make_aware(value, datetime.timezone.utc)
+    return value
+
+
+def toggle_tasks(user, task_ids) -> dict:
+    """
+    Flips the completion status of the user's tasks with a single `UPDATE … SET completed = NOT completed` statement.
+
+    The statement returns the new state of every toggled row (`RETURNING`), so the tasks are never read beforehand and
+    concurrent toggles cannot overwrite each other. Ids of tasks that do not exist or belong to another user are
+    ignored. Archived tasks are restored, then reopened like the others.
+
+    :param user: The owner of the tasks.
+    :param task_ids: The IDs of the tasks to toggle.
+    :return: dict mapping the ID of every toggled task to its new completion status.
+    """
+
+    task_ids = list(dict.fromkeys(int(task_id) for task_id in task_ids))
+    if not task_ids:
+        return {}
+
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    with shards.atomic(user.id) as using:
+        seq = sync.next_seq(user.id)
+        archive.restore(user.id, task_ids)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"UPDATE {Task._meta.db_table} SET completed = NOT completed, updated_at = %s, seq = %s "
+                f"WHERE user_id = %s AND id IN ({placeholders}) "
+                f"RETURNING id, completed, date, tag_id",
+                [timezone.now(), seq, user.id, *task_ids],
+            )
+            rows = cursor.fetchall()
+
+        changes = []
+        for task_id, completed, date, tag_id in rows:
+            after = TaskState(bool(completed), _db_datetime(date), tag_id)
+            changes.append((after._replace(completed=not after.completed), after))
+        counter = counters.record_changes(user.id, changes)
+        if rows:
+            page_cache.bump_version(user.id)
+            events.publish(user.id, "toggled", counter,
+                           tasks=[{"id": task_id, "completed": bool(completed)} for task_id, completed, _, _ in rows])
+
+    metrics.TASKS_TOGGLED.inc(len(rows))
+    return {task_id: bool(completed) for task_id, completed, _, _ in rows}
+
+
+def delete_task(task: Task) -> None:
+    """
+    Deletes a task and updates its owner's counters in the same transaction.
+
+    :param task: The task to delete.
+    """
+
+    with shards.atomic(task.user_id):
+        before = counters.task_state(task)
+        task_id = task.id
+        task.delete()
+        if task.user_id is not None:
+            sync.record_deletions(task.user_id, Tombstone.TASK, [task_id], sync.next_seq(task.user_id))
+        counter = counters.record_change(task.user_id, before, None)
+        page_cache.bump_version(task.user_id)
+        events.publish(task.user_id, "deleted", counter, ids=[task_id])
+    metrics.TASKS_DELETED.inc()
+
+
+def rename_task(user, task_id: int, title: str) -> bool:
+    """
+    Renames one of the user's tasks with a single UPDATE.
+
+    :param user: The owner of the task.
+    :param task_id: The ID of the task to rename.
+    :param title: The new title.
+    :return: Whether the task was found and renamed.
+    """
+
+    with shards.atomic(user.id):
+        seq = sync.next_seq(user.id)
+        archive.restore(user.id, [task_id])
+        renamed = bool(Task.objects.filter(pk=task_id, user=user).update(
+            title=title, updated_at=timezone.now(), seq=seq))
+        if renamed:
+            page_cache.bump_version(user.id)
+            events.publish(user.id, "edited", task={"id": task_id, "title": title})
+    return renamed
+
+
+def delete_tasks(user, task_ids) -> list:
+    """
+    Deletes the user's tasks with a single `DELETE … RETURNING` statement and updates the counters row.
+
+    :param user: The owner of the tasks.
+    :param task_ids: The IDs of the tasks to delete.
+    :return: list of the IDs of the deleted tasks.
+    """
+
+    task_ids = list(dict.fromkeys(int(task_id) for task_id in task_ids))
+    if not task_ids:
+        return []
+
+    placeholders = ", ".join(["%s"] * len(task_ids))
+    with shards.atomic(user.id) as using:
+        seq = sync.next_seq(user.id)
+        archive.restore(user.id, task_ids)
+        with connections[using].cursor() as cursor:
+            cursor.execute(
+                f"DELETE FROM {Task._meta.db_table} WHERE user_id = %s AND id IN ({placeholders}) "
+                f"RETURNING id, completed, date, tag_id",
+                [user.id, *task_ids],
+            )
+            rows = cursor.fetchall()
+        sync.record_deletions(user.id, Tombstone.TASK, [task_id for task_id, _, _, _ in rows], seq)
+        counter = counters.record_changes(user.id, [
+            (TaskState(bool(completed), _db_datetime(date), tag_id), None) for _, completed, date, tag_id in rows
+        ])
+        if rows:
+            page_cache.bump_version(user.id)
+            events.publish(user.id, "deleted", counter, ids=[task_id for task_id, _, _, _ in rows])
+
+    metrics.TASKS_DELETED.inc(len(rows))
+    return [task_id for task_id, _, _, _ in rows]
+
+
+def bulk_update_tasks(user, tasks: QuerySet, action: str, tag: Optional[TagTask] = None, days: int = None,
+                      archived: Optional[QuerySet] = None) -> int:
+    """
+    Applies a bulk action to a selection of the user's tasks with one set-based statement.
+
+    The statement and the rebuild of the user's counters run in one transaction.
+
+    :param user: The owner of the tasks.
+    :param tasks: The selected tasks (already restricted to the user).
+    :param action: One of complete, reopen, delete, retag or reschedule.
+    :param tag: The new tag for retag (None removes the tag).
+    :param days: The number of days to shift the due dates by for reschedule.
+    :param archived: The selected archived tasks; they are restored (and then selected by `tasks`) unless the action
+        is complete, which leaves them as they are.
+    :return: The number of affected tasks.
+    """
+
+    # `update()` bypasses `auto_now`, so the modification stamp is set explicitly
+    now = timezone.now()
+    with shards.atomic(user.id):
+        seq = sync.next_seq(user.id)
+        if archived is not None and action != 'complete':
+            archive.restore(user.id, archived.values('id'))
+        if action == 'complete':
+            affected = tasks.filter(completed=False).update(completed=True, updated_at=now, seq=seq)
+        elif action == 'reopen':
+            affected = tasks.filter(completed=True).update(completed=False, updated_at=now, seq=seq)
+        elif action == 'delete':
+            task_ids = list(tasks.values_list('id', flat=True))
+            affected, _ = Task.objects.filter(pk__in=task_ids).delete()
+            sync.record_deletions(user.id, Tombstone.TASK, task_ids, seq)
+        elif action == 'retag':
+            affected = tasks.update(tag=tag, updated_at=now, seq=seq)
+        elif action == 'reschedule':
+            affected = tasks.filter(date__isnull=False).update(date=F('date') + datetime.timedelta(days=days),
+                                                               updated_at=now, seq=seq)
+        else:
+            raise ValueError(f"Unknown bulk action: {action}")
+
+        if affected:
+            counter = counters.rebuild(user.id)
+            page_cache.bump_version(user.id)
+            events.publish(user.id, "changed", counter)
+    if action in ('complete', 'reopen'):
+        metrics.TASKS_TOGGLED.inc(affected)
+    elif action == 'delete':
+        metrics.TASKS_DELETED.inc(affected)
+    return affected
+
+
+def save_tag(tag: TagTask) -> TagTask:
+    """
+    Saves a created or edited tag.
+
+    :param tag: The tag to save.
+    :return: The saved tag.
+    """
+
+    with shards.atomic(tag.user_id_id):
+        if tag.user_id_id is not None:
+            tag.seq = sync.next_seq(tag.user_id_id)
+        tag.save()
+        page_cache.bump_version(tag.user_id_id)
+        events.publish(tag.user_id_id, "changed")
+    return tag
+
+
+def delete_tag(tag: TagTask) -> None:
+    """
+    Deletes a tag together with its tasks and rebuilds its owner's counters in the same transaction.
+
+    :param tag: The tag to delete.
+    """
+
+    with shards.atomic(tag.user_id_id):
+        tag_id = tag.id
+        task_ids = [*Task.objects.filter(tag=tag).values_list('id', flat=True),
+                    *ArchivedTask.objects.filter(tag=tag).values_list('id', flat=True)]
+        tag.delete()
+        if tag.user_id_id is not None:
+            seq = sync.next_seq(tag.user_id_id)
+            sync.record_deletions(tag.user_id_id, Tombstone.TASK, task_ids, seq)
+            sync.record_deletions(tag.user_id_id, Tombstone.TAG, [tag_id], seq)
+            counter = counters.rebuild(tag.user_id_id)
+            page_cache.bump_version(tag.user_id_id)
+            events.publish(tag.user_id_id, "changed", counter)
+
+
+def refresh_users(user_ids) -> None:
+    """
+    Rebuilds the counters and invalidates the cached pages of users whose tasks or tags were changed in bulk outside
+    this module (e.g. the admin's "delete selected" action). Must be called inside the transaction of the write.
+
+    :param user_ids: The IDs of the affected users; None entries are ignored.
+    """
+
+    for user_id in set(user_ids) - {None}:
+        counter = counters.rebuild(user_id)
+        page_cache.bump_version(user_id)
+        events.publish(user_id, "changed", counter)
+
+
+def reassign_task(task: Task, previous_user_id: Optional[int]) -> Task:
+    """
+    Saves a task moved to another user: it is new to its owner and deleted for the previous one.
+
+    With sharding the task stays on the shard it was read from, so both users must be on that shard.
+
+    :param task: The task, with its new owner set.
+    :param previous_user_id: The ID of the owner before the move.
+    :return: The saved task.
+    :raises ValueError: if the new owner's data is on another shard.
+    """
+
+    using = router.db_for_write(Task, instance=task)
+    if shards.database(task.user_id) != using:
+        raise ValueError("The new owner's tasks are on another shard; move the task with an export and import.")
+    with transaction.atomic(using=using):
+        if task.user_id is not None:
+            task.seq = sync.next_seq(task.user_id)
+        task.save()
+        if previous_user_id is not None:
+            sync.record_deletions(previous_user_id, Tombstone.TASK, [task.id], sync.next_seq(previous_user_id))
+        refresh_users([previous_user_id, task.user_id])
+    return task
+
+
+def delete_in_bulk(queryset: QuerySet) -> None:
+    """
+    Deletes a selection of tasks or tags of any users (the admin's "delete selected" action), leaving the tombstones
+    of every deleted task and tag and refreshing the counters of their owners. With sharding the selection is on the
+    shard of the request, and so are the owners.
+
+    :param queryset: Task or TagTask queryset.
+    """
+
+    with transaction.atomic(using=queryset.db):
+        if queryset.model is TagTask:
+            tags = list(queryset.values_list('user_id', 'id'))
+            tasks = [*Task.objects.filter(tag__in=queryset).values_list('user_id', 'id'),
+                     *ArchivedTask.objects.filter(tag__in=queryset).values_list('user_id', 'id')]
+        else:
+            tags, tasks = [], list(queryset.values_list('user_id', 'id'))
+        queryset.delete()
+
+        user_ids = {user_id for user_id, _ in tags + tasks} - {None}
+        for user_id in user_ids:
+            seq = sync.next_seq(user_id)
+            sync.record_deletions(user_id, Tombstone.TASK, [pk for owner, pk in tasks if owner == user_id], seq)
+            sync.record_deletions(user_id, Tombstone.TAG, [pk for owner, pk in tags if owner == user_id], seq)
+        refresh_users(user_ids)
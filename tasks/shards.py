@@ -0,0 +1,402 @@
+"""
+User-based sharding of the task data.
+
+Every query of the task views is scoped to one user, so the per-user models (`SHARDED_MODELS`: tasks, archived tasks,
+tags, counters, change sequences and tombstones) can be spread over several databases, the shards in TASK_SHARDS. The
+users, their sessions and the directory of placements (`ShardPlacement`) stay on the default database.
+
+    directory   A user is placed on a shard when they sign up (or, for the users from before the sharding, on their
+                first visit), by consistent hashing of their ID onto the shards (`HashRing`), unless they already
+                have data on the default database. The placement is stored and stays until the user is moved, so
+                changing TASK_SHARDS never strands data.
+    routing     `ShardRoutingMiddleware` selects the shard of the request's user (`use_user`); `routers.ShardRouter`
+                sends the queries of the sharded models there. Code outside requests selects the shard itself with
+                `use_user` / `use`, or writes through `atomic`; without a selected shard the queries fail.
+    IDs         Every shard allocates task and tag IDs from a block of its own (`reserve_ids`), so IDs are unique
+                across the shards and rows keep them when their user moves.
+    moves       `move_user` copies a user's rows to another shard while they keep working, then switches their
+                placement (see `rebalance_shards`).
+
+With TASK_SHARDS empty (the default) everything stays on the default database and none of this costs a query.
+"""
+import bisect
+import hashlib
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+from typing import Optional
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.utils import timezone
+
+from .models import Task, ArchivedTask, TagTask, TaskCounter, SyncSequence, Tombstone, ShardPlacement
+
+SHARDED_MODELS = {"tasks.task", "tasks.archivedtask", "tasks.tagtask", "tasks.taskcounter", "tasks.syncsequence",
+                  "tasks.tombstone"}
+
+# The database of the users and of the placements.
+DIRECTORY = DEFAULT_DB_ALIAS
+
+# IDs per shard: the shard at position N of TASK_SHARDS allocates the IDs (N * ID_BLOCK, (N + 1) * ID_BLOCK].
+ID_BLOCK = 2 ** 40
+
+DEFAULT_VNODES = 64
+
+
+class NoShardSelected(RuntimeError):
+    """
+    A sharded model was queried outside `use_user` / `use`: it is unknown which shard holds the rows.
+    """
+
+
+class ShardMoved(Exception):
+    """
+    A write reached the shard a user was just moved away from (see `move_user`); it was rolled back and has to be
+    retried on the user's new shard.
+    """
+
+
+def aliases() -> list:
+    return getattr(settings, "TASK_SHARDS", [])
+
+
+def databases() -> list:
+    """
+    Returns the aliases of every database that may hold users' data: the shards and the default database (users with
+    data from before the sharding stay there until they are moved).
+    """
+
+    return list(dict.fromkeys([DIRECTORY, *aliases()]))
+
+
+def _hash(key: str) -> int:
+    return int.from_bytes(hashlib.blake2b(key.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    """
+    Consistent hashing of user IDs onto shards.
+
+    Every shard owns `vnodes` points of a 64-bit ring; a user belongs to the shard of the first point at or after the
+    hash of their ID. Adding a shard only takes over the users of the arcs its points split (about 1 / N of them) and
+    removing one only moves its own users.
+    """
+
+    def __init__(self, shards, vnodes: int = DEFAULT_VNODES):
+        if not shards:
+            raise ValueError("A hash ring needs at least one shard.")
+        points = sorted((_hash(f"{alias}#{n}"), alias) for alias in shards for n in range(vnodes))
+        self._points = [point for point, _ in points]
+        self._shards = [alias for _, alias in points]
+
+    def shard(self, user_id: int) -> str:
+        index = bisect.bisect_left(self._points, _hash(str(user_id))) % len(self._points)
+        return self._shards[index]
+
+
+@lru_cache(maxsize=None)
+def _ring(shards: tuple, vnodes: int) -> HashRing:
+    return HashRing(shards, vnodes)
+
+
+def ring() -> HashRing:
+    """
+    Returns the hash ring of TASK_SHARDS, where new users are placed and where `rebalance_shards` moves users to.
+    """
+
+    return _ring(tuple(aliases()), getattr(settings, "TASK_SHARD_VNODES", DEFAULT_VNODES))
+
+
+class ShardState:
+    """
+    The shard the queries of the sharded models go to in the current context.
+
+    Attributes:
+        user_id (int): The user whose shard is selected; None if a shard was selected by alias.
+        alias (str): The DATABASES alias of the shard, looked up on the first query that needs it.
+    """
+
+    def __init__(self, user_id: Optional[int], alias: Optional[str] = None):
+        self.user_id = user_id
+        self.alias = alias
+
+
+_state: ContextVar[Optional[ShardState]] = ContextVar("tasks_shard_state", default=None)
+
+
+@contextmanager
+def use_user(user_id: Optional[int]):
+    """
+    Routes the queries of the sharded models inside the block to the shard of a user.
+
+    The placement is only looked up by the first query that needs it, and once per block.
+
+    :param user_id: The ID of the user; None selects the default database (tasks without an owner).
+    """
+
+    state = _state.get()
+    if state is not None and state.user_id == user_id and user_id is not None:
+        yield
+        return
+    token = _state.set(ShardState(user_id, None if user_id is not None else DIRECTORY))
+    try:
+        yield
+    finally:
+        _state.reset(token)
+
+
+@contextmanager
+def use(alias: str):
+    """
+    Routes the queries of the sharded models inside the block to a shard, e.g. to maintain all the users on it.
+    """
+
+    token = _state.set(ShardState(None, alias))
+    try:
+        yield alias
+    finally:
+        _state.reset(token)
+
+
+def current() -> str:
+    """
+    Returns the alias of the shard selected by the innermost `use_user` / `use` block.
+
+    :raises NoShardSelected: outside such a block.
+    """
+
+    state = _state.get()
+    if state is None:
+        raise NoShardSelected("Queries of the task data need a shard: run them in shards.use_user() or shards.use().")
+    if state.alias is None:
+        state.alias = database(state.user_id)
+    return state.alias
+
+
+def database(user_id: Optional[int]) -> str:
+    """
+    Returns the alias of the database holding a user's data, placing the user on a shard if they have none yet.
+
+    :param user_id: The ID of the user; None for tasks without an owner, which stay on the default database.
+    :return: str, a DATABASES alias; the default database when sharding is off.
+    """
+
+    if user_id is None or not aliases():
+        return DIRECTORY
+    state = _state.get()
+    if state is not None and state.user_id == user_id and state.alias is not None:
+        return state.alias
+    shard = ShardPlacement.objects.using(DIRECTORY).filter(user_id=user_id).values_list("shard", flat=True).first()
+    return shard or place(user_id)
+
+
+def place(user_id: int) -> str:
+    """
+    Stores the placement of a user who has none: on the default database if they have data there from before the
+    sharding (until `rebalance_shards` moves them), otherwise on their shard of the hash ring.
+
+    :return: str, the alias of the user's shard.
+    """
+
+    legacy = (Task.objects.using(DIRECTORY).filter(user_id=user_id).exists()
+              or TagTask.objects.using(DIRECTORY).filter(user_id=user_id).exists())
+    placement, _ = ShardPlacement.objects.using(DIRECTORY).get_or_create(
+        user_id=user_id, defaults={"shard": DIRECTORY if legacy else ring().shard(user_id)})
+    return placement.shard
+
+
+@contextmanager
+def atomic(user_id: Optional[int]):
+    """
+    Runs the block in a transaction on the database of a user's data, with the queries of the sharded models routed
+    there. Every write to a user's data goes through this (see `tasks.services`).
+
+    :param user_id: The ID of the user whose data is written.
+    :return: Context manager yielding the database alias.
+    """
+
+    with use_user(user_id):
+        using = current()
+        with transaction.atomic(using=using):
+            yield using
+
+
+def reserve_ids(alias: str) -> None:
+    """
+    Points the ID sequences of the tasks and tags of a shard at the shard's block of IDs, past the largest ID of the
+    block in use.
+
+    Runs after migrating a shard and after copying rows to it: SQLite continues its AUTOINCREMENT after the largest
+    ID ever inserted, including the IDs of copied rows from the blocks of other shards.
+
+    :param alias: A shard of TASK_SHARDS.
+    """
+
+    low = aliases().index(alias) * ID_BLOCK
+    connection = connections[alias]
+    with connection.cursor() as cursor:
+        for model in (Task, TagTask):
+            table = model._meta.db_table
+            cursor.execute(f"SELECT MAX(id) FROM {table} WHERE id > %s AND id <= %s", [low, low + ID_BLOCK])
+            top = cursor.fetchone()[0] or low
+            if connection.vendor == "postgresql":
+                cursor.execute("SELECT setval(pg_get_serial_sequence(%s, 'id'), %s, false)", [table, top + 1])
+            elif connection.vendor == "sqlite":
+                cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [top, table])
+                if not cursor.rowcount:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, top])
+            else:
+                raise NotImplementedError(f"ID blocks are not implemented for {connection.vendor}.")
+
+
+def _upsert(model, rows: list, using: str) -> None:
+    """
+    Inserts or overwrites rows by primary key, keeping their `updated_at` stamps (the validators of the pages).
+    """
+
+    if not rows:
+        return
+    stamps = [row.updated_at for row in rows]
+    fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    model.objects.using(using).bulk_create(rows, update_conflicts=True, unique_fields=["id"], update_fields=fields)
+    # bulk_create stamps the auto_now field with the current time
+    for row, stamp in zip(rows, stamps):
+        row.updated_at = stamp
+    model.objects.using(using).bulk_update(rows, ["updated_at"])
+
+
+def _copy_changes(user_id: int, source: str, target: str, cursor: int) -> tuple:
+    """
+    Copies the changes of a user's data made after sequence number `cursor` from one shard to another.
+
+    Tags and tasks changed after the cursor are upserted (rows changed again while copying are copied again by the
+    next pass); the deletions of the tombstones up to the last committed number are applied and the tombstones copied.
+    A task lives in one tier (see `tasks.archive`): a task copied as archived replaces its copy in `Task` and the
+    other way round. The archived tasks are read last, so a task archived while this pass reads is copied archived.
+
+    :return: tuple (the new cursor, number of rows copied or deleted).
+    """
+
+    snapshot = (SyncSequence.objects.using(source).filter(user_id=user_id)
+                .values_list("last_seq", flat=True).first()) or 0
+    tags = list(TagTask.objects.using(source).filter(user_id=user_id, seq__gt=cursor))
+    tasks = list(Task.objects.using(source).filter(user_id=user_id, seq__gt=cursor))
+    archived = list(ArchivedTask.objects.using(source).filter(user_id=user_id, seq__gt=cursor))
+    tombstones = list(Tombstone.objects.using(source).filter(user_id=user_id, seq__gt=cursor, seq__lte=snapshot))
+
+    with transaction.atomic(using=target):
+        _upsert(TagTask, tags, target)
+        _upsert(Task, tasks, target)
+        ArchivedTask.objects.using(target).filter(pk__in=[task.id for task in tasks]).delete()
+        _upsert(ArchivedTask, archived, target)
+        Task.objects.using(target).filter(pk__in=[task.id for task in archived]).delete()
+        for kind, models in ((Tombstone.TASK, (Task, ArchivedTask)), (Tombstone.TAG, (TagTask,))):
+            gone = [tombstone.object_id for tombstone in tombstones if tombstone.kind == kind]
+            if gone:
+                for model in models:
+                    model.objects.using(target).filter(pk__in=gone).delete()
+        for tombstone in tombstones:
+            # tombstone IDs are not unique across shards
+            tombstone.pk = None
+        Tombstone.objects.using(target).bulk_create(tombstones)
+        reserve_ids(target)
+    return snapshot, len(tags) + len(tasks) + len(archived) + len(tombstones)
+
+
+def move_user(user_id: int, target: str, max_passes: int = 10, threshold: int = 100) -> dict:
+    """
+    Moves a user's data to another shard while they keep using the app.
+
+    The rows are copied in passes of the changes since the previous pass (by the user's change sequence, see
+    `tasks.sync`) until a pass copies at most `threshold` rows. The last pass runs with the user's sequence row on the
+    old shard locked, which waits for their writes in flight and holds back new ones; their placement is then
+    switched and the sequence row marked as moved, so the held-back writes fail with ShardMoved (and are retried on
+    the new shard) instead of landing on the old one. Finally the rows are deleted from the old shard.
+
+    Reads in flight may still see the old shard until they finish.
+
+    :param user_id: The ID of the user to move.
+    :param target: The alias of the shard to move to.
+    :param max_passes: Passes to copy before the locked one, however many rows the last of them copied.
+    :param threshold: Rows copied by a pass below which the locked pass follows.
+    :return: dict with the source and target shards, the number of passes and the rows copied.
+    """
+
+    source = database(user_id)
+    if source == target:
+        return {"source": source, "target": target, "passes": 0, "rows": 0}
+
+    cursor, rows, passes = -1, 0, 0
+    while passes < max_passes:
+        cursor, copied = _copy_changes(user_id, source, target, cursor)
+        rows, passes = rows + copied, passes + 1
+        if copied <= threshold:
+            break
+
+    with transaction.atomic(using=source):
+        sequence = SyncSequence.objects.using(source).select_for_update().filter(user_id=user_id).first()
+        _, copied = _copy_changes(user_id, source, target, cursor)
+        rows, passes = rows + copied, passes + 1
+        with transaction.atomic(using=target):
+            SyncSequence.objects.using(target).update_or_create(user_id=user_id, defaults={
+                "last_seq": sequence.last_seq if sequence else 0,
+                "pruned_seq": sequence.pruned_seq if sequence else 0,
+                "moved_to": None,
+            })
+            counter = TaskCounter.objects.using(source).filter(user_id=user_id).first()
+            if counter is not None:
+                _upsert_counter(counter, target)
+        ShardPlacement.objects.using(DIRECTORY).update_or_create(
+            user_id=user_id, defaults={"shard": target, "moved_at": timezone.now()})
+        SyncSequence.objects.using(source).update_or_create(user_id=user_id, defaults={"moved_to": target})
+
+    with transaction.atomic(using=source):
+        _delete_data(user_id, source, keep_sequence=True)
+    return {"source": source, "target": target, "passes": passes, "rows": rows}
+
+
+def _upsert_counter(counter: TaskCounter, using: str) -> None:
+    TaskCounter.objects.using(using).update_or_create(user_id=counter.user_id, defaults={
+        field.name: getattr(counter, field.name) for field in TaskCounter._meta.concrete_fields
+        if field.name not in ("user", "updated_at")
+    })
+
+
+def _delete_data(user_id: int, using: str, keep_sequence: bool = False) -> None:
+    """
+    Deletes a user's data from a shard; the sequence row of a moved user stays as the marker of the move.
+    """
+
+    Task.objects.using(using).filter(user_id=user_id).delete()
+    ArchivedTask.objects.using(using).filter(user_id=user_id).delete()
+    TagTask.objects.using(using).filter(user_id=user_id).delete()
+    Tombstone.objects.using(using).filter(user_id=user_id).delete()
+    TaskCounter.objects.using(using).filter(user_id=user_id).delete()
+    if not keep_sequence:
+        SyncSequence.objects.using(using).filter(user_id=user_id).delete()
+
+
+def place_new_user(sender, instance, created: bool, raw: bool = False, **kwargs) -> None:
+    """
+    `post_save` handler of the users: places a new user on their shard of the hash ring right away, so their first
+    page only looks the placement up (see `database`).
+    """
+
+    if created and not raw and aliases():
+        ShardPlacement.objects.using(DIRECTORY).get_or_create(user_id=instance.pk,
+                                                              defaults={"shard": ring().shard(instance.pk)})
+
+
+def delete_user_data(sender, instance, using: str, **kwargs) -> None:
+    """
+    `pre_delete` handler of the users: deletes a user's data from their shard, which the cascade of the deletion on
+    the default database does not reach.
+    """
+
+    if not aliases():
+        return
+    shard = ShardPlacement.objects.using(DIRECTORY).filter(user_id=instance.pk).values_list("shard", flat=True).first()
+    if shard is not None and shard != using:
+        with transaction.atomic(using=shard):
+            _delete_data(instance.pk, shard)
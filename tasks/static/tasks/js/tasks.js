@@ -0,0 +1,208 @@
+// Progressive enhancement of the task lists: toggles, deletes and title edits go through the JSON endpoints
+// and patch the page in place instead of submitting a form and reloading the whole list.
+// Without JavaScript (or if a request fails) the plain forms and links keep working.
+// Changes made in other tabs and devices arrive over the live event stream (Server-Sent Events) and are
+// patched in the same way; changes a tab cannot apply in place show a notice offering a refresh.
+
+(function () {
+    // Tasks toggled or deleted by this tab: their events come back over the stream and are already applied.
+    const ownChanges = new Set();
+
+    function csrfToken() {
+        const input = document.querySelector('input[name="csrfmiddlewaretoken"]');
+        return input ? input.value : '';
+    }
+
+    function post(url, data) {
+        return fetch(url, {
+            method: 'POST',
+            headers: {'X-CSRFToken': csrfToken(), 'X-Requested-With': 'XMLHttpRequest'},
+            body: new URLSearchParams(data || {}),
+            credentials: 'same-origin',
+        }).then(function (response) {
+            if (!response.ok) {
+                throw new Error(response.status);
+            }
+            return response.json();
+        });
+    }
+
+    function updateCounters(counters) {
+        document.querySelectorAll('[data-counter]').forEach(function (element) {
+            const value = counters[element.dataset.counter];
+            if (value !== undefined) {
+                element.textContent = value;
+            }
+        });
+    }
+
+    function removeCard(taskId) {
+        const card = document.querySelector('.custom-card-link[data-task-id="' + taskId + '"]');
+        if (!card) {
+            return;
+        }
+        card.remove();
+        const amount = document.querySelector('[data-amount]');
+        if (amount) {
+            amount.textContent = Math.max(0, parseInt(amount.textContent, 10) - 1) + ' ';
+        }
+    }
+
+    // A toggled task leaves the list it is shown in (open <-> completed).
+    function onToggle(event) {
+        const checkbox = event.target;
+        const card = checkbox.closest('.custom-card-link');
+        ownChanges.add(card.dataset.taskId);
+        post(checkbox.dataset.toggleUrl).then(function (data) {
+            updateCounters(data.counters);
+            removeCard(card.dataset.taskId);
+        }).catch(function () {
+            checkbox.form.submit();
+        });
+    }
+
+    function onDelete(event) {
+        const link = event.currentTarget;
+        event.preventDefault();
+        ownChanges.add(link.dataset.taskId);
+        post(link.dataset.deleteUrl).then(function (data) {
+            updateCounters(data.counters);
+            removeCard(link.dataset.taskId);
+            const form = link.closest('form');
+            if (form) {
+                form.hidden = true;
+            }
+        }).catch(function () {
+            window.location.href = link.href;
+        });
+    }
+
+    // Double-clicking a title turns it into an input; Enter or leaving the field saves it, Escape cancels.
+    function onEditTitle(event) {
+        const label = event.currentTarget;
+        event.preventDefault();
+        if (label.querySelector('input')) {
+            return;
+        }
+
+        const original = label.textContent.trim();
+        const input = document.createElement('input');
+        input.type = 'text';
+        input.className = 'form-control';
+        input.value = original;
+        label.textContent = '';
+        label.appendChild(input);
+        input.focus();
+
+        let done = false;
+        function finish(save) {
+            if (done) {
+                return;
+            }
+            done = true;
+            const title = input.value.trim();
+            label.textContent = save && title ? title : original;
+            if (!save || !title || title === original) {
+                return;
+            }
+            post(label.dataset.titleUrl, {title: title}).catch(function () {
+                label.textContent = original;
+            });
+        }
+
+        input.addEventListener('click', function (e) { e.preventDefault(); e.stopPropagation(); });
+        input.addEventListener('keydown', function (e) {
+            if (e.key === 'Enter') {
+                e.preventDefault();
+                finish(true);
+            } else if (e.key === 'Escape') {
+                finish(false);
+            }
+        });
+        input.addEventListener('blur', function () { finish(true); });
+    }
+
+    function markStale() {
+        if (document.querySelector('[data-stale-notice]')) {
+            return;
+        }
+        const notice = document.createElement('div');
+        notice.className = 'alert alert-info';
+        notice.setAttribute('role', 'status');
+        notice.dataset.staleNotice = '';
+        notice.textContent = 'This list was changed elsewhere. ';
+        const link = document.createElement('a');
+        link.href = window.location.href;
+        link.textContent = 'Refresh';
+        notice.appendChild(link);
+        document.body.prepend(notice);
+    }
+
+    function card(taskId) {
+        return document.querySelector('.custom-card-link[data-task-id="' + taskId + '"]');
+    }
+
+    // A toggled or deleted task leaves the list; a toggled one that is not shown may now belong to it.
+    function onRemoved(taskIds, toggled) {
+        taskIds.forEach(function (taskId) {
+            taskId = String(taskId);
+            if (ownChanges.delete(taskId)) {
+                return;
+            }
+            if (card(taskId)) {
+                removeCard(taskId);
+            } else if (toggled) {
+                markStale();
+            }
+        });
+    }
+
+    function onEdited(task) {
+        const shown = card(task.id);
+        const label = shown && shown.querySelector('[data-title-url]');
+        if (label && !label.querySelector('input')) {
+            label.textContent = task.title;
+        }
+        // an edit through the full form may also move the task to another list
+        if (task.completed !== undefined) {
+            markStale();
+        }
+    }
+
+    function listen(url) {
+        const source = new EventSource(url);
+        function on(type, handler) {
+            source.addEventListener(type, function (event) {
+                const data = JSON.parse(event.data);
+                if (data.counters) {
+                    updateCounters(data.counters);
+                }
+                if (handler) {
+                    handler(data);
+                }
+            });
+        }
+        on('counters');
+        on('toggled', function (data) { onRemoved(data.tasks.map(function (task) { return task.id; }), true); });
+        on('deleted', function (data) { onRemoved(data.ids, false); });
+        on('edited', function (data) { onEdited(data.task); });
+        on('created', markStale);
+        on('changed', markStale);
+    }
+
+    document.addEventListener('DOMContentLoaded', function () {
+        document.querySelectorAll('[data-toggle-url]').forEach(function (checkbox) {
+            checkbox.onchange = null;
+            checkbox.addEventListener('change', onToggle);
+        });
+        document.querySelectorAll('[data-delete-url]').forEach(function (link) {
+            link.addEventListener('click', onDelete);
+        });
+        document.querySelectorAll('[data-title-url]').forEach(function (label) {
+            label.addEventListener('dblclick', onEditTitle);
+        });
+        if (window.EventSource && document.body.dataset.eventsUrl) {
+            listen(document.body.dataset.eventsUrl);
+        }
+    });
+})();
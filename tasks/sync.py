@@ -0,0 +1,376 @@
+import datetime
+from typing import Optional
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Max, Model
+from django.utils import timezone
+
+from . import archive, counters, events, metrics, page_cache, shards
+from .models import Task, ArchivedTask, TagTask, SyncSequence, Tombstone
+
+TASK_FIELDS = ("title", "description", "date", "completed")
+TAG_FIELDS = ("tag_name",)
+
+# Rows per kind in one page of changes, and entries in one uploaded batch.
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+MAX_BATCH = 500
+
+
+class CursorExpired(Exception):
+    """
+    The cursor is older than the pruned tombstones (or newer than the sequence): the client has to sync from scratch.
+    """
+
+
+class InvalidChanges(Exception):
+    """
+    An uploaded batch has invalid entries; nothing was applied.
+
+    Attributes:
+        errors (list): dicts with the kind, index and field errors of every invalid entry.
+    """
+
+    def __init__(self, errors: list):
+        super().__init__(f"{len(errors)} invalid entries")
+        self.errors = errors
+
+
+def next_seq(user_id: int) -> int:
+    """
+    Takes the next number of a user's change sequence with a single upsert.
+
+    Must be called inside the transaction of the write: the sequence row stays locked until it commits, so the writes
+    of a user commit in the order of their numbers.
+
+    :param user_id: The ID of the user whose data is written.
+    :return: int, the sequence number of the write.
+    :raises shards.ShardMoved: if the user's data was moved to another shard meanwhile; the write must be rolled back.
+    """
+
+    table = SyncSequence._meta.db_table
+    with connections[router.db_for_write(SyncSequence)].cursor() as cursor:
+        cursor.execute(
+            f"INSERT INTO {table} (user_id, last_seq, pruned_seq) VALUES (%s, 1, 0) "
+            f"ON CONFLICT (user_id) DO UPDATE SET last_seq = {table}.last_seq + 1 "
+            f"RETURNING last_seq, moved_to",
+            [user_id],
+        )
+        seq, moved_to = cursor.fetchone()
+    if moved_to:
+        raise shards.ShardMoved(f"The data of user {user_id} moved to {moved_to}.")
+    return seq
+
+
+def record_deletions(user_id: int, kind: str, ids, seq: int) -> None:
+    """
+    Stores the tombstones of deleted rows, in the transaction of the deletion.
+
+    :param user_id: The owner of the rows.
+    :param kind: Tombstone.TASK or Tombstone.TAG.
+    :param ids: The IDs of the deleted rows.
+    :param seq: The sequence number of the deletion.
+    """
+
+    Tombstone.objects.bulk_create(Tombstone(user_id=user_id, kind=kind, object_id=object_id, seq=seq)
+                                  for object_id in ids)
+
+
+def task_json(task: dict) -> dict:
+    return {
+        "id": task["id"],
+        "seq": task["seq"],
+        "title": task["title"],
+        "description": task["description"],
+        "date": task["date"],
+        "completed": task["completed"],
+        "tag": task["tag_id"],
+        "updated_at": task["updated_at"],
+    }
+
+
+def tag_json(tag: dict) -> dict:
+    return {"id": tag["id"], "seq": tag["seq"], "tag_name": tag["tag_name"], "updated_at": tag["updated_at"]}
+
+
+def _sources(user_id: int, cursor: int) -> dict:
+    sources = {
+        "tasks": Task.objects.filter(user_id=user_id).values(
+            "id", "seq", "title", "description", "date", "completed", "tag_id", "updated_at"),
+        # archived tasks are sent as completed tasks
+        "archived": ArchivedTask.objects.filter(user_id=user_id).values(
+            "id", "seq", "title", "description", "payload", "date", "tag_id", "updated_at"),
+        "tags": TagTask.objects.filter(user_id=user_id).values("id", "seq", "tag_name", "updated_at"),
+    }
+    if cursor:
+        # a first sync only needs the rows that exist
+        sources["deleted"] = Tombstone.objects.filter(user_id=user_id).values("kind", "object_id", "seq")
+    return sources
+
+
+def changes_since(user_id: int, cursor: int = 0, limit: int = DEFAULT_LIMIT) -> dict:
+    """
+    Returns the tasks, tags and deletions of a user changed after a cursor, oldest first.
+
+    Every kind is read with one `seq > cursor` range scan of at most `limit + 1` rows. The page ends before the first
+    sequence number one of the kinds had no room for, so a write is never split across pages, except a single write
+    changing more than `limit` rows (a bulk action), which is sent whole.
+
+    :param user_id: The ID of the user.
+    :param cursor: The `cursor` of the previous page; 0 for the first sync.
+    :param limit: The maximum number of rows per kind.
+    :return: dict with the next cursor, whether more pages follow, the changed tasks and tags and the deleted IDs.
+    :raises CursorExpired: if the cursor is not valid anymore.
+    """
+
+    last_seq, pruned_seq = (SyncSequence.objects.filter(user_id=user_id).values_list("last_seq", "pruned_seq")
+                            .first() or (0, 0))
+    if cursor and (cursor < pruned_seq or cursor > last_seq):
+        raise CursorExpired(f"Cursor {cursor} expired; sync again from cursor 0.")
+
+    # rows written outside the services keep seq 0 and are only part of a first sync
+    low = cursor if cursor else -1
+    sources = _sources(user_id, cursor)
+    rows = {name: list(queryset.filter(seq__gt=low, seq__lte=last_seq).order_by("seq")[:limit + 1])
+            for name, queryset in sources.items()}
+    next_cursor, more = last_seq, False
+
+    truncated = [found[limit]["seq"] for found in rows.values() if len(found) > limit]
+    if truncated:
+        end = min(truncated)
+        rows = {name: [row for row in found if row["seq"] < end] for name, found in rows.items()}
+        if any(rows.values()):
+            next_cursor, more = end - 1, True
+        else:
+            # one write changed more than `limit` rows
+            rows = {name: list(queryset.filter(seq=end)) for name, queryset in sources.items()}
+            next_cursor, more = end, end < last_seq
+
+    deleted = rows.get("deleted", [])
+    return {
+        "cursor": next_cursor,
+        "more": more,
+        "tasks": ([task_json(task) for task in rows["tasks"]]
+                  + [task_json(archive.task_values(task)) for task in rows["archived"]]),
+        "tags": [tag_json(tag) for tag in rows["tags"]],
+        "deleted": {
+            "tasks": [row["object_id"] for row in deleted if row["kind"] == Tombstone.TASK],
+            "tags": [row["object_id"] for row in deleted if row["kind"] == Tombstone.TAG],
+        },
+    }
+
+
+def clean_fields(model: type[Model], entry: dict, fields: tuple, creating: bool) -> tuple:
+    """
+    Validates the fields of an uploaded entry with the model fields.
+
+    :return: tuple (dict of the cleaned values, dict of the errors per field).
+    """
+
+    values, errors = {}, {}
+    for name in fields:
+        field = model._meta.get_field(name)
+        if name not in entry and not creating:
+            continue
+        try:
+            values[name] = field.clean(entry.get(name, field.get_default()), None)
+        except ValidationError as error:
+            errors[name] = error.messages
+    return values, errors
+
+
+def _existing(model: type[Model], user, entries: list, owner: str) -> dict:
+    ids = [entry["id"] for entry in entries if isinstance(entry, dict) and isinstance(entry.get("id"), int)]
+    rows = model.objects.filter(**{owner: user}).in_bulk(ids) if ids else {}
+    if model is Task and set(ids) - set(rows) and archive.restore(user.id, set(ids) - set(rows)):
+        # archived tasks are moved back before they are changed (see `tasks.archive`)
+        rows = model.objects.filter(**{owner: user}).in_bulk(ids)
+    return rows
+
+
+def _plan(model: type[Model], user, entries: list, fields: tuple, owner: str, kind: str, errors: list,
+          conflicts: list) -> tuple:
+    """
+    Sorts the uploaded entries of one kind into rows to create, update and delete.
+
+    An entry with an `id` edits (or with `deleted` deletes) an existing row and must carry the `seq` of the row as
+    the client last saw it; a row changed or deleted since is reported in `conflicts` and left alone.
+
+    :return: tuple (list of the rows to create, list of the rows to update, list of the rows to delete); the rows to
+        create and update as (index in `entries`, row, entry) tuples.
+    """
+
+    existing = _existing(model, user, entries, owner)
+    created, updated, deleted = [], [], []
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict) or ("id" in entry and not isinstance(entry["id"], int)):
+            errors.append({"kind": kind, "index": index, "errors": {"id": ["Enter a whole number."]}})
+            continue
+
+        if "id" not in entry:
+            values, field_errors = clean_fields(model, entry, fields, creating=True)
+            if field_errors:
+                errors.append({"kind": kind, "index": index, "errors": field_errors})
+            else:
+                created.append((index, model(**{owner: user}, **values), entry))
+            continue
+
+        row = existing.get(entry["id"])
+        if row is None or row.seq != entry.get("seq"):
+            conflicts.append({"kind": kind, "id": entry["id"], "seq": row.seq if row else None})
+            continue
+        if entry.get("deleted"):
+            deleted.append(row)
+            continue
+        values, field_errors = clean_fields(model, entry, fields, creating=False)
+        if field_errors:
+            errors.append({"kind": kind, "index": index, "errors": field_errors})
+            continue
+        for name, value in values.items():
+            setattr(row, name, value)
+        updated.append((index, row, entry))
+    return created, updated, deleted
+
+
+def _ref(index: int, entry: dict) -> str:
+    return str(entry.get("ref", index))
+
+
+def _resolve_tags(user, tasks: list, tag_refs: dict, deleted_tags: set, errors: list) -> None:
+    """
+    Points the created and updated tasks at their tags: an existing tag ID or the `ref` of a tag created in the same
+    batch.
+    """
+
+    tag_ids = {entry["tag"] for _, _, entry in tasks if isinstance(entry.get("tag"), int)}
+    own_tags = set(TagTask.objects.filter(user_id=user, pk__in=tag_ids).values_list("id", flat=True)) - deleted_tags
+    for index, task, entry in tasks:
+        if "tag" not in entry:
+            continue
+        tag = entry["tag"]
+        if tag is None:
+            task.tag = None
+        elif isinstance(tag, int) and tag in own_tags:
+            task.tag_id = tag
+        elif isinstance(tag, str) and tag in tag_refs:
+            task.tag = tag_refs[tag]
+        else:
+            errors.append({"kind": "task", "index": index, "errors": {"tag": ["Unknown tag."]}})
+
+
+def _check_tag_names(user, tags: list, errors: list) -> None:
+    """
+    Reports the created and renamed tags whose names another tag of the user already has, in the batch or as the
+    user's tags stand before it (tag names are unique per user, and the batch creates and updates its rows before
+    it deletes any, so a name is only free again in the next batch).
+    """
+
+    names = {}
+    for index, tag, _ in tags:
+        if tag.tag_name in names:
+            errors.append({"kind": "tag", "index": index, "errors": {"tag_name": ["Duplicate tag name."]}})
+        names.setdefault(tag.tag_name, (index, tag.id))
+    for tag_name, tag_id in TagTask.objects.filter(user_id=user, tag_name__in=names).values_list("tag_name", "id"):
+        index, own_id = names[tag_name]
+        if tag_id != own_id:
+            errors.append({"kind": "tag", "index": index, "errors": {"tag_name": ["Duplicate tag name."]}})
+
+
+def apply_changes(user, tags: list, tasks: list) -> dict:
+    """
+    Applies a batch of tag and task upserts and deletions uploaded by a sync client.
+
+    The batch is applied in one transaction under one sequence number with a constant number of statements
+    (bulk_create / bulk_update / delete per kind), then the counters are rebuilt once. Entries conflicting with newer
+    server changes are skipped and returned; the client pulls the server's version with its next sync.
+
+    :param user: The owner of the data.
+    :param tags: The uploaded tag entries.
+    :param tasks: The uploaded task entries; `tag` is a tag ID, the `ref` of a tag of the batch or None.
+    :return: dict with the sequence number of the batch, the IDs of the created rows by `ref` and the conflicts.
+    :raises InvalidChanges: if any entry is invalid; nothing is applied then.
+    """
+
+    errors, conflicts = [], []
+    now = timezone.now()
+    with shards.atomic(user.id):
+        seq = next_seq(user.id)
+        new_tags, changed_tags, gone_tags = _plan(TagTask, user, tags, TAG_FIELDS, "user_id", "tag", errors,
+                                                  conflicts)
+        new_tasks, changed_tasks, gone_tasks = _plan(Task, user, tasks, TASK_FIELDS, "user", "task", errors,
+                                                     conflicts)
+        if new_tags or changed_tags:
+            _check_tag_names(user, new_tags + changed_tags, errors)
+        tag_refs = {_ref(index, entry): tag for index, tag, entry in new_tags}
+        _resolve_tags(user, new_tasks + changed_tasks, tag_refs, {tag.id for tag in gone_tags}, errors)
+        if errors:
+            raise InvalidChanges(errors)
+
+        for _, row, _ in new_tags + new_tasks:
+            row.seq = seq
+        for _, row, _ in changed_tags + changed_tasks:
+            row.seq, row.updated_at = seq, now
+        TagTask.objects.bulk_create([tag for _, tag, _ in new_tags])
+        TagTask.objects.bulk_update([tag for _, tag, _ in changed_tags], [*TAG_FIELDS, "seq", "updated_at"])
+        Task.objects.bulk_create([task for _, task, _ in new_tasks])
+        Task.objects.bulk_update([task for _, task, _ in changed_tasks], [*TASK_FIELDS, "tag", "seq", "updated_at"])
+
+        # deleting a tag deletes its tasks
+        gone_task_ids = {task.id for task in gone_tasks}
+        if gone_tags:
+            gone_task_ids.update(Task.objects.filter(tag__in=gone_tags).values_list("id", flat=True))
+            gone_task_ids.update(ArchivedTask.objects.filter(tag__in=gone_tags).values_list("id", flat=True))
+        if gone_task_ids:
+            Task.objects.filter(pk__in=gone_task_ids).delete()
+            record_deletions(user.id, Tombstone.TASK, sorted(gone_task_ids), seq)
+        if gone_tags:
+            TagTask.objects.filter(pk__in=[tag.id for tag in gone_tags]).delete()
+            record_deletions(user.id, Tombstone.TAG, [tag.id for tag in gone_tags], seq)
+
+        if new_tags or changed_tags or gone_tags or new_tasks or changed_tasks or gone_task_ids:
+            counter = counters.rebuild(user.id)
+            page_cache.bump_version(user.id)
+            events.publish(user.id, "changed", counter)
+
+    metrics.TASKS_CREATED.inc(len(new_tasks))
+    metrics.TASKS_DELETED.inc(len(gone_task_ids))
+    return {
+        "seq": seq,
+        "refs": {
+            "tags": {_ref(index, entry): tag.id for index, tag, entry in new_tags},
+            "tasks": {_ref(index, entry): task.id for index, task, entry in new_tasks},
+        },
+        "conflicts": conflicts,
+    }
+
+
+def prune_tombstones(before: datetime.datetime) -> int:
+    """
+    Deletes the tombstones older than `before` and remembers per user up to which sequence number they are gone, so
+    clients with an older cursor are told to sync from scratch. With sharding it prunes the selected shard; the
+    `prune_tombstones` command runs it on every shard.
+
+    :param before: Tombstones of deletions before this moment are pruned.
+    :return: The number of pruned tombstones.
+    """
+
+    expired = Tombstone.objects.filter(deleted_at__lt=before)
+    with transaction.atomic(using=router.db_for_write(Tombstone)):
+        for user_id, seq in expired.values("user_id").annotate(seq=Max("seq")).values_list("user_id", "seq"):
+            SyncSequence.objects.filter(user_id=user_id, pruned_seq__lt=seq).update(pruned_seq=seq)
+        pruned, _ = expired.delete()
+    return pruned
+
+
+def parse_cursor(value: Optional[str]) -> int:
+    """
+    Parses the `cursor` query parameter.
+
+    :raises ValueError: if it is not a non-negative integer.
+    """
+
+    cursor = int(value or 0)
+    if cursor < 0:
+        raise ValueError(value)
+    return cursor
@@ -1,5 +1,38 @@
-from django.test import TestCase
-from .models import Task
+import asyncio
+import copy
+import csv
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from unittest import mock, skipUnless
+
+from asgiref.sync import sync_to_async
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command, CommandError
+from django.core.cache import caches
+from django.db import IntegrityError, OperationalError, connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from ToDoList.database import connection_settings
+
+from . import (archive, async_views, counters, events, export, importer, metrics, page_cache, routers, services, shards,
+               sync)
+from .middleware import QueryBudgetExceeded
+from .pagination import encode_cursor, page_ranges
+from .search import get_backend, search_tasks
+from .search.sqlite import SQLiteSearchBackend
+from .models import Task, ArchivedTask, TagTask, TaskCounter, SyncSequence, Tombstone, ShardPlacement
 
 
 class TaskModelTest(TestCase):
@@ -9,3 +42,1440 @@ class TaskModelTest(TestCase):
     def test_task_creation(self):
         task = Task.objects.get(title="Test Task")
         self.assertEqual(task.description, "Just a test task")
+
+
+@override_settings(TASK_PAGE_CACHE=None)
+class ViewQueryCountTest(TestCase):
+    """
+    Pins the number of queries issued by every list and detail view when it is rendered (page cache disabled).
+
+    Each page costs: session, user, the counters row, the first tags, the task list and the tag choices of the form
+    (plus the ETag validator and the tag choices of the bulk action bar on list pages and the task / tag lookups of
+    the detail pages). The completed list reads the archived tasks too, and the lists that may hold tasks without a
+    date read them with a second query when the dated ones do not fill the page (all but the today / overdue lists).
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tag = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        today = datetime.date.today()
+        for days in (-2, 0, 3):
+            Task.objects.create(user=self.user, title=f"Task {days}", tag=self.tag,
+                                date=today + datetime.timedelta(days=days))
+        self.task = Task.objects.create(user=self.user, title="Done", tag=self.tag, completed=True)
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def assertPageQueries(self, num: int, url: str):
+        with self.assertNumQueries(num):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_list_views(self):
+        for name in ('overdue-tasks', 'today-tasks'):
+            with self.subTest(name=name):
+                self.assertPageQueries(8, reverse(name))
+        self.assertPageQueries(9, reverse('all-tasks'))
+        self.assertPageQueries(11, reverse('completed-tasks'))
+        # searches count their matches instead of reading the counters row
+        self.assertPageQueries(9, reverse('all-tasks') + '?search=Task')
+        self.assertPageQueries(10, reverse('fiter-by-tag', args=[self.tag.id]))
+        self.assertPageQueries(5, reverse('all-tags'))
+
+    def test_detail_views(self):
+        for name in ('overdue-task-detail', 'today-task-detail'):
+            with self.subTest(name=name):
+                self.assertPageQueries(7, reverse(name, args=[self.task.id]))
+        self.assertPageQueries(8, reverse('all-task-detail', args=[self.task.id]))
+        self.assertPageQueries(10, reverse('completed-task-detail', args=[self.task.id]))
+        self.assertPageQueries(9, reverse('tag-filter-task', args=[self.tag.id, self.task.id]))
+        self.assertPageQueries(5, reverse('tag-detail', args=[self.tag.id]))
+
+    def test_counters(self):
+        response = self.client.get(reverse('all-tasks'))
+        counter = response.context["counter"]
+        self.assertEqual(counter.open_count, 3)
+        self.assertEqual(counter.completed_count, 1)
+        self.assertEqual(counter.today_count, 1)
+        self.assertEqual(counter.overdue_count, 1)
+        self.assertEqual(counter.tag_open_count(self.tag.id), 3)
+        self.assertEqual(response.context["amount"], 3)
+
+
+class TaskCounterTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tag = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        self.client.force_login(self.user)
+
+    def assertConsistent(self):
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_writes_keep_counters_consistent(self):
+        today = datetime.date.today()
+        self.client.post(reverse('all-tasks'), {"title": "New", "tag": self.tag.id, "date": today})
+        self.client.post(reverse('today-tasks'), {"title": "Old", "date": today - datetime.timedelta(days=1)})
+        self.assertConsistent()
+        self.assertEqual(TaskCounter.objects.get(user=self.user).today_count, 1)
+
+        new, old = Task.objects.get(title="New"), Task.objects.get(title="Old")
+        self.client.post(reverse('toggle-task', args=[new.id]))
+        self.assertConsistent()
+        self.client.post(reverse('all-task-detail', args=[old.id]), {"title": "Old", "tag": self.tag.id, "date": today})
+        self.assertConsistent()
+        self.client.get(reverse('delete-all-task', args=[new.id]))
+        self.assertConsistent()
+        self.client.get(reverse('delete-tag', args=[self.tag.id]))
+        self.assertConsistent()
+        self.assertEqual(TaskCounter.objects.get(user=self.user).open_count, 0)
+
+    def test_rollover_moves_today_into_overdue(self):
+        Task.objects.create(user=self.user, title="Task", date=datetime.date.today())
+        counters.rebuild(self.user.id)
+
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        self.assertEqual(counters.rollover(today=tomorrow), 1)
+        counter = TaskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.today_count, counter.overdue_count, counter.counted_on), (0, 1, tomorrow))
+
+    def test_tasks_with_a_time_of_day_are_due_today(self):
+        today = datetime.date.today()
+        afternoon = counters.day_start(today) + datetime.timedelta(hours=15)
+        services.save_task(Task(user=self.user, title="Call", date=afternoon))
+        self.assertConsistent()
+        counter = TaskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.today_count, counter.overdue_count), (1, 0))
+        response = self.client.get(reverse('today-tasks'))
+        self.assertEqual([task.title for task in response.context["content_to_unpack"]], ["Call"])
+        self.assertEqual(list(response.context["content_to_unpack"]),
+                         list(async_views._bucket_tasks(self.user, "today")))
+
+        self.assertEqual(counters.rollover(today=today + datetime.timedelta(days=1)), 1)
+        counter = TaskCounter.objects.get(user=self.user)
+        self.assertEqual((counter.today_count, counter.overdue_count), (0, 1))
+
+    def test_command_rebuilds_and_verifies(self):
+        Task.objects.create(user=self.user, title="Task", tag=self.tag)
+        call_command('task_counters', '--rebuild', stdout=io.StringIO())
+        call_command('task_counters', '--verify', stdout=io.StringIO())
+        Task.objects.create(user=self.user, title="Untracked")
+        with self.assertRaises(CommandError):
+            call_command('task_counters', '--verify', stdout=io.StringIO())
+
+
+class TaskIndexTest(TestCase):
+    def test_list_queries_use_indexes(self):
+        call_command('bench_indexes', tasks=2000, users=20, stdout=io.StringIO())
+
+
+@mock.patch('tasks.pagination.PAGE_SIZE', 3)
+class KeysetPaginationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        today = datetime.date.today()
+        for n, days in enumerate((2, 0, 0, 1, None, 0, 5, None)):
+            date = None if days is None else today + datetime.timedelta(days=days)
+            Task.objects.create(user=self.user, title=f"Task {n}", date=date, completed=n % 2 == 0)
+            Task.objects.create(user=self.user, title=f"Task {n}", date=date, completed=n % 2 == 1)
+        self.client.force_login(self.user)
+
+    def walk(self, url: str, expected: list):
+        pages, query = [], ""
+        while True:
+            page = self.client.get(f"{url}?{query}").context["page"]
+            pages.append([task.id for task in page])
+            if not page.has_next:
+                break
+            query = page.next_query
+        self.assertEqual(sum(pages, []), expected)
+
+        for ids in reversed(pages[:-1]):
+            page = self.client.get(f"{url}?{page.previous_query}").context["page"]
+            self.assertEqual([task.id for task in page], ids)
+        self.assertFalse(page.has_previous)
+
+    def test_pages_follow_date_then_id(self):
+        tasks = list(Task.objects.filter(user=self.user, completed=False))
+        ordered = sorted(tasks, key=lambda task: (task.date is None, task.date, task.id))
+        self.walk(reverse('all-tasks'), [task.id for task in ordered])
+
+    def test_completed_pages_are_newest_first(self):
+        tasks = list(Task.objects.filter(user=self.user, completed=True))
+        ordered = sorted(tasks, key=lambda task: (task.date is None, task.date, task.id), reverse=True)
+        self.walk(reverse('completed-tasks'), [task.id for task in ordered])
+
+    def test_malformed_cursor_shows_first_page(self):
+        response = self.client.get(reverse('all-tasks'), {"after": "not-a-cursor"})
+        self.assertFalse(response.context["page"].has_previous)
+        response = self.client.get(reverse('all-tasks'), {"after": encode_cursor(None, 10 ** 6)})
+        self.assertEqual(len(response.context["page"]), 0)
+
+    @skipUnless(connection.vendor == "sqlite", "reads SQLite query plans")
+    def test_deep_pages_seek_the_index_in_order(self):
+        cursor = (timezone.now(), 10 ** 6)
+        lists = {
+            "all": (Task.objects.filter(user=self.user, completed=False).rows(), False, "task_open_user_date_idx"),
+            "overdue": (Task.objects.filter(user=self.user, completed=False, date__lt=timezone.now()).rows(), True,
+                        "task_open_user_date_idx"),
+            "archived": (ArchivedTask.objects.filter(user=self.user), False, "archived_user_date_idx"),
+        }
+        for name, (queryset, dated, index) in lists.items():
+            for reverse_ in (False, True):
+                for rows_range in page_ranges(queryset, cursor, reverse_, dated):
+                    with self.subTest(name=name, reverse=reverse_):
+                        plan = rows_range.explain()
+                        self.assertIn(f"USING INDEX {index} (user_id=? AND date", plan)
+                        self.assertNotIn("TEMP B-TREE", plan)
+
+
+class TaskProjectionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tag = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        self.task = Task.objects.create(user=self.user, title="Task", description="x" * 10_000, tag=self.tag)
+        self.client.force_login(self.user)
+
+    def test_list_pages_leave_out_the_description(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('fiter-by-tag', args=[self.tag.id]))
+        self.assertContains(response, "Task")
+        tasks = [query["sql"] for query in queries if 'FROM "tasks_task"' in query["sql"]]
+        self.assertTrue(any('"title"' in sql for sql in tasks))
+        self.assertFalse(any('"description"' in sql for sql in tasks))
+
+    def test_rows_with_tag_read_the_tag_name_in_the_same_query(self):
+        with self.assertNumQueries(1):
+            task = Task.objects.filter(user=self.user).rows(with_tag=True).get()
+            self.assertEqual(task.tag.tag_name, "Work")
+        self.assertIn("description", task.get_deferred_fields())
+
+    def test_detail_saves_stamp_the_change(self):
+        task = Task.objects.detail().get(pk=self.task.id)
+        self.assertEqual(task.get_deferred_fields(), set())
+        updated_at = task.updated_at
+        services.save_task(task, counters.task_state(task))
+        self.assertGreater(Task.objects.get(pk=self.task.id).updated_at, updated_at)
+
+
+class SearchTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.report = Task.objects.create(user=self.user, title="Quarterly report", description="numbers")
+        self.email = Task.objects.create(user=self.user, title="Email", description="send the report to the team")
+        Task.objects.create(user=self.user, title="Groceries", description="milk")
+        self.client.force_login(self.user)
+
+    def search(self, query: str) -> list:
+        return list(search_tasks(Task.objects.filter(user=self.user), query))
+
+    @skipUnless(connection.vendor == "sqlite", "the default backend is picked by database vendor")
+    @override_settings(TASK_SEARCH_BACKEND=None)
+    def test_sqlite_backend_is_the_default_stand_in(self):
+        self.assertIsInstance(get_backend(), SQLiteSearchBackend)
+
+    def test_title_matches_rank_first_and_prefixes_match(self):
+        self.assertEqual(self.search("report"), [self.report, self.email])
+        self.assertEqual(self.search("quart"), [self.report])
+        self.assertEqual(self.search("'*\""), [])
+
+    def test_index_follows_writes(self):
+        self.report.title = "Annual summary"
+        self.report.save()
+        self.email.delete()
+        self.assertEqual(self.search("report"), [])
+        self.assertEqual(self.search("annual"), [self.report])
+
+    def test_all_tasks_view_searches(self):
+        response = self.client.get(reverse('all-tasks'), {"search": "report"})
+        self.assertEqual(response.context["amount"], 2)
+        self.assertEqual(list(response.context["page"]), [self.report, self.email])
+
+
+class ToggleTaskTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tasks = [Task.objects.create(user=self.user, title=f"Task {n}") for n in range(3)]
+        self.other = Task.objects.create(user=User.objects.create_user(username="other"), title="Other")
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def test_single_statement_without_read(self):
+        with CaptureQueriesContext(connection) as queries:
+            toggled = services.toggle_tasks(self.user, [self.tasks[0].id])
+        task_queries = [query["sql"] for query in queries if "tasks_task " in query["sql"]]
+        self.assertEqual(len(task_queries), 1)
+        self.assertTrue(task_queries[0].startswith("UPDATE"))
+        self.assertEqual(toggled, {self.tasks[0].id: True})
+        self.assertTrue(Task.objects.get(pk=self.tasks[0].id).completed)
+
+    def test_toggle_many_and_ignore_foreign_tasks(self):
+        response = self.client.post(reverse('toggle-tasks'),
+                                    {"task_id": [self.tasks[0].id, self.tasks[1].id, self.other.id]})
+        self.assertEqual(response.json(), {"tasks": {str(self.tasks[0].id): True, str(self.tasks[1].id): True}})
+        self.assertFalse(Task.objects.get(pk=self.other.id).completed)
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_redirects_to_next(self):
+        response = self.client.post(reverse('toggle-task', args=[self.tasks[0].id]), {"next": "/Completed"})
+        self.assertRedirects(response, reverse('completed-tasks'))
+        response = self.client.post(reverse('toggle-task', args=[self.tasks[0].id]), {"next": "https://evil.com/"})
+        self.assertEqual(response.json(), {"tasks": {str(self.tasks[0].id): False}})
+
+    def test_foreign_task_is_not_found(self):
+        response = self.client.post(reverse('toggle-task', args=[self.other.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class TaskApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.task = Task.objects.create(user=self.user, title="Task", date=datetime.date.today())
+        self.other = Task.objects.create(user=User.objects.create_user(username="other"), title="Other")
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def test_toggle_returns_state_and_counters(self):
+        response = self.client.post(reverse('api-toggle-task', args=[self.task.id]))
+        self.assertEqual(response.json()["task"], {"id": self.task.id, "completed": True})
+        self.assertEqual(response.json()["counters"],
+                         {"open": 0, "completed": 1, "today": 0, "overdue": 0, "tags": {}})
+
+    def test_delete(self):
+        response = self.client.post(reverse('api-delete-task', args=[self.task.id]))
+        self.assertEqual(response.json()["deleted"], self.task.id)
+        self.assertEqual(response.json()["counters"]["open"], 0)
+        self.assertFalse(Task.objects.filter(pk=self.task.id).exists())
+        self.assertEqual(self.client.post(reverse('api-delete-task', args=[self.other.id])).status_code, 404)
+
+    def test_edit_title(self):
+        response = self.client.post(reverse('api-edit-task-title', args=[self.task.id]), {"title": " Renamed "})
+        self.assertEqual(response.json()["task"], {"id": self.task.id, "title": "Renamed"})
+        self.assertEqual(Task.objects.get(pk=self.task.id).title, "Renamed")
+        response = self.client.post(reverse('api-edit-task-title', args=[self.task.id]), {"title": ""})
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(reverse('api-edit-task-title', args=[self.other.id]), {"title": "Mine"})
+        self.assertEqual(response.status_code, 404)
+
+    def test_get_is_not_allowed(self):
+        self.assertEqual(self.client.get(reverse('api-toggle-task', args=[self.task.id])).status_code, 405)
+
+
+class BulkActionTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.work = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        self.home = TagTask.objects.create(user_id=self.user, tag_name="Home")
+        yesterday = datetime.date.today() - datetime.timedelta(days=1)
+        self.overdue = [Task.objects.create(user=self.user, title=f"Late {n}", date=yesterday,
+                                            tag=self.work if n % 2 else self.home) for n in range(6)]
+        self.upcoming = Task.objects.create(user=self.user, title="Later", tag=self.work,
+                                            date=datetime.date.today() + datetime.timedelta(days=3))
+        self.other = Task.objects.create(user=User.objects.create_user(username="other"), title="Other",
+                                         date=yesterday)
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def bulk(self, **data):
+        return self.client.post(reverse('bulk-tasks'), data)
+
+    def test_complete_filter_expression(self):
+        response = self.bulk(action="complete", select_all=1, bucket="overdue", filter_tag=self.work.id)
+        self.assertEqual(response.json(), {"action": "complete", "affected": 3})
+        self.assertEqual(Task.objects.filter(user=self.user, completed=True).count(), 3)
+        self.assertFalse(Task.objects.get(pk=self.upcoming.id).completed)
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_delete_selected_ids_only_touches_own_tasks(self):
+        response = self.bulk(action="delete", task_id=[self.overdue[0].id, self.other.id])
+        self.assertEqual(response.json()["affected"], 1)
+        self.assertTrue(Task.objects.filter(pk=self.other.id).exists())
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_retag_and_reschedule(self):
+        ids = [task.id for task in self.overdue[:2]]
+        self.assertEqual(self.bulk(action="retag", task_id=ids, tag=self.home.id).json()["affected"], 2)
+        self.assertEqual(set(Task.objects.filter(id__in=ids).values_list("tag", flat=True)), {self.home.id})
+
+        self.assertEqual(self.bulk(action="reschedule", task_id=ids, days=1).json()["affected"], 2)
+        self.assertEqual(Task.objects.filter(user=self.user, completed=False, date=datetime.date.today()).count(), 2)
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.bulk(action="complete").status_code, 400)
+        self.assertEqual(self.bulk(action="complete", select_all=1).status_code, 400)
+        self.assertEqual(self.bulk(action="reschedule", task_id=[self.overdue[0].id]).status_code, 400)
+        other_tag = TagTask.objects.create(user_id=User.objects.get(username="other"), tag_name="Theirs")
+        self.assertEqual(self.bulk(action="retag", task_id=[self.overdue[0].id], tag=other_tag.id).status_code, 400)
+
+    def test_form_redirects_back_with_message(self):
+        response = self.bulk(action="complete", task_id=[self.overdue[0].id], next=reverse('overdue-tasks'))
+        self.assertRedirects(response, reverse('overdue-tasks'), fetch_redirect_response=False)
+        response = self.client.get(reverse('overdue-tasks'))
+        self.assertEqual([str(message) for message in response.context["messages"]], ["1 task(s) updated."])
+
+
+class TagFilterTest(TestCase):
+    """
+    The tag-filter pages carry the tag ID in their URLs; tag names are unique per user but shared across users.
+    """
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.other = User.objects.create_user(username="other")
+        self.work = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        self.their_work = TagTask.objects.create(user_id=self.other, tag_name="Work")
+        self.task = Task.objects.create(user=self.user, title="Mine", tag=self.work)
+        self.their_task = Task.objects.create(user=self.other, title="Theirs", tag=self.their_work)
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def test_delete_redirects_to_the_filtered_list_without_a_tag_lookup(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('delete-filtered-task', args=[self.work.id, self.task.id]))
+        self.assertRedirects(response, reverse('fiter-by-tag', args=[self.work.id]), fetch_redirect_response=False)
+        self.assertFalse(Task.objects.filter(pk=self.task.id).exists())
+        self.assertFalse(any("SELECT" in query["sql"] and "tasks_tagtask" in query["sql"] for query in queries))
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_delete_of_another_users_task_is_not_found(self):
+        response = self.client.get(reverse('delete-filtered-task', args=[self.their_work.id, self.their_task.id]))
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(Task.objects.filter(pk=self.their_task.id).exists())
+
+    def test_list_deletes_are_scoped_to_the_user(self):
+        for name in ('delete-all-task', 'delete-overdue-task', 'delete-today-task'):
+            with self.subTest(name=name):
+                self.assertEqual(self.client.get(reverse(name, args=[self.their_task.id])).status_code, 404)
+                self.assertEqual(self.client.get(reverse(name, args=[10 ** 6])).status_code, 404)
+        self.assertTrue(Task.objects.filter(pk=self.their_task.id).exists())
+        self.assertEqual(self.client.get(reverse('delete-tag', args=[self.their_work.id])).status_code, 404)
+        self.assertTrue(TagTask.objects.filter(pk=self.their_work.id).exists())
+
+        self.client.logout()
+        response = self.client.get(reverse('delete-all-task', args=[self.task.id]))
+        self.assertEqual(response.status_code, 302)
+        self.assertTrue(Task.objects.filter(pk=self.task.id).exists())
+
+    def test_toggle_returns_to_the_filtered_list(self):
+        url = reverse('fiter-by-tag', args=[self.work.id])
+        response = self.client.post(reverse('toggle-task', args=[self.task.id]), {"next": url})
+        self.assertRedirects(response, url, fetch_redirect_response=False)
+        self.assertTrue(Task.objects.get(pk=self.task.id).completed)
+
+    def test_another_users_tag_is_not_found(self):
+        self.assertEqual(self.client.get(reverse('fiter-by-tag', args=[self.their_work.id])).status_code, 404)
+        response = self.client.get(reverse('tag-filter-task', args=[self.their_work.id, self.task.id]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_tag_names_are_unique_per_user(self):
+        response = self.client.post(reverse('all-tags'), {"tag_name": "Work"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context["form"].errors, {"tag_name": ["You already have a tag with this name."]})
+        self.assertRedirects(self.client.post(reverse('tag-detail', args=[self.work.id]), {"tag_name": "Work"}),
+                             reverse('all-tags'), fetch_redirect_response=False)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            TagTask.objects.create(user_id=self.user, tag_name="Work")
+
+        with self.assertRaises(sync.InvalidChanges) as raised:
+            sync.apply_changes(self.user, [{"tag_name": "Home"}, {"tag_name": "Home"}, {"tag_name": "Work"}], [])
+        self.assertEqual([error["index"] for error in raised.exception.errors], [1, 2])
+        # renaming a tag to its own name is no conflict
+        self.work.refresh_from_db()
+        sync.apply_changes(self.user, [{"id": self.work.id, "seq": self.work.seq, "tag_name": "Work"}], [])
+
+
+class SyncApiTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.work = services.save_tag(TagTask(user_id=self.user, tag_name="Work"))
+        self.tasks = [services.save_task(Task(user=self.user, title=f"Task {n}", tag=self.work)) for n in range(3)]
+        self.other = services.save_task(Task(user=User.objects.create_user(username="other"), title="Other"))
+        self.client.force_login(self.user)
+
+    def changes(self, cursor: int = 0, **params) -> dict:
+        response = self.client.get(reverse('api-sync'), {"cursor": cursor, **params})
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def upload(self, **batch):
+        return self.client.post(reverse('api-sync'), json.dumps(batch), content_type="application/json")
+
+    def test_changes_since_cursor(self):
+        first = self.changes()
+        self.assertEqual([task["id"] for task in first["tasks"]], [task.id for task in self.tasks])
+        self.assertEqual([tag["tag_name"] for tag in first["tags"]], ["Work"])
+        self.assertFalse(first["more"])
+
+        services.toggle_tasks(self.user, [self.tasks[0].id])
+        deleted_id = self.tasks[1].id
+        services.delete_task(self.tasks[1])
+        changes = self.changes(first["cursor"])
+        self.assertEqual([(task["id"], task["completed"]) for task in changes["tasks"]], [(self.tasks[0].id, True)])
+        self.assertEqual(changes["deleted"], {"tasks": [deleted_id], "tags": []})
+        self.assertEqual(self.changes(changes["cursor"])["tasks"], [])
+
+    def test_pages_never_split_a_write(self):
+        cursor = self.changes()["cursor"]
+        services.rename_task(self.user, self.tasks[0].id, "Renamed")
+        services.bulk_update_tasks(self.user, Task.objects.filter(user=self.user), "complete")
+        services.rename_task(self.user, self.tasks[1].id, "Renamed")
+
+        pages = []
+        while not pages or pages[-1]["more"]:
+            pages.append(self.changes(pages[-1]["cursor"] if pages else cursor, limit=1))
+        # the rename of task 0 was overwritten by the bulk action, which completed all three tasks under one number:
+        # a page of one row still holds all of them
+        self.assertEqual([sorted(task["id"] for task in page["tasks"]) for page in pages],
+                         [[self.tasks[0].id, self.tasks[2].id], [self.tasks[1].id]])
+        self.assertTrue(all(task["completed"] for page in pages for task in page["tasks"]))
+
+    def test_deleting_a_tag_leaves_tombstones_for_its_tasks(self):
+        cursor = self.changes()["cursor"]
+        tag_id = self.work.id
+        services.delete_tag(self.work)
+        deleted = self.changes(cursor)["deleted"]
+        self.assertEqual(sorted(deleted["tasks"]), sorted(task.id for task in self.tasks))
+        self.assertEqual(deleted["tags"], [tag_id])
+
+    def test_expired_cursor(self):
+        cursor = self.changes()["cursor"]
+        services.delete_task(self.tasks[0])
+        self.assertEqual(sync.prune_tombstones(timezone.now() + datetime.timedelta(seconds=1)), 1)
+        response = self.client.get(reverse('api-sync'), {"cursor": cursor})
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(len(self.changes()["tasks"]), 2)
+
+    def test_upload_applies_the_batch_and_reports_conflicts(self):
+        stale, current, gone = self.tasks
+        services.rename_task(self.user, stale.id, "Changed on the server")
+        # a constant number of statements, whatever the size of the batch (the task of another user is looked up in
+        # the archive as well)
+        with self.assertNumQueries(19):
+            response = self.upload(
+                tags=[{"ref": "home", "tag_name": "Home"}],
+                tasks=[
+                    {"ref": "new", "title": "Offline task", "tag": "home"},
+                    {"id": stale.id, "seq": stale.seq, "title": "Changed offline"},
+                    {"id": current.id, "seq": current.seq, "completed": True, "tag": None},
+                    {"id": gone.id, "seq": gone.seq, "deleted": True},
+                    {"id": self.other.id, "seq": self.other.seq, "deleted": True},
+                ])
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        created = Task.objects.get(pk=result["refs"]["tasks"]["new"])
+        self.assertEqual(created.tag_id, result["refs"]["tags"]["home"])
+        self.assertEqual(created.seq, result["seq"])
+        self.assertEqual([(conflict["id"], conflict["seq"]) for conflict in result["conflicts"]],
+                         [(stale.id, Task.objects.get(pk=stale.id).seq), (self.other.id, None)])
+        self.assertEqual(Task.objects.get(pk=stale.id).title, "Changed on the server")
+        current.refresh_from_db()
+        self.assertEqual((current.completed, current.tag_id), (True, None))
+        self.assertFalse(Task.objects.filter(pk=gone.id).exists())
+        self.assertTrue(Task.objects.filter(pk=self.other.id).exists())
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_invalid_batch_applies_nothing(self):
+        response = self.upload(tasks=[{"title": "Valid"}, {"title": ""}, {"title": "Tagged", "tag": self.other.id}])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual([(error["index"], list(error["errors"])) for error in response.json()["errors"]],
+                         [(1, ["title"]), (2, ["tag"])])
+        self.assertFalse(Task.objects.filter(title="Valid").exists())
+
+
+class ExportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        work = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        Task.objects.create(user=self.user, title='Quote "this", please', description="two\nlines", tag=work)
+        Task.objects.create(user=self.user, title="Untagged", completed=True, date=None)
+        Task.objects.create(user=User.objects.create_user(username="other"), title="Other")
+        self.client.force_login(self.user)
+
+    def download(self, file_format: str, queries: int = 2) -> bytes:
+        response = self.client.get(reverse('export-tasks', args=[file_format]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Disposition"], f'attachment; filename="tasks.{file_format}"')
+        # the rows and their tag names are read by one query per tier (tasks, archived tasks) while the response is
+        # streamed
+        with self.assertNumQueries(queries):
+            return b"".join(response.streaming_content)
+
+    def test_csv(self):
+        rows = list(csv.DictReader(io.StringIO(self.download("csv").decode())))
+        self.assertEqual([(row["title"], row["description"], row["tag"], row["completed"]) for row in rows], [
+            ('Quote "this", please', "two\nlines", "Work", "False"),
+            ("Untagged", "", "", "True"),
+        ])
+
+    def test_gzipped_ndjson(self):
+        lines = gzip.decompress(self.download("ndjson.gz")).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([(row["title"], row["tag"], row["date"]) for row in rows][1], ("Untagged", None, None))
+        self.assertEqual(list(rows[0]), export.FIELDS)
+        self.assertEqual(gzip.decompress(self.download("csv.gz")), self.download("csv"))
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export-tasks', args=["xlsx"])).status_code, 404)
+        self.assertEqual(self.client.get(reverse('export-tasks', args=["csv.zip"])).status_code, 404)
+
+    def test_rows_are_sent_in_chunks(self):
+        chunks = list(export.buffered((f"{n:09}\n" for n in range(100)), size=100))
+        self.assertEqual([len(chunk) for chunk in chunks], [100] * 10)
+
+    def test_command(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "tasks.ndjson.gz")
+            call_command('export_tasks', 'user', format='ndjson', gzip=True, output=path)
+            with gzip.open(path, "rt") as exported:
+                self.assertEqual([json.loads(line)["title"] for line in exported],
+                                 ['Quote "this", please', "Untagged"])
+        with self.assertRaises(CommandError):
+            call_command('export_tasks', 'nobody', output=os.devnull)
+
+
+class ImportTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.work = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        self.client.force_login(self.user)
+
+    def test_parsers_leave_the_stream_open(self):
+        for parser, data in ((importer.csv_rows, b"title\nTask\n"), (importer.ndjson_rows, b'{"title": "Task"}\n')):
+            for compress in (False, True):
+                with self.subTest(parser=parser.__name__, compress=compress):
+                    stream = io.BytesIO(gzip.compress(data) if compress else data)
+                    self.assertEqual([row["title"] for _, row in parser(stream)], ["Task"])
+                    self.assertFalse(stream.closed)
+
+    def test_rows_are_validated_in_batches_and_tags_deduplicated(self):
+        lines = ["title,date,completed,tag"]
+        lines += [f"Task {n},2026-01-0{n % 9 + 1},{'done' if n % 2 else ''},{'Work' if n % 3 else 'Home'}"
+                  for n in range(50)]
+        lines[10] = ",not a date,,Work"
+        # the map of the tags, per batch the sequence number and one INSERT of the tasks (the new tag once), then the
+        # counters rebuild and the savepoints
+        with self.assertNumQueries(1 + 3 * 2 + 1 + 4 + 6):
+            report = importer.import_tasks(self.user, importer.csv_rows(io.BytesIO("\n".join(lines).encode())),
+                                           batch_size=20)
+
+        self.assertEqual((report.created, report.tags_created, report.failed), (49, 1, 1))
+        self.assertEqual(report.errors, [(11, {"title": ["This field cannot be blank."],
+                                               "date": ["“not a date” value has an invalid format. It must be in "
+                                                        "YYYY-MM-DD HH:MM[:ss[.uuuuuu]][TZ] format."]})])
+        self.assertEqual(
+            list(TagTask.objects.filter(user_id=self.user).order_by("id").values_list("tag_name", flat=True)),
+            ["Work", "Home"])
+        self.assertEqual(Task.objects.filter(user=self.user, tag=self.work).count(), 33)
+        self.assertEqual(Task.objects.filter(user=self.user, completed=True).count(), 24)
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_an_export_imports_back(self):
+        owner = User.objects.create_user(username="owner")
+        tag = TagTask.objects.create(user_id=owner, tag_name="Home")
+        # NDJSON dates have millisecond precision
+        Task.objects.create(user=owner, title='Quote "this"', description="two\nlines", tag=tag, completed=True,
+                            date=timezone.now().replace(microsecond=0))
+        Task.objects.create(user=owner, title="No date", date=None)
+        for file_format in ("csv", "ndjson"):
+            with self.subTest(file_format=file_format):
+                exported = io.BytesIO(b"".join(export.export(owner.id, file_format, compress=True)))
+                report = importer.import_tasks(self.user, importer.PARSERS[file_format](exported))
+                self.assertEqual((report.created, report.failed), (2, 0))
+        fields = ("title", "description", "date", "completed", "tag__tag_name")
+        self.assertEqual(sorted(Task.objects.filter(user=self.user).values_list(*fields)),
+                         sorted(list(Task.objects.filter(user=owner).values_list(*fields)) * 2))
+
+    def test_upload(self):
+        data = gzip.compress(b'{"title": "Imported", "tag": "Work"}\n[1, 2]\n')
+        response = self.client.post(reverse('import-tasks'),
+                                    {"file": SimpleUploadedFile("tasks.ndjson.gz", data)})
+        self.assertEqual(response.status_code, 200)
+        report = response.json()
+        self.assertEqual((report["created"], report["tags_created"], report["failed"]), (1, 0, 1))
+        self.assertEqual(report["errors"], [{"line": 2, "errors": {"row": ["Not a JSON object."]}}])
+        self.assertEqual(Task.objects.get(user=self.user).tag, self.work)
+
+        response = self.client.post(reverse('import-tasks'), {"file": SimpleUploadedFile("tasks.xlsx", b"")})
+        self.assertEqual(response.status_code, 400)
+
+    def test_command(self):
+        with tempfile.NamedTemporaryFile(suffix=".csv") as source:
+            source.write(b"title,tag\nFrom the command,Errands\n")
+            source.flush()
+            stdout = io.StringIO()
+            call_command('import_tasks', 'user', source.name, stdout=stdout)
+        self.assertIn("Imported 1 tasks and 1 new tags, 0 rows failed", stdout.getvalue())
+        self.assertTrue(Task.objects.filter(user=self.user, tag__tag_name="Errands").exists())
+
+
+@override_settings(TASK_PAGE_CACHE=None)
+class ArchiveTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tag = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        day = timezone.make_aware(datetime.datetime(2026, 3, 1))
+        self.open = Task.objects.create(user=self.user, title="Open", date=day)
+        self.old = [Task.objects.create(user=self.user, title=f"Old report {n}", description=f"Notes {n}",
+                                        tag=self.tag, completed=True, date=day + datetime.timedelta(days=n))
+                    for n in (1, 3, 5)]
+        self.recent = Task.objects.create(user=self.user, title="Recent", completed=True,
+                                          date=day + datetime.timedelta(days=4))
+        Task.objects.exclude(pk=self.recent.pk).update(updated_at=timezone.now() - datetime.timedelta(days=100))
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def archive(self, *args):
+        call_command("archive_tasks", "--days", "90", "--batch-size", "2", *args, stdout=io.StringIO())
+
+    def assertConsistent(self):
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_old_completed_tasks_move_to_the_archive(self):
+        self.archive("--compress")
+
+        self.assertEqual(sorted(ArchivedTask.objects.values_list("id", flat=True)), [task.id for task in self.old])
+        self.assertEqual(set(Task.objects.values_list("id", flat=True)), {self.open.id, self.recent.id})
+        archived = ArchivedTask.objects.get(pk=self.old[0].id)
+        self.assertEqual((archived.description, archive.unpack(archived.payload)), ("", {"description": "Notes 1"}))
+        # a sequence number per batch of the user
+        self.assertEqual(SyncSequence.objects.get(user=self.user).last_seq, 2)
+        self.assertConsistent()
+
+        # one list, newest first, across both tiers
+        response = self.client.get(reverse('completed-tasks'))
+        self.assertEqual([task.id for task in response.context["page"]],
+                         [self.old[2].id, self.recent.id, self.old[1].id, self.old[0].id])
+        self.assertEqual(response.context["amount"], 4)
+        response = self.client.get(reverse('completed-tasks'), {"search": "report notes"})
+        self.assertEqual(response.context["amount"], 0)
+        response = self.client.get(reverse('completed-tasks'), {"search": "old report"})
+        self.assertEqual([task.id for task in response.context["page"]], [task.id for task in reversed(self.old)])
+
+    def test_uncompleting_an_archived_task_restores_it(self):
+        self.archive("--compress")
+        task = self.old[0]
+
+        response = self.client.post(reverse('toggle-task', args=[task.id]))
+        self.assertEqual(response.json(), {"tasks": {str(task.id): False}})
+        restored = Task.objects.get(pk=task.id)
+        self.assertEqual((restored.completed, restored.description, restored.tag_id), (False, "Notes 1", self.tag.id))
+        self.assertFalse(ArchivedTask.objects.filter(pk=task.id).exists())
+        self.assertEqual(TaskCounter.objects.get(user=self.user).tag_open_count(self.tag.id), 1)
+        self.assertConsistent()
+
+        # deleting an archived task leaves a tombstone like any other deletion
+        self.client.get(reverse('delete-completed-task', args=[self.old[1].id]))
+        self.assertFalse(ArchivedTask.objects.filter(pk=self.old[1].id).exists())
+        self.assertTrue(Tombstone.objects.filter(object_id=self.old[1].id).exists())
+        self.assertConsistent()
+
+    def test_archived_tasks_can_be_edited(self):
+        self.archive()
+        task = self.old[2]
+        url = reverse('completed-task-detail', args=[task.id])
+
+        self.assertContains(self.client.get(url), "Notes 5")
+        self.assertTrue(ArchivedTask.objects.filter(pk=task.id).exists())
+        self.client.post(url, {"title": "Edited", "description": "Notes 5", "date": "2026-03-06", "tag": self.tag.id})
+        self.assertEqual(Task.objects.get(pk=task.id).title, "Edited")
+        self.assertFalse(ArchivedTask.objects.filter(pk=task.id).exists())
+        self.assertConsistent()
+
+        # bulk actions restore the selected archived tasks first
+        response = self.client.post(reverse('bulk-tasks'), {"action": "reopen", "select_all": "on",
+                                                              "bucket": "completed"})
+        self.assertEqual(response.json()["affected"], 4)
+        self.assertFalse(ArchivedTask.objects.exists())
+        self.assertConsistent()
+
+    def test_sync_and_export_include_archived_tasks(self):
+        self.archive("--compress")
+        tasks = {task["id"]: task for task in self.client.get(reverse('api-sync')).json()["tasks"]}
+        self.assertEqual(len(tasks), 5)
+        self.assertEqual((tasks[self.old[0].id]["completed"], tasks[self.old[0].id]["description"]), (True, "Notes 1"))
+
+        rows = list(csv.DictReader(io.StringIO(b"".join(
+            self.client.get(reverse('export-tasks', args=["csv"])).streaming_content).decode())))
+        self.assertEqual([int(row["id"]) for row in rows], sorted(tasks))
+        self.assertEqual(rows[1]["description"], "Notes 1")
+
+        # deleting the tag deletes its archived tasks
+        services.delete_tag(self.tag)
+        self.assertFalse(ArchivedTask.objects.exists())
+        self.assertEqual(set(Tombstone.objects.filter(kind=Tombstone.TASK).values_list("object_id", flat=True)),
+                         {task.id for task in self.old})
+        self.assertConsistent()
+
+
+class AgendaTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tag = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        utc = datetime.timezone.utc
+        dates = {
+            "Standup": datetime.datetime(2026, 3, 2, 9, tzinfo=utc),
+            "Review": datetime.datetime(2026, 3, 2, 23, 30, tzinfo=utc),  # March 3rd in Paris
+            "Report": datetime.datetime(2026, 3, 5, tzinfo=utc),
+            "Holiday": datetime.datetime(2026, 12, 31, 12, tzinfo=utc),
+        }
+        self.tasks = {title: Task.objects.create(user=self.user, title=title, date=date, tag=self.tag)
+                      for title, date in dates.items()}
+        Task.objects.create(user=self.user, title="Done", date=dates["Standup"], completed=True)
+        Task.objects.create(user=self.user, title="Someday", date=None)
+        Task.objects.create(user=User.objects.create_user(username="other"), title="Other", date=dates["Standup"])
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def agenda(self, **params) -> dict:
+        response = self.client.get(reverse('api-agenda'), params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def titles(self, result: dict) -> dict:
+        return {day["date"]: [task["title"] for task in day["tasks"]] for day in result["days"]}
+
+    def test_open_tasks_are_grouped_by_day(self):
+        with self.assertNumQueries(3):  # session, user, the range of tasks
+            result = self.agenda(start="2026-03-01", end="2026-03-07")
+        self.assertEqual(self.titles(result), {"2026-03-02": ["Standup", "Review"], "2026-03-05": ["Report"]})
+        self.assertEqual(result["days"][0]["tasks"][0],
+                         {"id": self.tasks["Standup"].id, "title": "Standup", "date": "2026-03-02T09:00:00+00:00",
+                          "tag": "Work"})
+        self.assertEqual((result["start"], result["end"], result["truncated"]), ("2026-03-01", "2026-03-07", False))
+
+        # the days of the user's time zone
+        result = self.agenda(start="2026-03-03", end="2026-03-03", tz="Europe/Paris")
+        self.assertEqual(self.titles(result), {"2026-03-03": ["Review"]})
+        self.assertEqual(result["days"][0]["tasks"][0]["date"], "2026-03-03T00:30:00+01:00")
+        self.assertEqual(result["time_zone"], "Europe/Paris")
+
+    def test_ranges(self):
+        self.assertEqual(len(self.agenda(start="2026-01-01", end="2026-12-31")["days"]), 3)
+        # a week from today by default
+        result = self.agenda()
+        self.assertEqual(datetime.date.fromisoformat(result["end"]) - datetime.date.fromisoformat(result["start"]),
+                         datetime.timedelta(days=6))
+        with mock.patch('tasks.agenda.MAX_TASKS', 2):
+            result = self.agenda(start="2026-03-01", end="2026-03-31")
+            self.assertEqual((self.titles(result), result["truncated"]), ({"2026-03-02": ["Standup", "Review"]}, True))
+
+        for params in ({"start": "2026-01-01", "end": "2027-01-02"}, {"start": "2026-03-02", "end": "2026-03-01"},
+                       {"start": "March"}, {"tz": "Mars/Olympus"}):
+            with self.subTest(params=params):
+                response = self.client.get(reverse('api-agenda'), params)
+                self.assertEqual(response.status_code, 400)
+                self.assertIn("errors", response.json())
+
+    def test_agenda_page(self):
+        response = self.client.get(reverse('agenda-tasks'), {"start": "2026-03-01", "end": "2026-03-07"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(day, [task.title for task in tasks]) for day, tasks in response.context["days"]],
+                         [(datetime.date(2026, 3, 2), ["Standup", "Review"]), (datetime.date(2026, 3, 5), ["Report"])])
+        self.assertEqual(response.context["amount"], 3)
+        self.assertContains(response, reverse('all-task-detail', args=[self.tasks["Report"].id]))
+        self.assertContains(response, "?start=2026-03-08&amp;end=2026-03-14")
+
+        response = self.client.get(reverse('agenda-tasks'), {"start": "2026-03-02", "end": "2026-03-01"})
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "The end of the range is before its start.")
+
+
+class PageCacheTest(TestCase):
+    def setUp(self):
+        page_cache.get_cache().clear()
+        page_cache.stats.reset()
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tag = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        self.task = Task.objects.create(user=self.user, title="Pay rent", tag=self.tag, date=datetime.date.today())
+        self.client.force_login(self.user)
+        # the first page sets the CSRF cookie the cached forms depend on
+        self.client.get(reverse('all-tasks'))
+        page_cache.stats.reset()
+
+    def test_hit_skips_rendering(self):
+        self.assertEqual(self.client.get(reverse('today-tasks'))["X-Page-Cache"], "MISS")
+        with self.assertNumQueries(3):  # session, user and the ETag validator
+            response = self.client.get(reverse('today-tasks'))
+        self.assertEqual(response["X-Page-Cache"], "HIT")
+        self.assertContains(response, "Pay rent")
+        self.assertEqual(page_cache.stats.as_dict()["hits"], 1)
+
+    def test_writes_bump_the_version(self):
+        self.client.get(reverse('today-tasks'))
+        self.client.post(reverse('api-edit-task-title', args=[self.task.id]), {"title": "Renamed"})
+        response = self.client.get(reverse('today-tasks'))
+        self.assertEqual(response["X-Page-Cache"], "MISS")
+        self.assertContains(response, "Renamed")
+
+        self.client.post(reverse('toggle-task', args=[self.task.id]))
+        self.assertNotContains(self.client.get(reverse('today-tasks')), "Renamed")
+
+    def test_admin_writes_bump_the_version(self):
+        version = page_cache.get_version(self.user.id)
+        admin = User.objects.create_superuser(username="admin", password="password")
+        self.client.force_login(admin)
+        self.client.post(reverse('admin:tasks_task_delete', args=[self.task.id]), {"post": "yes"})
+        self.assertNotEqual(page_cache.get_version(self.user.id), version)
+        self.assertEqual(counters.verify(self.user.id), {})
+
+    def test_pending_messages_bypass_the_cache(self):
+        self.client.post(reverse('bulk-tasks'), {"action": "complete", "task_id": [self.task.id],
+                                                 "next": reverse('all-tasks')})
+        response = self.client.get(reverse('all-tasks'))
+        self.assertContains(response, "1 task(s) updated.")
+        self.assertEqual(page_cache.stats.as_dict()["bypasses"], 1)
+
+    def test_pages_are_per_user(self):
+        self.client.get(reverse('all-tasks'))
+        other = User.objects.create_user(username="other", password="password")
+        self.client.force_login(other)
+        self.client.get(reverse('all-tasks'))
+        self.assertNotContains(self.client.get(reverse('all-tasks')), "Pay rent")
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.task = Task.objects.create(user=self.user, title="Task", date=datetime.date.today())
+        self.client.force_login(self.user)
+        self.client.get(reverse('all-tasks'))  # sets the CSRF cookie
+
+    def test_unchanged_pages_are_not_modified(self):
+        for name in ('all-tasks', 'today-tasks', 'overdue-tasks', 'completed-tasks', 'all-tags'):
+            with self.subTest(name=name):
+                response = self.client.get(reverse(name))
+                self.assertIn("Last-Modified", response)
+                with self.assertNumQueries(3):  # session, user and the validator; nothing is rendered
+                    response = self.client.get(reverse(name), HTTP_IF_NONE_MATCH=response["ETag"])
+                self.assertEqual(response.status_code, 304)
+
+    def test_writes_change_the_etag(self):
+        writes = [
+            lambda: self.client.post(reverse('toggle-task', args=[self.task.id])),
+            lambda: self.client.post(reverse('api-edit-task-title', args=[self.task.id]), {"title": "Renamed"}),
+            lambda: services.bulk_update_tasks(self.user, Task.objects.filter(user=self.user), 'reschedule', days=1),
+            lambda: TagTask.objects.create(user_id=self.user, tag_name="Work"),
+            lambda: self.client.post(reverse('api-delete-task', args=[self.task.id])),
+        ]
+        for write in writes:
+            etag = self.client.get(reverse('all-tasks'))["ETag"]
+            write()
+            response = self.client.get(reverse('all-tasks'), HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+
+    def test_etag_changes_at_midnight(self):
+        etag = self.client.get(reverse('today-tasks'))["ETag"]
+        tomorrow = datetime.date.today() + datetime.timedelta(days=1)
+        with mock.patch('tasks.conditional.datetime') as conditional_datetime:
+            conditional_datetime.date.today.return_value = tomorrow
+            response = self.client.get(reverse('today-tasks'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+@override_settings(TASK_PAGE_CACHE=None, TASK_INSTRUMENTATION_HEADERS=True)
+class InstrumentationTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        counters.rebuild(self.user.id)
+        self.client.force_login(self.user)
+
+    def test_measurements_are_logged_and_returned(self):
+        with self.assertLogs("tasks.instrumentation", "INFO") as logs:
+            response = self.client.get(reverse('all-tasks'))
+        record = json.loads(logs.records[0].getMessage())
+        self.assertEqual(record["view"], "all-tasks")
+        self.assertEqual(record["queries"], 9)
+        self.assertEqual(record["bytes"], len(response.content))
+        self.assertEqual(response["X-Query-Count"], "9")
+        self.assertIn('db;dur=', response["Server-Timing"])
+
+    @override_settings(TASK_QUERY_BUDGETS={"all-tasks": 2})
+    def test_budgets(self):
+        with self.settings(TASK_QUERY_BUDGET_STRICT=True), self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('all-tasks'))
+
+        self.client = self.client_class()
+        self.client.force_login(self.user)
+        with self.settings(TASK_QUERY_BUDGET_STRICT=False), self.assertLogs("tasks.instrumentation", "WARNING"):
+            self.assertEqual(self.client.get(reverse('all-tasks')).status_code, 200)
+
+    @override_settings(TASK_INSTRUMENTATION=False)
+    def test_disabled(self):
+        self.assertNotIn("Server-Timing", self.client.get(reverse('all-tasks')))
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.client.force_login(self.user)
+
+    def sample(self, name: str, **labels) -> float:
+        return metrics.REGISTRY.get_sample_value(name, labels) or 0.0
+
+    def test_endpoint(self):
+        created = self.sample("todolist_tasks_created_total")
+        self.client.post(reverse('all-tasks'), {"title": "New", "date": "2026-01-01"})
+        task = Task.objects.get(title="New")
+        self.client.post(reverse('toggle-task', args=[task.id]))
+        self.client.post(reverse('api-delete-task', args=[task.id]))
+        self.assertEqual(self.sample("todolist_tasks_created_total"), created + 1)
+
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, 200)
+        body = response.content.decode()
+        for name in ("todolist_request_duration_seconds_bucket", "todolist_request_queries_bucket",
+                     "todolist_tasks_toggled_total", "todolist_tasks_deleted_total", "todolist_active_sessions"):
+            self.assertIn(name, body)
+        self.assertIn('view="all-tasks"', body)
+        self.assertEqual(self.sample("todolist_active_sessions"), 1)
+
+    @override_settings(TASK_METRICS_TOKEN="secret")
+    def test_token(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+        response = self.client.get(reverse('metrics'), HTTP_AUTHORIZATION="Bearer secret")
+        self.assertEqual(response.status_code, 200)
+
+    def test_multiprocess_aggregation(self):
+        script = "import django; django.setup(); from tasks import metrics; metrics.TASKS_CREATED.inc(2)"
+        with tempfile.TemporaryDirectory() as directory:
+            env = {**os.environ, "PROMETHEUS_MULTIPROC_DIR": directory}
+            for _ in range(2):  # two worker processes
+                subprocess.run([sys.executable, "-c", script], env=env, check=True)
+            with mock.patch.dict(os.environ, {"PROMETHEUS_MULTIPROC_DIR": directory}):
+                registry = metrics.registry()
+            self.assertEqual(registry.get_sample_value("todolist_tasks_created_total"), 4)
+
+
+class BenchmarkCommandTest(TestCase):
+    def test_seed_and_bench_routes(self):
+        call_command('seed_tasks', users=3, tasks_per_user=20, seed=1, stdout=io.StringIO())
+        users = User.objects.filter(username__startswith="seed-")
+        self.assertEqual(users.count(), 3)
+        for user in users:
+            self.assertEqual(counters.verify(user.id), {})
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline = os.path.join(directory, "baseline.json")
+            routes = ["all-tasks", "toggle-task", "delete-all-task", "login"]
+            call_command('bench_routes', requests=3, route=routes, baseline=baseline, save_baseline=True,
+                         stdout=io.StringIO(), stderr=io.StringIO())
+            with open(baseline) as file:
+                results = json.load(file)["routes"]
+            self.assertEqual(list(results), routes)
+            self.assertFalse(any(result["errors"] for result in results.values()))
+
+            # a baseline that issued fewer queries makes the run fail
+            for result in results.values():
+                result["queries"] = 0
+            with open(baseline, "w") as file:
+                json.dump({"routes": results}, file)
+            with self.assertRaises(CommandError):
+                call_command('bench_routes', requests=3, route=routes, baseline=baseline, fail_on_regression=True,
+                             stdout=io.StringIO(), stderr=io.StringIO())
+
+    def test_bench_projections(self):
+        output = io.StringIO()
+        call_command('bench_projections', tasks=60, description_size=500, repeat=1, stdout=output)
+        lines = output.getvalue().splitlines()
+        self.assertEqual(len(lines), 11)
+        whole, projected = (int(line.split()[-3]) for line in lines[1:3])
+        self.assertLess(projected, whole / 5)
+        self.assertFalse(User.objects.filter(username="bench-projections").exists())
+
+
+class ConnectionSettingsTest(TestCase):
+    def test_modes(self):
+        pool = connection_settings("django.db.backends.postgresql", "pool", max_size=6)
+        self.assertEqual(pool["CONN_MAX_AGE"], 0)
+        self.assertTrue(pool["CONN_HEALTH_CHECKS"])
+        self.assertEqual(pool["OPTIONS"]["pool"]["max_size"], 6)
+
+        persistent = connection_settings("django.db.backends.postgresql", "persistent", max_age=30)
+        self.assertEqual(persistent, {"CONN_MAX_AGE": 30, "CONN_HEALTH_CHECKS": True, "OPTIONS": {}})
+        # pools are PostgreSQL only
+        self.assertEqual(connection_settings("django.db.backends.sqlite3", "pool", max_age=30), persistent)
+        self.assertEqual(connection_settings("django.db.backends.sqlite3", "per-request")["CONN_MAX_AGE"], 0)
+        with self.assertRaises(ValueError):
+            connection_settings("django.db.backends.postgresql", "sometimes")
+
+    def test_worker_threads_release_their_connections(self):
+        with mock.patch('tasks.async_views.close_old_connections') as close:
+            self.assertEqual(asyncio.run(async_views._in_thread(sum, [1, 2])), 3)
+        close.assert_called_once_with()
+
+
+def add_test_database(test_case, alias: str, settings_dict: dict) -> None:
+    """
+    Adds a database alias for the tests of a class, to be called before `super().setUpClass()`: creates and migrates
+    its test database like the test runner does for the configured ones (the runner only knows the aliases configured
+    when it starts) and adds it to the `databases` of the class. Both are removed again by a class cleanup.
+    """
+
+    connections.settings[alias] = connections.configure_settings({
+        "default": connections.settings["default"], alias: settings_dict})[alias]
+    connections[alias].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+    test_case.databases = {*test_case.databases, alias}
+    test_case.addClassCleanup(_remove_test_database, alias, settings_dict["NAME"])
+
+
+def _remove_test_database(alias: str, name: str) -> None:
+    connections[alias].creation.destroy_test_db(name, verbosity=0)
+    del connections[alias]
+    del connections.settings[alias]
+
+
+@override_settings(TASK_READ_REPLICAS=["replica"], TASK_PAGE_CACHE=None)
+class ReplicaRouterTest(TransactionTestCase):
+    """
+    Rows are copied to the replica by `replicate` and the primary is changed behind its back to simulate replication
+    lag.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        # a second database standing in for a read replica
+        add_test_database(cls, "replica", {**copy.deepcopy(connections.settings["default"]), "NAME": "replica"})
+        super().setUpClass()
+
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.task = services.save_task(Task(user=self.user, title="Before"))
+        self.replicate()
+        # the replica has not caught up with this change yet
+        Task.objects.filter(pk=self.task.id).update(title="After")
+        caches["default"].clear()
+        self.client.force_login(self.user)
+        self.async_client.force_login(self.user)
+
+    def tearDown(self):
+        routers._down.clear()
+
+    def replicate(self):
+        for model in (User, TagTask, Task, TaskCounter):
+            model.objects.using("replica").all().delete()
+            model.objects.using("replica").bulk_create(model.objects.using("default").all())
+
+    def titles(self) -> list:
+        return [task.title for task in self.client.get(reverse('all-tasks')).context["page"]]
+
+    def test_read_only_requests_read_from_the_replica(self):
+        self.assertEqual(self.titles(), ["Before"])
+        # outside requests and for the models of other apps the primary is read
+        self.assertEqual(routers.ReplicaRouter().db_for_read(Task), "default")
+        token = routers.begin_request(primary=False)
+        try:
+            self.assertEqual(routers.ReplicaRouter().db_for_read(User), "default")
+        finally:
+            routers.end_request(token)
+
+    def test_writers_read_from_the_primary_for_a_while(self):
+        self.client.post(reverse('toggle-task', args=[self.task.id]))
+        self.client.post(reverse('toggle-task', args=[self.task.id]))
+        self.assertEqual(self.titles(), ["After"])
+
+        caches["default"].delete(routers.PIN_KEY.format(user_id=self.user.id))
+        self.assertEqual(self.titles(), ["Before"])
+
+    async def test_async_pages_read_from_the_replica(self):
+        response = await self.async_client.get(reverse('async-all-tasks'))
+        self.assertEqual([task.title for task in response.context["page"]], ["Before"])
+
+        await sync_to_async(routers.pin_to_primary)(self.user.id)
+        response = await self.async_client.get(reverse('async-all-tasks'))
+        self.assertEqual([task.title for task in response.context["page"]], ["After"])
+
+    def test_unreachable_replica_falls_back_to_the_primary(self):
+        with mock.patch.object(connections["replica"], "ensure_connection", side_effect=OperationalError("down")):
+            with self.assertLogs("tasks.routers", "WARNING"):
+                self.assertEqual(self.titles(), ["After"])
+            # skipped without another attempt until the retry delay is over
+            self.assertEqual(self.titles(), ["After"])
+            self.assertEqual(connections["replica"].ensure_connection.call_count, 1)
+
+
+SHARDS = ["default", "shard1", "shard2"]
+
+
+@override_settings(TASK_SHARDS=SHARDS, TASK_PAGE_CACHE=None)
+class ShardingTest(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        # two SQLite files standing in for shards next to the default database
+        directory = tempfile.mkdtemp(prefix="todo-test-shards-")
+        cls.addClassCleanup(shutil.rmtree, directory, ignore_errors=True)
+        for alias in SHARDS[1:]:
+            add_test_database(cls, alias, {
+                "ENGINE": "django.db.backends.sqlite3", "NAME": os.path.join(directory, f"{alias}.sqlite3"),
+                "TEST": {"NAME": os.path.join(directory, f"test_{alias}.sqlite3")}})
+        super().setUpClass()
+
+    def setUp(self):
+        call_command("migrate_shards", verbosity=0, stdout=io.StringIO())
+        self.alice = User.objects.create_user(username="alice", password="password")
+        self.bob = User.objects.create_user(username="bob", password="password")
+        ShardPlacement.objects.update_or_create(user=self.alice, defaults={"shard": "shard1"})
+        ShardPlacement.objects.update_or_create(user=self.bob, defaults={"shard": "shard2"})
+
+    def add_task(self, user, title: str, **fields) -> Task:
+        self.client.force_login(user)
+        self.client.post(reverse('all-tasks'), {"title": title, "date": "2026-01-01", **fields})
+        with shards.use_user(user.id):
+            return Task.objects.get(title=title)
+
+    def test_adding_a_shard_moves_a_share_of_the_users_to_it(self):
+        before, after = shards.HashRing(SHARDS[:2]), shards.HashRing(SHARDS)
+        moved = [user_id for user_id in range(3000) if before.shard(user_id) != after.shard(user_id)]
+        self.assertEqual({after.shard(user_id) for user_id in moved}, {"shard2"})
+        self.assertAlmostEqual(len(moved) / 3000, 1 / 3, delta=0.1)
+
+    def test_users_are_placed_on_the_ring_unless_they_have_data_on_the_default_database(self):
+        carol = User.objects.create_user(username="carol", password="password")
+        self.assertEqual(ShardPlacement.objects.get(user=carol).shard, shards.ring().shard(carol.id))
+        self.assertEqual(shards.database(carol.id), shards.ring().shard(carol.id))
+        # the first page of a new user stays within its query budget
+        self.client.force_login(carol)
+        self.assertEqual(self.client.get(reverse('all-tasks')).status_code, 200)
+
+        with override_settings(TASK_SHARDS=[]):
+            dave = User.objects.create_user(username="dave")
+            services.save_task(Task(user=dave, title="From before the sharding"))
+        self.assertFalse(ShardPlacement.objects.filter(user=dave).exists())
+        self.assertEqual(shards.database(dave.id), "default")
+
+    def test_requests_use_the_shard_of_their_user(self):
+        task = self.add_task(self.alice, "Task of Alice")
+        self.add_task(self.bob, "Task of Bob")
+
+        self.assertEqual(list(Task.objects.using("shard1").values_list("title", flat=True)), ["Task of Alice"])
+        self.assertEqual(list(Task.objects.using("shard2").values_list("title", flat=True)), ["Task of Bob"])
+        self.assertFalse(Task.objects.using("default").exists())
+        # IDs come from the block of the shard
+        self.assertTrue(shards.ID_BLOCK < task.id <= 2 * shards.ID_BLOCK)
+        self.assertEqual(TaskCounter.objects.using("shard1").get(user_id=self.alice.id).open_count, 1)
+
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('all-tasks'))
+        self.assertContains(response, "Task of Alice")
+        self.assertNotContains(response, "Task of Bob")
+        self.assertEqual(self.client.get(reverse('all-task-detail', args=[task.id])).status_code, 200)
+
+        # outside requests the shard has to be selected
+        with self.assertRaises(shards.NoShardSelected):
+            Task.objects.count()
+        with shards.use_user(self.bob.id):
+            self.assertEqual(Task.objects.count(), 1)
+
+        self.alice.delete()
+        self.assertFalse(Task.objects.using("shard1").exists())
+        self.assertFalse(TaskCounter.objects.using("shard1").exists())
+
+    async def test_async_pages_use_the_shard_of_their_user(self):
+        await sync_to_async(self.add_task)(self.alice, "Task of Alice")
+        await sync_to_async(self.add_task)(self.bob, "Task of Bob")
+        await sync_to_async(self.async_client.force_login)(self.alice)
+        response = await self.async_client.get(reverse('async-all-tasks'))
+        self.assertContains(response, "Task of Alice")
+        self.assertNotContains(response, "Task of Bob")
+
+    def test_export_streams_from_the_shard_of_the_user(self):
+        self.add_task(self.alice, "Task of Alice")
+        self.add_task(self.bob, "Task of Bob")
+        self.client.force_login(self.alice)
+        response = self.client.get(reverse('export-tasks', args=["csv"]))
+        # the body is read after the middleware has left the shard of the request
+        rows = list(csv.DictReader(io.StringIO(b"".join(response.streaming_content).decode())))
+        self.assertEqual([row["title"] for row in rows], ["Task of Alice"])
+
+    def test_conditional_pages_see_the_writes_on_the_shard(self):
+        self.add_task(self.alice, "First")
+        self.client.get(reverse('all-tasks'))  # sets the CSRF cookie the ETag covers
+        etag = self.client.get(reverse('all-tasks'))["ETag"]
+        self.assertEqual(self.client.get(reverse('all-tasks'), HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        self.add_task(self.alice, "Second")
+        response = self.client.get(reverse('all-tasks'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, "Second")
+
+    def test_moving_a_user_keeps_their_rows_and_ids(self):
+        self.client.force_login(self.alice)
+        self.client.post(reverse('all-tags'), {"tag_name": "Work"})
+        with shards.use_user(self.alice.id):
+            tag = TagTask.objects.get()
+        self.add_task(self.alice, "Tagged", tag=tag.id)
+        gone = self.add_task(self.alice, "Deleted")
+        gone_id = gone.id
+        services.delete_task(gone)
+        tasks = dict(Task.objects.using("shard1").values_list("id", "updated_at"))
+        last_seq = SyncSequence.objects.using("shard1").get(user_id=self.alice.id).last_seq
+
+        report = shards.move_user(self.alice.id, "shard2")
+
+        self.assertEqual((report["source"], report["target"]), ("shard1", "shard2"))
+        self.assertEqual(ShardPlacement.objects.get(user=self.alice).shard, "shard2")
+        self.assertEqual(dict(Task.objects.using("shard2").values_list("id", "updated_at")), tasks)
+        self.assertEqual(TagTask.objects.using("shard2").get().id, tag.id)
+        self.assertEqual(list(Tombstone.objects.using("shard2").values_list("object_id", flat=True)), [gone_id])
+        self.assertEqual(SyncSequence.objects.using("shard2").get(user_id=self.alice.id).last_seq, last_seq)
+        self.assertEqual(TaskCounter.objects.using("shard2").get(user_id=self.alice.id).tag_open_count(tag.id), 1)
+        for model in (Task, TagTask, Tombstone, TaskCounter):
+            self.assertFalse(model.objects.using("shard1").exists())
+
+        # the user carries on on the new shard; new rows take IDs of its block
+        new = self.add_task(self.alice, "After the move")
+        self.assertTrue(2 * shards.ID_BLOCK < new.id <= 3 * shards.ID_BLOCK)
+        response = self.client.get(reverse('all-tasks'))
+        self.assertContains(response, "Tagged")
+        self.assertContains(response, "After the move")
+        self.assertEqual(self.client.get(reverse('api-sync'), {"cursor": last_seq}).json()["tasks"][0]["title"],
+                         "After the move")
+
+    def test_writes_reaching_the_old_shard_are_retried(self):
+        task = self.add_task(self.alice, "Task")
+        shards.move_user(self.alice.id, "shard2")
+
+        # a request that looked the placement up before the move
+        with mock.patch.object(shards, "database", return_value="shard1"):
+            response = self.client.post(reverse('toggle-task', args=[task.id]))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response["Retry-After"], "1")
+        self.assertFalse(Task.objects.using("shard1").exists())
+
+        self.client.post(reverse('toggle-task', args=[task.id]))
+        self.assertTrue(Task.objects.using("shard2").get(pk=task.id).completed)
+
+    def test_rebalance_moves_users_to_their_shard_of_the_ring(self):
+        self.add_task(self.alice, "Task of Alice")
+        self.add_task(self.bob, "Task of Bob")
+        for user in (self.alice, self.bob):
+            shards.move_user(user.id, "default")
+
+        call_command("rebalance_shards", stdout=io.StringIO())
+
+        for user in (self.alice, self.bob):
+            shard = shards.ring().shard(user.id)
+            self.assertEqual(ShardPlacement.objects.get(user=user).shard, shard)
+            self.assertEqual(Task.objects.using(shard).filter(user_id=user.id).count(), 1)
+
+
+@override_settings(TASK_PAGE_CACHE=None)
+class AsyncViewTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.tag = TagTask.objects.create(user_id=self.user, tag_name="Work")
+        today = datetime.date.today()
+        self.today = Task.objects.create(user=self.user, title="Due today", tag=self.tag, date=today)
+        self.late = Task.objects.create(user=self.user, title="Late", date=today - datetime.timedelta(days=1))
+        self.other = Task.objects.create(user=User.objects.create_user(username="other"), title="Other")
+        self.async_client.force_login(self.user)
+
+    async def test_list_pages_match_the_sync_views(self):
+        for bucket, sync_name in (("all", "all-tasks"), ("today", "today-tasks"), ("overdue", "overdue-tasks"),
+                                  ("completed", "completed-tasks")):
+            with self.subTest(bucket=bucket):
+                response = await self.async_client.get(reverse(f"async-{sync_name}"))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(response.context["amount"], len(response.context["content_to_unpack"]))
+        response = await self.async_client.get(reverse('async-today-tasks'))
+        self.assertContains(response, "Due today")
+        self.assertNotContains(response, "Late")
+
+        response = await self.async_client.get(reverse('async-fiter-by-tag', args=[self.tag.id]))
+        self.assertContains(response, "Due today")
+
+    async def test_detail_pages(self):
+        response = await self.async_client.get(reverse('async-overdue-task-detail', args=[self.late.id]))
+        self.assertEqual(response.context["task"], self.late)
+        response = await self.async_client.get(reverse('async-all-task-detail', args=[self.other.id]))
+        self.assertEqual(response.status_code, 404)
+
+    @override_settings(TASK_INSTRUMENTATION_HEADERS=True)
+    async def test_queries_of_the_worker_threads_are_counted(self):
+        await self.async_client.get(reverse("all-tasks"))  # builds the counters row
+        for name in ("all-tasks", "today-tasks", "completed-tasks"):
+            with self.subTest(name=name):
+                response = await self.async_client.get(reverse(name))
+                sync_count = int(response["X-Query-Count"])
+                response = await self.async_client.get(reverse(f"async-{name}"))
+                # all but the conditional-GET validator of the sync views, though most run in worker threads
+                self.assertEqual(int(response["X-Query-Count"]), sync_count - 1)
+
+    async def test_posts_go_to_the_sync_views(self):
+        response = await self.async_client.post(reverse('async-all-tasks'), {"title": "Created", "date": "2026-01-01"})
+        self.assertRedirects(response, reverse('all-tasks'), fetch_redirect_response=False)
+        self.assertTrue(await Task.objects.filter(title="Created", user=self.user).aexists())
+
+
+@override_settings(TASK_PAGE_CACHE=None, TASK_EVENTS_BROKER="tasks.events.base.MemoryBroker")
+class LiveEventsTest(TransactionTestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username="user", password="password")
+        self.other = User.objects.create_user(username="other")
+        self.task = Task.objects.create(user=self.user, title="Pay rent")
+        counters.rebuild(self.user.id)
+        self.async_client.force_login(self.user)
+
+    @staticmethod
+    async def next_event(stream) -> tuple:
+        chunk = (await asyncio.wait_for(anext(stream), 5)).decode()
+        lines = dict(line.split(": ", 1) for line in chunk.strip().split("\n"))
+        return lines["event"], json.loads(lines["data"])
+
+    async def test_stream_pushes_the_changes_of_the_user(self):
+        response = await self.async_client.get(reverse('task-events'))
+        self.assertEqual(response["Content-Type"], "text/event-stream")
+        stream = response.streaming_content
+        self.assertEqual(await anext(stream), b"retry: 5000\n\n")
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data["counters"]["open"]), ("counters", 1))
+
+        await sync_to_async(services.save_task)(Task(user=self.other, title="Not mine"))
+        await sync_to_async(services.toggle_tasks)(self.user, [self.task.id])
+        await sync_to_async(services.rename_task)(self.user, self.task.id, "Pay the rent")
+        created = await sync_to_async(services.save_task)(Task(user=self.user, title="Call mum"))
+        await sync_to_async(services.delete_tasks)(self.user, [created.id])
+
+        event, data = await self.next_event(stream)
+        self.assertEqual(event, "toggled")
+        self.assertEqual(data["tasks"], [{"id": self.task.id, "completed": True}])
+        self.assertEqual((data["counters"]["open"], data["counters"]["completed"]), (0, 1))
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data["task"]), ("edited", {"id": self.task.id, "title": "Pay the rent"}))
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data["task"]["title"], data["counters"]["open"]), ("created", "Call mum", 1))
+        event, data = await self.next_event(stream)
+        self.assertEqual((event, data["ids"]), ("deleted", [created.id]))
+
+        # the client going away cancels the stream, which ends the subscription
+        reader = asyncio.ensure_future(anext(stream))
+        await asyncio.sleep(0.01)
+        reader.cancel()
+        with self.assertRaises(asyncio.CancelledError):
+            await reader
+        self.assertEqual(events.get_broker().subscribers(), 0)
+
+    @override_settings(TASK_EVENTS_HEARTBEAT=0.01)
+    async def test_idle_stream_sends_keep_alives(self):
+        response = await self.async_client.get(reverse('task-events'))
+        stream = response.streaming_content
+        await anext(stream)
+        await self.next_event(stream)
+        self.assertEqual(await anext(stream), b": keep-alive\n\n")
+        await stream.aclose()
+
+    def test_rolled_back_writes_are_not_published(self):
+        broker = events.get_broker()
+        with mock.patch.object(broker, "dispatch") as dispatch:
+            with self.assertRaises(RuntimeError), transaction.atomic():
+                services.toggle_tasks(self.user, [self.task.id])
+                raise RuntimeError
+            dispatch.assert_not_called()
+            services.toggle_tasks(self.user, [self.task.id])
+        dispatch.assert_called_once()
+        self.assertEqual(dispatch.call_args.args[0], self.user.id)
+
+    def test_wsgi_requests_are_told_not_to_reconnect(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('task-events')).status_code, 204)
@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import views, api, async_views, export, importer, metrics
 from django.urls import include
 
 
@@ -16,34 +16,65 @@ urlpatterns = [
 
     # All Tasks pages
     path('tasks', views.all_tasks, name="all-tasks"),  # all tasks
-    path('todo_task/<task_id>', views.todo_all_task, name='todo-all-task'),  # todo all task
+    path('toggle_task/<int:task_id>', views.toggle_task, name='toggle-task'),  # toggle one task
+    path('toggle_tasks', views.toggle_task, name='toggle-tasks'),  # toggle many tasks
+    path('bulk_tasks', views.bulk_tasks, name='bulk-tasks'),  # bulk complete / delete / retag / reschedule
     path('task/<int:task_id>', views.task_detail_all, name='all-task-detail'),  # task detail
-    path('delete_task/<task_id>', views.delete_all_task, name='delete-all-task'),  # delete task
+    path('delete_task/<int:task_id>', views.delete_all_task, name='delete-all-task'),  # delete task
 
     # Overdue Tasks pages
     path('overdue_tasks', views.overdue_tasks, name='overdue-tasks'),  # overdue tasks
-    path('todo_overdue_task/<task_id>', views.todo_overdue_task, name='todo-overdue-task'),  # todo overdue task
     path('overdue_task/<int:task_id>', views.task_detail_overdue, name='overdue-task-detail'),  # overdue task detail
-    path('delete_overdue_task/<task_id>', views.delete_overdue_task, name='delete-overdue-task'),  # delete overdue task
+    path('delete_overdue_task/<int:task_id>', views.delete_overdue_task, name='delete-overdue-task'),  # delete overdue task
 
     # Today Tasks pages
     path('today_tasks', views.today_tasks, name='today-tasks'),  # today tasks
-    path('todo_today_task/<task_id>', views.todo_today_task, name='todo-today-task'),  # todo today task
     path('today_task/<int:task_id>', views.task_detail_today, name='today-task-detail'),  # today task detail
-    path('delete_today_task/<task_id>', views.delete_today_task, name='delete-today-task'),  # delete today task
+    path('delete_today_task/<int:task_id>', views.delete_today_task, name='delete-today-task'),  # delete today task
+
+    # Agenda page
+    path('agenda', views.agenda_tasks, name='agenda-tasks'),  # open tasks of a range of days, grouped by day
 
     # Completed Tasks pages
     path('Completed', views.completed_tasks, name='completed-tasks'),  # completed tasks
-    path('cancel_todo_task/<task_id>', views.cancel_todo_task, name='cancel-todo-task'),  # cancel todo task
     path('completed_task/<int:task_id>', views.task_detail_completed, name='completed-task-detail'),  # completed task detail
-    path('delete_completed_task/<task_id>', views.delete_completed_task, name='delete-completed-task'),  # delete completed task
+    path('delete_completed_task/<int:task_id>', views.delete_completed_task, name='delete-completed-task'),  # delete completed task
 
     # Tags pages
     path('all_tags', views.all_tags, name="all-tags"),  # all tags
     path('tag/<tag_id>', views.tag, name="tag-detail"),  # tag detail
-    path('delete_tag/<tag_id>', views.delete_tag, name="delete-tag"),  # delete tag
-    path('todo_filtered_task/<task_id>', views.todo_filtered_task, name='todo-filtered-task'),  # todo filtered task
-    path('delete_tagged_task/<task_id>', views.delete_filtered_task, name='delete-filtered-task'),  # delete filtered task
-    path('fiter_by_tag/<tag_id>', views.tag_filter, name='fiter-by-tag'),  # filter by tag
-    path('tag_filter_task/<str:tag_id>/<int:task_id>/', views.tag_filter_task, name='tag-filter-task'),  # tag filter task
+    path('delete_tag/<int:tag_id>', views.delete_tag, name="delete-tag"),  # delete tag
+    path('delete_tagged_task/<int:tag_id>/<int:task_id>', views.delete_filtered_task, name='delete-filtered-task'),  # delete filtered task
+    path('fiter_by_tag/<int:tag_id>', views.tag_filter, name='fiter-by-tag'),  # filter by tag
+    path('tag_filter_task/<int:tag_id>/<int:task_id>/', views.tag_filter_task, name='tag-filter-task'),  # tag filter task
+
+    # JSON endpoints used by tasks.js
+    path('api/tasks/<int:task_id>/toggle', api.toggle_task, name='api-toggle-task'),  # toggle task
+    path('api/tasks/<int:task_id>/delete', api.delete_task, name='api-delete-task'),  # delete task
+    path('api/tasks/<int:task_id>/title', api.edit_task_title, name='api-edit-task-title'),  # rename task
+    path('api/agenda', api.agenda_tasks, name='api-agenda'),  # open tasks of a range of days, grouped by day
+
+    # Delta sync API for mobile / offline clients
+    path('api/v1/sync', api.sync_changes, name='api-sync'),  # changes since a cursor, batched upserts
+
+    # Async versions of the list and detail pages (served natively under ASGI)
+    path('async/tasks', async_views.all_tasks, name='async-all-tasks'),  # all tasks
+    path('async/task/<int:task_id>', async_views.task_detail_all, name='async-all-task-detail'),  # task detail
+    path('async/overdue_tasks', async_views.overdue_tasks, name='async-overdue-tasks'),  # overdue tasks
+    path('async/overdue_task/<int:task_id>', async_views.task_detail_overdue, name='async-overdue-task-detail'),  # overdue task detail
+    path('async/today_tasks', async_views.today_tasks, name='async-today-tasks'),  # today tasks
+    path('async/today_task/<int:task_id>', async_views.task_detail_today, name='async-today-task-detail'),  # today task detail
+    path('async/completed', async_views.completed_tasks, name='async-completed-tasks'),  # completed tasks
+    path('async/completed_task/<int:task_id>', async_views.task_detail_completed, name='async-completed-task-detail'),  # completed task detail
+    path('async/fiter_by_tag/<int:tag_id>', async_views.tag_filter, name='async-fiter-by-tag'),  # filter by tag
+
+    # Live updates of the open tabs (Server-Sent Events, ASGI only)
+    path('events', async_views.task_events, name='task-events'),  # event stream
+
+    # Streaming exports (tasks.csv, tasks.ndjson, tasks.csv.gz, tasks.ndjson.gz) and imports
+    path('export/tasks.<str:file_format>', export.export_tasks, name='export-tasks'),  # export tasks
+    path('import/tasks', importer.upload_tasks, name='import-tasks'),  # import tasks (CSV / NDJSON upload)
+
+    # Monitoring
+    path('metrics', metrics.metrics, name='metrics'),  # Prometheus metrics
 ]
@@ -1,35 +1,48 @@
 import datetime
 
 from django.shortcuts import render, redirect
-from django.http import Http404
+from django.http import Http404, JsonResponse
+from django.contrib import messages
 from django.contrib.auth.decorators import login_required
-from .forms import TaskForm, TagForm, TaskTagForm
-from .models import Task, TagTask
+from django.utils.http import url_has_allowed_host_and_scheme, urlencode
+from django.views.decorators.http import require_POST
+from .forms import TaskForm, TagForm, TaskTagForm, BulkActionForm, AgendaForm
+from .models import Task, TagTask, TaskCounter
+from .counters import get_counters, task_state, day_start, day_range
+from .conditional import conditional_page
+from .page_cache import cache_page_per_user
+from .pagination import paginate, first_page
+from .search import search_tasks
+from .services import (save_task, save_tag, toggle_tasks, bulk_update_tasks, delete_tasks,
+                       delete_tag as delete_tag_with_tasks)
+from . import agenda, archive
 from django.http import HttpResponse
-from django.db.models import Q
 
 
 @login_required
-def output(request, html_page: str, context: dict) -> HttpResponse:
+def output(request, html_page: str, context: dict, counter: TaskCounter = None) -> HttpResponse:
     """
      Renders the specified HTML page with the given context.
 
+     The sidebar counters are served from the user's denormalized `TaskCounter` row, so they cost a single
+     primary-key lookup however many tasks the user has.
+
      :param request: HttpRequest object containing metadata about the request.
      :param html_page: str, the name of the HTML page to render.
      :param context: dict, the context data to pass to the template.
+     :param counter: TaskCounter, the user's counters if the view already fetched them.
 
      :return: HttpResponse object with the rendered HTML page.
      """
 
-    context["first_tags"] = TagTask.objects.filter(user_id=request.user)[:2]
-    context["all_tags_count"] = Task.objects.filter(user_id=request.user, completed=False).count()
-    context["completed_tags_count"] = Task.objects.filter(user_id=request.user, completed=True).count()
-    context["today_tasks_count"] = Task.objects.filter(user=request.user, completed=False, date=datetime.date.today()).count()
-    context["overdue_tasks_count"] = Task.objects.filter(user=request.user, completed=False, date__lt=datetime.date.today()).count()
+    context["counter"] = counter or get_counters(request.user)
+    context.setdefault("first_tags", TagTask.objects.filter(user_id=request.user)[:2])
 
     return render(request, html_page, context)
 
 
+@conditional_page
+@cache_page_per_user
 def overdue_tasks(request) -> HttpResponse:
     """
     Handles the display and submission of overdue tasks.
@@ -50,7 +63,7 @@ def overdue_tasks(request) -> HttpResponse:
         if task_form.is_valid():
             event = task_form.save(commit=False)
             event.user = request.user
-            event.save()
+            save_task(event)
             return redirect('all-tasks')
     else:
         task_form = TaskForm(user=request.user, initial={'date': datetime.date.today()})
@@ -58,35 +71,22 @@ def overdue_tasks(request) -> HttpResponse:
         if 'submitted' in request.GET:
             submitted = True
 
-    tasks = Task.objects.filter(user=request.user, completed=False, date__lt=datetime.date.today())
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    today_start = day_start(datetime.date.today())
+    tasks = paginate(Task.objects.filter(user=request.user, completed=False, date__lt=today_start).rows(), request,
+                     dated=True)
 
     return output(request, 'tasks/overdue_tasks.html', {
         "Text_of_the_page": "Overdue tasks",
-        "amount": tasks_amount,
+        "amount": counter.overdue_count,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         'submitted': submitted,
         "edit": False,
-    })
-
-
-def todo_overdue_task(request, task_id: int) -> HttpResponse:
-    """
-    Toggles the completion status of an overdue task.
-
-    This view function retrieves the task with the given task_id, toggles its completion status, saves the changes,
-    and redirects the user to the overdue tasks page.
-
-    :param request: The HTTP request object containing metadata about the request.
-    :param task_id: The ID of the task to be toggled.
-    :return: HttpResponse: A redirect to the overdue tasks page.
-    """
-
-    task_info = Task.objects.get(pk=task_id)
-    task_info.completed = not task_info.completed
-    task_info.save()
-    return redirect('overdue-tasks')
+        "bulk_form": BulkActionForm(user=request.user),
+        "bulk_bucket": "overdue",
+    }, counter=counter)
 
 
 def task_detail_overdue(request, task_id: int) -> HttpResponse:
@@ -103,47 +103,54 @@ def task_detail_overdue(request, task_id: int) -> HttpResponse:
     otherwise renders the task detail page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
+    task_info = Task.objects.detail().get(pk=task_id)
 
-    if task_info.user != request.user:
+    if task_info.user_id != request.user.id:
         raise Http404("Task does not exist or you do not have permission to view it.")
 
+    before = task_state(task_info)
     task_form = TaskForm(request.POST or None, instance=task_info, user=request.user)
 
     if task_form.is_valid():
-        task_form.save()
+        save_task(task_form.save(commit=False), before)
         return redirect('overdue-tasks')
 
-    tasks = Task.objects.filter(user=request.user, completed=False, date__lt=datetime.date.today())
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    today_start = day_start(datetime.date.today())
+    tasks = paginate(Task.objects.filter(user=request.user, completed=False, date__lt=today_start).rows(), request,
+                     dated=True)
 
     return output(request, 'tasks/overdue_tasks.html', {
         "Text_of_the_page": "Overdue tasks",
-        "amount": tasks_amount,
+        "amount": counter.overdue_count,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         "edit": True,
         "task": task_info,
-    })
+    }, counter=counter)
 
 
+@login_required
 def delete_overdue_task(request, task_id: int) -> HttpResponse:
     """
     Deletes an overdue task.
 
-    This view function retrieves the task with the given task_id, deletes it, and redirects the user to the overdue
-    tasks page.
+    This view function deletes the user's task with the given task_id (see `services.delete_tasks`) and redirects the
+    user to the overdue tasks page. If the task does not exist or does not belong to the user, it raises a 404 error.
 
     :param request: The HTTP request object containing metadata about the request.
     :param task_id: The ID of the task to be deleted.
     :return: HttpResponse: A redirect to the overdue tasks page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
-    task_info.delete()
+    if not delete_tasks(request.user, [task_id]):
+        raise Http404("Task does not exist or you do not have permission to delete it.")
     return redirect('overdue-tasks')
 
 
+@conditional_page
+@cache_page_per_user
 def today_tasks(request) -> HttpResponse:
     """
     Renders the today tasks page.
@@ -164,7 +171,7 @@ def today_tasks(request) -> HttpResponse:
         if task_form.is_valid():
             event = task_form.save(commit=False)
             event.user = request.user
-            event.save()
+            save_task(event)
             return redirect('today-tasks')
     else:
         task_form = TaskForm(user=request.user, initial={'date': datetime.date.today()})
@@ -172,35 +179,22 @@ def today_tasks(request) -> HttpResponse:
         if 'submitted' in request.GET:
             submitted = True
 
-    tasks = Task.objects.filter(user=request.user, completed=False, date=datetime.date.today())
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    today_start, tomorrow_start = day_range(datetime.date.today())
+    tasks = paginate(Task.objects.filter(user=request.user, completed=False, date__gte=today_start,
+                                         date__lt=tomorrow_start).rows(), request, dated=True)
 
     return output(request, 'tasks/today_tasks.html', {
         "Text_of_the_page": "Today tasks",
-        "amount": tasks_amount,
+        "amount": counter.today_count,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         'submitted': submitted,
         "edit": False,
-    })
-
-
-def todo_today_task(request, task_id: int) -> HttpResponse:
-    """
-    Toggles the completion status of a task for today.
-
-    This view function retrieves the task with the given task_id, toggles its completion status, saves the changes,
-    and redirects the user to the today tasks page.
-
-    :param request: The HTTP request object containing metadata about the request.
-    :param task_id: The ID of the task to be toggled.
-    :return: HttpResponse: A redirect to the today tasks page.
-    """
-
-    task_info = Task.objects.get(pk=task_id)
-    task_info.completed = not task_info.completed
-    task_info.save()
-    return redirect('today-tasks')
+        "bulk_form": BulkActionForm(user=request.user),
+        "bulk_bucket": "today",
+    }, counter=counter)
 
 
 def task_detail_today(request, task_id: int) -> HttpResponse:
@@ -217,47 +211,54 @@ def task_detail_today(request, task_id: int) -> HttpResponse:
     page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
+    task_info = Task.objects.detail().get(pk=task_id)
 
-    if task_info.user != request.user:
+    if task_info.user_id != request.user.id:
         raise Http404("Task does not exist or you do not have permission to view it.")
 
+    before = task_state(task_info)
     task_form = TaskForm(request.POST or None, instance=task_info, user=request.user)
 
     if task_form.is_valid():
-        task_form.save()
+        save_task(task_form.save(commit=False), before)
         return redirect('today-tasks')
 
-    tasks = Task.objects.filter(user=request.user, completed=False, date=datetime.date.today())
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    today_start, tomorrow_start = day_range(datetime.date.today())
+    tasks = paginate(Task.objects.filter(user=request.user, completed=False, date__gte=today_start,
+                                         date__lt=tomorrow_start).rows(), request, dated=True)
 
     return output(request, 'tasks/today_tasks.html', {
         "Text_of_the_page": "Today tasks",
-        "amount": tasks_amount,
+        "amount": counter.today_count,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         "edit": True,
         "task": task_info,
-    })
+    }, counter=counter)
 
 
+@login_required
 def delete_today_task(request, task_id: int) -> HttpResponse:
     """
     Deletes a task scheduled for today.
 
-    This view function retrieves the task with the given task_id, deletes it, and redirects the user to the today tasks
-    page.
+    This view function deletes the user's task with the given task_id (see `services.delete_tasks`) and redirects the
+    user to the today tasks page. If the task does not exist or does not belong to the user, it raises a 404 error.
 
     :param request: The HTTP request object containing metadata about the request.
     :param task_id: The ID of the task to be deleted.
     :return: HttpResponse: A redirect to the today tasks page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
-    task_info.delete()
+    if not delete_tasks(request.user, [task_id]):
+        raise Http404("Task does not exist or you do not have permission to delete it.")
     return redirect('today-tasks')
 
 
+@conditional_page
+@cache_page_per_user
 def all_tasks(request) -> HttpResponse:
     """
     Renders the all tasks page.
@@ -278,7 +279,7 @@ def all_tasks(request) -> HttpResponse:
         if task_form.is_valid():
             event = task_form.save(commit=False)
             event.user = request.user
-            event.save()
+            save_task(event)
             return redirect('all-tasks')
     else:
         task_form = TaskForm(user=request.user, initial={'date': datetime.date.today()})
@@ -286,44 +287,94 @@ def all_tasks(request) -> HttpResponse:
         if 'submitted' in request.GET:
             submitted = True
 
+    counter = get_counters(request.user)
     search_query = request.GET.get('search', '')
     if search_query:
-        tasks = Task.objects.filter(Q(user=request.user) &
-                                    Q(completed=False) &
-                                    (Q(title__icontains=search_query) |
-                                     Q(description__icontains=search_query)))
-
+        # Ranked results: the best matches are shown on a single page.
+        tasks = search_tasks(Task.objects.filter(user=request.user, completed=False).rows(), search_query)
+        tasks_amount = tasks.count()
+        tasks = first_page(tasks, request)
     else:
-        tasks = Task.objects.filter(user=request.user, completed=False)
-
-    tasks_amount = tasks.count()
+        tasks = paginate(Task.objects.filter(user=request.user, completed=False).rows(), request)
+        tasks_amount = counter.open_count
 
     return output(request, 'tasks/all_tasks.html', {
         "Text_of_the_page": "All tasks",
         "amount": tasks_amount,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         'submitted': submitted,
         "edit": False,
-    })
+        "bulk_form": BulkActionForm(user=request.user),
+        "bulk_bucket": "all",
+    }, counter=counter)
 
 
-def todo_all_task(request, task_id: int) -> HttpResponse:
+@login_required
+@require_POST
+def toggle_task(request, task_id: int = None) -> HttpResponse:
     """
-    Toggles the completion status of a task.
+    Toggles the completion status of one or many tasks.
 
-    This view function retrieves the task with the given task_id, toggles its completion status, saves the changes,
-    and redirects the user to the all tasks page.
+    This view function flips the tasks with a single UPDATE statement (see `services.toggle_tasks`) without reading
+    them first. The task is taken from the URL, or several tasks from the repeated `task_id` POST field. If a safe
+    `next` URL is posted the user is redirected back to it, otherwise the new states are returned as JSON.
 
     :param request: The HTTP request object containing metadata about the request.
     :param task_id: The ID of the task to be toggled.
-    :return: HttpResponse: A redirect to the all tasks page.
+    :return: HttpResponse: A redirect to `next`, or a JsonResponse mapping the toggled task IDs to their new status.
     """
 
-    task_info = Task.objects.get(pk=task_id)
-    task_info.completed = not task_info.completed
-    task_info.save()
-    return redirect('all-tasks')
+    task_ids = [task_id] if task_id is not None else request.POST.getlist('task_id')
+    try:
+        toggled = toggle_tasks(request.user, task_ids)
+    except ValueError:
+        toggled = {}
+    if not toggled:
+        raise Http404("Task does not exist or you do not have permission to change it.")
+
+    next_url = request.POST.get('next', '')
+    if url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()}, require_https=request.is_secure()):
+        return redirect(next_url)
+    return JsonResponse({"tasks": {str(pk): completed for pk, completed in toggled.items()}})
+
+
+@login_required
+@require_POST
+def bulk_tasks(request) -> HttpResponse:
+    """
+    Applies a bulk action (complete, reopen, delete, retag or reschedule) to many tasks at once.
+
+    This view function validates a BulkActionForm, selects the tasks by IDs or by a filter expression (e.g. all overdue
+    tasks with a given tag) and applies the action with one set-based UPDATE / DELETE in a single transaction. If a safe
+    `next` URL is posted the user is redirected back to it with a message, otherwise the result is returned as JSON.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: HttpResponse: A redirect to `next`, or a JsonResponse with the number of affected tasks (400 with the
+    form errors if the form is invalid).
+    """
+
+    bulk_form = BulkActionForm(request.POST, user=request.user)
+    next_url = request.POST.get('next', '')
+    redirect_back = url_has_allowed_host_and_scheme(next_url, allowed_hosts={request.get_host()},
+                                                    require_https=request.is_secure())
+
+    if not bulk_form.is_valid():
+        if redirect_back:
+            messages.error(request, " ".join(error for errors in bulk_form.errors.values() for error in errors))
+            return redirect(next_url)
+        return JsonResponse({"errors": bulk_form.errors}, status=400)
+
+    action = bulk_form.cleaned_data['action']
+    affected = bulk_update_tasks(request.user, bulk_form.selected_tasks(), action,
+                                 tag=bulk_form.cleaned_data['tag'], days=bulk_form.cleaned_data['days'],
+                                 archived=bulk_form.selected_archived())
+
+    if redirect_back:
+        messages.success(request, f"{affected} task(s) updated.")
+        return redirect(next_url)
+    return JsonResponse({"action": action, "affected": affected})
 
 
 def task_detail_all(request, task_id: int) -> HttpResponse:
@@ -340,54 +391,59 @@ def task_detail_all(request, task_id: int) -> HttpResponse:
     page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
+    task_info = Task.objects.detail().get(pk=task_id)
 
-    if task_info.user != request.user:
+    if task_info.user_id != request.user.id:
         raise Http404("Task does not exist or you do not have permission to view it.")
 
+    before = task_state(task_info)
     task_form = TaskForm(request.POST or None, instance=task_info, user=request.user)
 
     if task_form.is_valid():
-        task_form.save()
+        save_task(task_form.save(commit=False), before)
         return redirect('all-tasks')
 
-    tasks = Task.objects.filter(user=request.user, completed=False)
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    tasks = paginate(Task.objects.filter(user=request.user, completed=False).rows(), request)
 
     return output(request, 'tasks/all_tasks.html', {
         "Text_of_the_page": "All tasks",
-        "amount": tasks_amount,
+        "amount": counter.open_count,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         "edit": True,
         "task": task_info,
-    })
+    }, counter=counter)
 
 
+@login_required
 def delete_all_task(request, task_id: int) -> HttpResponse:
     """
     Deletes a task from the 'all tasks' list.
 
-    This view function retrieves the task with the given task_id, deletes it, and redirects the user to the 'all tasks'
-    page.
+    This view function deletes the user's task with the given task_id (see `services.delete_tasks`) and redirects the
+    user to the 'all tasks' page. If the task does not exist or does not belong to the user, it raises a 404 error.
 
     :param request: The HTTP request object containing metadata about the request.
     :param task_id: The ID of the task to be deleted.
     :return: HttpResponse: A redirect to the 'all tasks' page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
-    task_info.delete()
+    if not delete_tasks(request.user, [task_id]):
+        raise Http404("Task does not exist or you do not have permission to delete it.")
     return redirect('all-tasks')
 
 
+@conditional_page
+@cache_page_per_user
 def completed_tasks(request) -> HttpResponse:
     """
     Handles the display and submission of completed tasks.
 
     This view function processes GET and POST requests for completed tasks. For GET requests, it renders the completed
     tasks page with a list of completed tasks and a form to add new tasks. For POST requests, it processes the
-    submitted form data to add a new task.
+    submitted form data to add a new task. The list and its search read the archived tasks too (see `tasks.archive`).
 
     :param request: The HTTP request object containing metadata about the request.
     :returns:
@@ -402,7 +458,7 @@ def completed_tasks(request) -> HttpResponse:
         if task_form.is_valid():
             event = task_form.save(commit=False)
             event.user = request.user
-            event.save()
+            save_task(event)
             return redirect('all-tasks')
     else:
         task_form = TaskForm(user=request.user)
@@ -410,34 +466,29 @@ def completed_tasks(request) -> HttpResponse:
         if 'submitted' in request.GET:
             submitted = True
 
-    tasks = Task.objects.filter(user=request.user, completed=True)
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    search_query = request.GET.get('search', '')
+    if search_query:
+        # Ranked results of the completed tasks, then the archived matches, on a single page.
+        tiers = search_tasks(archive.completed_tiers(request.user), search_query)
+        tasks_amount = sum(tier.count() for tier in tiers)
+        tasks = first_page(tiers, request)
+    else:
+        tasks = paginate(archive.completed_tiers(request.user), request, descending=True)
+        tasks_amount = counter.completed_count
 
     return output(request, 'tasks/completed_tasks.html', {
         "Text_of_the_page": "Completed Tasks",
         "amount": tasks_amount,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         'submitted': submitted,
         "edit": False,
-    })
-
-
-def cancel_todo_task(request, task_id: int) -> HttpResponse:
-    """
-    Toggles the completion status of a task.
-
-    This view function retrieves the task with the given task_id, toggles its completion status, saves the changes,
-    and redirects the user to the completed tasks page.
-
-    :param request: The HTTP request object containing metadata about the request.
-    :param task_id: The ID of the task to be toggled.
-    :return: HttpResponse: A redirect to the completed tasks page.
-    """
-    task_info = Task.objects.get(pk=task_id)
-    task_info.completed = not task_info.completed
-    task_info.save()
-    return redirect('completed-tasks')
+        "bulk_form": BulkActionForm(user=request.user),
+        "bulk_bucket": "completed",
+        "search_url": "completed-tasks",
+    }, counter=counter)
 
 
 def task_detail_completed(request, task_id: int) -> HttpResponse:
@@ -446,7 +497,8 @@ def task_detail_completed(request, task_id: int) -> HttpResponse:
 
     This view function retrieves the task with the given task_id, checks if the task belongs to the current user,
     and renders the task detail page. If the task does not belong to the current user, it raises a 404 error.
-    If the form is valid, it saves the task and redirects to the completed tasks page.
+    If the form is valid, it saves the task and redirects to the completed tasks page. An archived task is shown from
+    the archive and restored when the form is saved (see `tasks.archive`).
 
     :param request: The HTTP request object containing metadata about the request.
     :param task_id: The ID of the task to be detailed.
@@ -454,48 +506,83 @@ def task_detail_completed(request, task_id: int) -> HttpResponse:
     detail page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
+    task_info = Task.objects.detail().filter(pk=task_id).first()
+    archived = task_info is None
+    if archived:
+        task_info = archive.get_archived(request.user, task_id)
 
-    if task_info.user != request.user:
+    if task_info is None or task_info.user_id != request.user.id:
         raise Http404("Task does not exist or you do not have permission to view it.")
 
+    before = task_state(task_info)
     task_form = TaskForm(request.POST or None, instance=task_info, user=request.user)
 
     if task_form.is_valid():
-        task_form.save()
+        save_task(task_form.save(commit=False), before, restore=archived)
         return redirect('completed-tasks')
 
-    tasks = Task.objects.filter(user=request.user, completed=True)
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    tasks = paginate(archive.completed_tiers(request.user), request, descending=True)
 
     return output(request, 'tasks/completed_tasks.html', {
         "Text_of_the_page": "Completed Tasks",
-        "amount": tasks_amount,
+        "amount": counter.completed_count,
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         "edit": True,
         "task": task_info,
-    })
+        "search_url": "completed-tasks",
+    }, counter=counter)
 
 
+@login_required
 def delete_completed_task(request, task_id: int) -> HttpResponse:
     """
     Deletes a completed task.
 
-    This view function retrieves the task with the given task_id, deletes it, and redirects the user to the completed
-    tasks page.
+    This view function deletes the user's task with the given task_id, archived or not (see `services.delete_tasks`),
+    and redirects the user to the completed tasks page. If the task does not exist or does not belong to the user, it
+    raises a 404 error.
 
     :param request: The HTTP request object containing metadata about the request.
     :param task_id: The ID of the task to be deleted.
     :return: HttpResponse: A redirect to the completed tasks page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
-    task_info.delete()
+    if not delete_tasks(request.user, [task_id]):
+        raise Http404("Task does not exist or you do not have permission to delete it.")
     return redirect('completed-tasks')
 
 
 @login_required
+def agenda_tasks(request) -> HttpResponse:
+    """
+    Renders the agenda: the open tasks due in a range of days, grouped by day (see `tasks.agenda`).
+
+    The range is given by `?start=` and `?end=` (ISO dates, the end included) in the time zone `?tz=`; it defaults
+    to the week from today. The page links to the ranges of the same length before and after it.
+
+    :param request: The HTTP request object containing metadata about the request.
+    :return: HttpResponse: Renders the agenda page, with the errors of the range if it is invalid.
+    """
+
+    range_form = AgendaForm(request.GET)
+    context = {"Text_of_the_page": "Agenda", "range_form": range_form, "days": [], "amount": 0}
+    if range_form.is_valid():
+        start, end, tz = (range_form.cleaned_data[name] for name in ('start', 'end', 'tz'))
+        context.update(agenda.agenda(request.user, start, end, tz))
+        span = end - start + datetime.timedelta(days=1)
+        extra = {'tz': range_form.data['tz']} if range_form.data.get('tz') else {}
+        context["previous_range"] = urlencode({'start': start - span, 'end': end - span, **extra})
+        context["next_range"] = urlencode({'start': start + span, 'end': end + span, **extra})
+
+    return output(request, 'tasks/agenda.html', context)
+
+
+@login_required
+@conditional_page
+@cache_page_per_user
 def all_tags(request) -> HttpResponse:
     """
     Function to render the all tags page.
@@ -512,25 +599,25 @@ def all_tags(request) -> HttpResponse:
 
     submitted = False
     if request.method == "POST":
-        tag_form = TagForm(request.POST)
+        tag_form = TagForm(request.POST, user=request.user)
         if tag_form.is_valid():
             event = tag_form.save(commit=False)
             event.user_id = request.user  # Assign the task to the currently logged-in user
-            event.save()
+            save_tag(event)
             return redirect('all-tags')
     else:
-        tag_form = TagForm()
+        tag_form = TagForm(user=request.user)
 
         if 'submitted' in request.GET:
             submitted = True
 
     tags = TagTask.objects.filter(user_id=request.user)
-    tags_amount = tags.count()
 
     return output(request, 'tasks/tags.html', {
         "Text_of_the_page": "Tags",
-        "amount": tags_amount,
+        "amount": len(tags),
         "content_to_unpack": tags,
+        "first_tags": tags[:2],
         "form": tag_form,
         'submitted': submitted,
         "edit": False,
@@ -552,45 +639,52 @@ def tag(request, tag_id: int) -> HttpResponse:
 
     tag_info = TagTask.objects.get(pk=tag_id)
 
-    if tag_info.user_id != request.user:
+    if tag_info.user_id_id != request.user.id:
         raise Http404("Task does not exist or you do not have permission to view it.")
 
-    tag_form = TagForm(request.POST or None, instance=tag_info)
+    tag_form = TagForm(request.POST or None, instance=tag_info, user=request.user)
 
     if tag_form.is_valid():
-        tag_form.save()
+        save_tag(tag_form.save(commit=False))
         return redirect('all-tags')
 
     tags = TagTask.objects.filter(user_id=request.user)
-    tags_amount = tags.count()
 
     return output(request, 'tasks/tags.html', {
         "Text_of_the_page": "Tags",
-        "amount": tags_amount,
+        "amount": len(tags),
         "content_to_unpack": tags,
+        "first_tags": tags[:2],
         "form": tag_form,
         "edit": True,
         "tag": tag_info,
     })
 
 
+@login_required
 def delete_tag(request, tag_id: int) -> HttpResponse:
     """
     Deletes a tag.
 
-    This view function retrieves the tag with the given tag_id, deletes it, and redirects the user to the all tags page.
+    This view function retrieves the user's tag with the given tag_id, deletes it together with its tasks, and
+    redirects the user to the all tags page. If the tag does not exist or does not belong to the user, it raises a 404
+    error.
 
     :param request: The HTTP request object containing metadata about the request.
     :param tag_id: The ID of the tag to be deleted.
     :return: HttpResponse: A redirect to the all tags page.
     """
 
-    tag_info = TagTask.objects.get(pk=tag_id)
-    tag_info.delete()
+    tag_info = TagTask.objects.filter(pk=tag_id, user_id=request.user).first()
+    if tag_info is None:
+        raise Http404("Tag does not exist or you do not have permission to delete it.")
+    delete_tag_with_tasks(tag_info)
     return redirect('all-tags')
 
 
 @login_required
+@conditional_page
+@cache_page_per_user
 def tag_filter(request, tag_id: int) -> HttpResponse:
     """
     Filters tasks by a specific tag.
@@ -610,7 +704,7 @@ def tag_filter(request, tag_id: int) -> HttpResponse:
         if task_form.is_valid():
             event = task_form.save(commit=False)
             event.user = request.user  # Assign the task to the currently logged-in user
-            event.save()
+            save_task(event)
             return redirect('fiter-by-tag', tag_id=tag_id)
     else:
         task_form = TaskTagForm(user=request.user, tag_id=tag_id)
@@ -618,55 +712,46 @@ def tag_filter(request, tag_id: int) -> HttpResponse:
         if 'submitted' in request.GET:
             submitted = True
 
-    tasks = Task.objects.filter(tag_id=tag_id, user=request.user, completed=False)
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    tasks = paginate(Task.objects.filter(user=request.user, tag_id=tag_id, completed=False).rows(), request)
 
-    tag_info = TagTask.objects.get(pk=tag_id)
+    tag_info = TagTask.objects.filter(pk=tag_id, user_id=request.user).first()
+    if tag_info is None:
+        raise Http404("Tag does not exist or you do not have permission to view it.")
 
     return output(request, 'tasks/filter_by_tag.html', {
         "Text_of_the_page": tag_info.tag_name,
-        "amount": tasks_amount,
+        "amount": counter.tag_open_count(tag_id),
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         "edit": False,
+        "bulk_form": BulkActionForm(user=request.user),
+        "bulk_bucket": "all",
+        "bulk_filter_tag": tag_info,
         "tag": tag_info,
         'submitted': submitted,
-    })
-
+    }, counter=counter)
 
-def todo_filtered_task(request, task_id: int) -> HttpResponse:
-    """
-    Toggles the completion status of a filtered task.
 
-    This view function retrieves the task with the given task_id, toggles its completion status, saves the changes,
-    and redirects the user to the filtered tasks page.
-
-    :param request: The HTTP request object containing metadata about the request.
-    :param task_id: The ID of the task to be toggled.
-    :return: HttpResponse: A redirect to the filtered tasks page.
-    """
-
-    task_info = Task.objects.get(pk=task_id)
-    task_info.completed = not task_info.completed
-    task_info.save()
-    return redirect('fiter-by-tag', tag_id=TagTask.objects.get(tag_name=task_info.tag).id)
-
-
-def delete_filtered_task(request, task_id: int) -> HttpResponse:
+@login_required
+def delete_filtered_task(request, tag_id: int, task_id: int) -> HttpResponse:
     """
     Deletes a filtered task.
 
-    This view function retrieves the task with the given task_id, deletes it, and redirects the user to the filtered
-    tasks page.
+    This view function deletes the user's task with the given task_id (see `services.delete_tasks`) and redirects the
+    user back to the tasks filtered by the tag with the given tag_id, which the URL carries so no tag has to be looked
+    up. If the task does not exist or does not belong to the user, it raises a 404 error.
 
     :param request: The HTTP request object containing metadata about the request.
+    :param tag_id: The ID of the tag the tasks are filtered by.
     :param task_id: The ID of the task to be deleted.
     :return: HttpResponse: A redirect to the filtered tasks page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
-    task_info.delete()
-    return redirect('fiter-by-tag', tag_id=TagTask.objects.get(tag_name=task_info.tag).id)
+    if not delete_tasks(request.user, [task_id]):
+        raise Http404("Task does not exist or you do not have permission to delete it.")
+    return redirect('fiter-by-tag', tag_id=tag_id)
 
 
 @login_required
@@ -685,29 +770,33 @@ def tag_filter_task(request, tag_id: int, task_id: int) -> HttpResponse:
     detail page.
     """
 
-    task_info = Task.objects.get(pk=task_id)
+    task_info = Task.objects.detail().get(pk=task_id)
 
     # Check if the task belongs to the current user
-    if task_info.user != request.user:
+    if task_info.user_id != request.user.id:
         raise Http404("Task does not exist or you do not have permission to view it.")
 
+    before = task_state(task_info)
     task_form = TaskForm(request.POST or None, instance=task_info, user=request.user)
 
     if task_form.is_valid():
-        task_form.save()
+        save_task(task_form.save(commit=False), before)
         return redirect('fiter-by-tag', tag_id=tag_id)
 
-    tasks = Task.objects.filter(user=request.user, tag_id=tag_id, completed=False)
-    tasks_amount = tasks.count()
+    counter = get_counters(request.user)
+    tasks = paginate(Task.objects.filter(user=request.user, tag_id=tag_id, completed=False).rows(), request)
 
-    tag_info = TagTask.objects.get(pk=tag_id)
+    tag_info = TagTask.objects.filter(pk=tag_id, user_id=request.user).first()
+    if tag_info is None:
+        raise Http404("Tag does not exist or you do not have permission to view it.")
 
     return output(request, 'tasks/filter_by_tag.html', {
         "Text_of_the_page": tag_info.tag_name,
-        "amount": tasks_amount,
+        "amount": counter.tag_open_count(tag_id),
         "content_to_unpack": tasks,
+        "page": tasks,
         "form": task_form,
         "edit": True,
         "tag": tag_info,
         "task": task_info,
-    })
+    }, counter=counter)